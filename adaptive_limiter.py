@@ -0,0 +1,90 @@
+"""
+自适应限流器 - AIMD（加性增、乘性减）
+固定速率要么浪费服务端实际允许的配额，要么在配额收紧时不停触发429。
+这里在令牌桶的基础上根据上游反馈调整速率：
+- 请求成功：启动后首次降速前速率每秒约翻一倍（慢启动，尽快探到配额），
+  之后加性增长，每秒约增加 increase QPS
+- 返回429：速率乘以 decrease，并按 Retry-After 暂停发放令牌
+- 延迟突增（超过基线 latency_factor 倍）：速率乘以 latency_decrease
+同一个发放间隔内的多次429只降速一次，避免并发请求把速率一次压到底。
+"""
+
+import time
+
+from scheduler import TokenBucket
+
+
+class AdaptiveTokenBucket(TokenBucket):
+    """根据 429 / Retry-After / 延迟自动调整速率的令牌桶
+
+    rate: 初始速率（次/秒）
+    min_rate / max_rate: 速率调整范围，默认为初始速率的 1/4 和 5 倍
+    increase: 持续成功时每秒增加的速率
+    decrease: 遇到429时速率的乘数
+    latency_factor: 响应延迟超过基线的多少倍视为延迟突增
+    latency_decrease: 延迟突增时速率的乘数
+    """
+
+    def __init__(self, rate, burst=1, min_rate=None, max_rate=None, increase=0.5,
+                 decrease=0.7, latency_factor=3.0, latency_decrease=0.8, clock=time.monotonic):
+        super().__init__(rate, burst, clock)
+        self.min_rate = float(min_rate or self.rate / 4)
+        self.max_rate = float(max_rate or self.rate * 5)
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.latency_decrease = latency_decrease
+
+        self._slow_start = True
+        self._paused_until = 0.0
+        self._last_cut = None
+        self._latency_baseline = None  # 正常响应延迟的指数滑动平均（秒）
+        self.stats = {"increases": 0, "decreases": 0, "pauses": 0}
+
+    def try_acquire(self):
+        """暂停期间（Retry-After）不发放令牌"""
+        with self._lock:
+            wait = self._paused_until - self._clock()
+        if wait > 0:
+            return wait
+        return super().try_acquire()
+
+    def record_success(self, latency=None):
+        """请求成功：延迟正常时加性增速，延迟突增时降速"""
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            if latency is not None:
+                baseline = self._latency_baseline
+                if baseline is not None and latency > baseline * self.latency_factor:
+                    self._cut(now, self.latency_decrease)
+                    return
+                self._latency_baseline = latency if baseline is None else baseline + 0.1 * (latency - baseline)
+            if self.rate < self.max_rate:
+                # 每秒约有 rate 次成功，按次摊分后即每秒翻倍 / 每秒增加 increase
+                if self._slow_start:
+                    rate = self.rate * 2 ** (1 / self.rate)
+                else:
+                    rate = self.rate + self.increase / self.rate
+                self.rate = min(self.max_rate, rate)
+                self.stats["increases"] += 1
+
+    def record_throttle(self, retry_after=None):
+        """遇到429：降速，并在 retry_after 秒内暂停发放令牌"""
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+                self.stats["pauses"] += 1
+            self._cut(now, self.decrease)
+
+    def _cut(self, now, factor):
+        # 距上次降速不足一个发放间隔时，视为同一批请求的反馈，不重复降速
+        if self._last_cut is not None and now - self._last_cut < 1 / self.rate:
+            return
+        self.rate = max(self.min_rate, self.rate * factor)
+        self._slow_start = False
+        self._tokens = min(self._tokens, 0.0)
+        self._last_cut = now
+        self.stats["decreases"] += 1
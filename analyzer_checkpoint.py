@@ -0,0 +1,229 @@
+"""
+分析检查点 - 支持 EvolutionAnalyzer 增量分析
+记录已处理到的位置和累计统计（关键词计数、质量指标、响应时间分布），每次只读取之后新增的日志：
+- CSV日志：记录字节偏移，文件被轮转或表头变化时自动全量重建
+- 对话记录库：记录已处理的最大 id（高水位），该行被删除或内容变化（库被更换）时自动全量重建
+"""
+
+import hashlib
+import io
+import json
+import os
+from collections import Counter
+
+import pandas as pd
+
+from conversation_logger import LOG_HEADER
+
+CHECKPOINT_VERSION = 2
+HEAD_BYTES = 4096  # 用于识别文件是否被替换的头部字节数
+STORE_BATCH = 100_000  # 从对话记录库每批读取的行数
+MAX_KEPT_QUESTIONS = 200  # 点踩/无来源问题最多保留的条数
+RESPONSE_BUCKET_MS = 10  # 响应时间分布的分桶宽度
+
+
+def _head_hash(path, length):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read(length)).hexdigest()
+
+
+def _complete_prefix(data):
+    """返回 data 中最后一个完整CSV记录结束的位置（不在引号内的换行之后）"""
+    end = len(data)
+    while True:
+        pos = data.rfind(b"\n", 0, end)
+        if pos == -1:
+            return 0
+        if data.count(b'"', 0, pos) % 2 == 0:
+            return pos + 1
+        end = pos
+
+
+class AnalysisCheckpoint:
+    """增量分析状态"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.source = None  # 日志文件或对话记录库的绝对路径
+        self.header = None
+        self.offset = 0
+        self.head_length = 0
+        self.head_hash = None
+        self.last_id = 0  # 对话记录库中已处理的最大 id
+        self.anchor = None  # last_id 所在行的 [时间, 问题]，用于识别库是否被更换
+
+        self.total_rows = 0
+        self.word_counts = Counter()
+        self.answer_length_sum = 0.0
+        self.answer_length_count = 0
+        self.sources_sum = 0.0
+        self.sources_count = 0
+        self.no_source_count = 0
+        self.like_count = 0
+        self.dislike_count = 0
+        self.response_buckets = Counter()  # 响应时间分桶（ms） -> 次数
+        self.response_sum = 0.0
+        self.response_count = 0
+        self.response_max = None
+        self.daily_counts = Counter()
+        self.bad_questions = []
+        self.no_source_questions = []
+
+    # ===== 持久化 =====
+    @classmethod
+    def load(cls, path):
+        state = cls()
+        if not path or not os.path.exists(path):
+            return state
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 检查点读取失败，将全量重建: {e}")
+            return state
+        if data.get("version") != CHECKPOINT_VERSION:
+            return state
+
+        for key, value in data["state"].items():
+            setattr(state, key, value)
+        state.word_counts = Counter(state.word_counts)
+        state.response_buckets = Counter({int(k): v for k, v in state.response_buckets.items()})
+        state.daily_counts = Counter(state.daily_counts)
+        return state
+
+    def save(self, path):
+        data = {"version": CHECKPOINT_VERSION, "state": dict(vars(self))}
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    # ===== 读取新增日志 =====
+    def is_valid_for(self, path):
+        """检查点是否仍对应当前日志文件（未被轮转、截断或更换表头）"""
+        if self.head_hash is None or not os.path.exists(path):
+            return False
+        if os.path.getsize(path) < self.offset:
+            return False
+        return _head_hash(path, self.head_length) == self.head_hash
+
+    def read_new_rows(self, path):
+        """读取检查点之后追加的完整日志行，返回 DataFrame（可能为空）；
+        表头与检查点不一致时返回 None，由调用方全量重建"""
+        with open(path, "rb") as f:
+            header_line = f.readline()
+            header = header_line.decode("utf-8-sig").strip().split(",")
+            if self.header is not None and header != self.header:
+                return None
+
+            start = max(self.offset, len(header_line))
+            f.seek(start)
+            data = f.read()
+
+        consumed = _complete_prefix(data)
+        if self.header is None:
+            self.header = header
+        self.offset = start + consumed
+        self.head_length = min(HEAD_BYTES, self.offset)
+        self.head_hash = _head_hash(path, self.head_length)
+
+        if consumed == 0:
+            return pd.DataFrame(columns=header)
+        return pd.read_csv(io.BytesIO(data[:consumed]), header=None, names=header)
+
+    def is_valid_for_store(self, store):
+        """检查点是否仍对应当前对话记录库（高水位所在的行仍在且内容未变）"""
+        if self.last_id == 0:
+            return True
+        return store.row_key(self.last_id) == tuple(self.anchor or ())
+
+    def read_store_rows(self, store, batch_size=STORE_BATCH):
+        """逐批读取对话记录库中高水位之后的记录，产出 DataFrame（列名为 LOG_HEADER），并推进高水位"""
+        while True:
+            rows = store.rows_after(self.last_id, batch_size)
+            if not rows:
+                return
+            last = rows[-1]
+            self.last_id = last[0]
+            self.anchor = [last[1], last[3]]
+            yield pd.DataFrame.from_records([row[1:] for row in rows], columns=LOG_HEADER)
+
+    # ===== 累计统计 =====
+    def update(self, df, words):
+        """合并一批新日志行及其问题关键词（关键词列表或计数）"""
+        self.total_rows += len(df)
+        self.word_counts.update(words)
+
+        if '回答长度' in df.columns:
+            lengths = pd.to_numeric(df['回答长度'], errors='coerce').dropna()
+            self.answer_length_sum += float(lengths.sum())
+            self.answer_length_count += int(len(lengths))
+
+        if '来源数量' in df.columns:
+            sources = pd.to_numeric(df['来源数量'], errors='coerce')
+            valid = sources.dropna()
+            self.sources_sum += float(valid.sum())
+            self.sources_count += int(len(valid))
+            no_source = sources == 0
+            self.no_source_count += int(no_source.sum())
+            room = MAX_KEPT_QUESTIONS - len(self.no_source_questions)
+            if room > 0:
+                self.no_source_questions += df.loc[no_source, '问题'].astype(str).head(room).tolist()
+
+        if '用户反馈' in df.columns:
+            dislike = df['用户反馈'] == 'dislike'
+            self.like_count += int((df['用户反馈'] == 'like').sum())
+            self.dislike_count += int(dislike.sum())
+            self.bad_questions += df.loc[dislike, '问题'].astype(str).tolist()
+            self.bad_questions = self.bad_questions[-MAX_KEPT_QUESTIONS:]
+
+        if '响应时间(ms)' in df.columns:
+            times = pd.to_numeric(df['响应时间(ms)'], errors='coerce').dropna()
+            if len(times):
+                self.response_sum += float(times.sum())
+                self.response_count += int(len(times))
+                batch_max = float(times.max())
+                self.response_max = batch_max if self.response_max is None else max(self.response_max, batch_max)
+                buckets = (times // RESPONSE_BUCKET_MS).astype(int) * RESPONSE_BUCKET_MS
+                self.response_buckets.update(buckets.value_counts().to_dict())
+
+        if '时间' in df.columns:
+            dates = pd.to_datetime(df['时间'], errors='coerce').dt.date.dropna()
+            self.daily_counts.update(str(d) for d in dates)
+
+    # ===== 汇总结果（与 EvolutionAnalyzer 各 analyze_* 方法的返回值一致） =====
+    def top_words(self, top_n):
+        return self.word_counts.most_common(top_n)
+
+    def quality_stats(self):
+        stats = {}
+        if self.answer_length_count:
+            stats['avg_response_length'] = self.answer_length_sum / self.answer_length_count
+        if self.sources_count:
+            stats['avg_sources'] = self.sources_sum / self.sources_count
+            stats['no_source_pct'] = self.no_source_count / self.total_rows * 100
+        total_feedback = self.like_count + self.dislike_count
+        stats['like_count'] = self.like_count
+        stats['dislike_count'] = self.dislike_count
+        stats['satisfaction_rate'] = self.like_count / total_feedback * 100 if total_feedback else 0
+        return stats
+
+    def performance_stats(self):
+        if not self.response_count:
+            return {}
+        # 按分桶近似计算95分位
+        target = self.response_count * 0.95
+        cumulative = 0
+        p95 = 0
+        for bucket in sorted(self.response_buckets):
+            cumulative += self.response_buckets[bucket]
+            if cumulative >= target:
+                p95 = bucket + RESPONSE_BUCKET_MS
+                break
+        return {
+            'avg_response_time': self.response_sum / self.response_count,
+            'max_response_time': self.response_max,
+            'p95_response_time': p95,
+        }
@@ -0,0 +1,231 @@
+"""
+问题-回答缓存
+按归一化后的问题精确匹配，内存LRU + SQLite持久化，
+支持TTL过期、容量上限，以及知识库（zhishiku/*.md）变更时整体失效。
+启动时可载入离线预热任务（cache_warmer.py）生成的常见问题回答。
+"""
+
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+def normalize_question(question):
+    """归一化问题：全角转半角、统一小写、去掉空白和标点"""
+    text = unicodedata.normalize("NFKC", str(question or "")).lower()
+    return "".join(
+        ch for ch in text
+        if not ch.isspace() and not unicodedata.category(ch).startswith(("P", "S"))
+    )
+
+
+def knowledge_base_version(kb_dir="zhishiku"):
+    """根据知识库文件名、大小和修改时间计算版本指纹"""
+    digest = hashlib.sha1()
+    for path in sorted(glob.glob(os.path.join(kb_dir, "*.md"))):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        digest.update(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns};".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class AnswerCache:
+    """问题-回答缓存
+
+    db_path: SQLite文件路径，重启后缓存仍然有效
+    ttl: 缓存有效期（秒）
+    max_entries: 最多缓存的问题数，超出后淘汰最久未访问的
+    kb_dir: 知识库目录，其中文件变化时清空缓存
+    kb_check_interval: 检查知识库是否变化的最小间隔（秒）
+    """
+
+    def __init__(self, db_path="answer_cache.db", ttl=24 * 3600, max_entries=1000,
+                 kb_dir="zhishiku", kb_check_interval=5.0):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.kb_dir = kb_dir
+        self.kb_check_interval = kb_check_interval
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (answer, conversation_id, sources, created_at)
+        self._touched = {}  # 命中后待写回的最近访问时间
+        self._kb_checked_at = 0.0
+
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS answers (
+                key TEXT PRIMARY KEY,
+                question TEXT,
+                answer TEXT,
+                conversation_id TEXT,
+                sources TEXT,
+                created_at REAL,
+                last_access REAL
+            )
+        """)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+
+        self.kb_version = knowledge_base_version(kb_dir)
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'kb_version'").fetchone()
+        if row is None or row[0] != self.kb_version:
+            self._clear_locked()
+        self._load()
+
+    def _load(self):
+        """启动时把未过期的缓存按访问时间顺序载入内存"""
+        cutoff = time.time() - self.ttl
+        rows = self._conn.execute(
+            "SELECT key, answer, conversation_id, sources, created_at FROM answers "
+            "WHERE created_at >= ? ORDER BY last_access DESC LIMIT ?",
+            (cutoff, self.max_entries)
+        ).fetchall()
+        for key, answer, conversation_id, sources, created_at in reversed(rows):
+            self._entries[key] = (answer, conversation_id, json.loads(sources), created_at)
+
+    def _clear_locked(self):
+        self._entries.clear()
+        self._touched.clear()
+        self._conn.execute("DELETE FROM answers")
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (name, value) VALUES ('kb_version', ?)",
+            (self.kb_version,)
+        )
+        self._conn.commit()
+
+    def _check_kb_locked(self, now):
+        if now - self._kb_checked_at < self.kb_check_interval:
+            return
+        self._kb_checked_at = now
+        version = knowledge_base_version(self.kb_dir)
+        if version != self.kb_version:
+            self.kb_version = version
+            self._clear_locked()
+            self.stats["invalidations"] += 1
+
+    def get(self, question):
+        """查询缓存，命中返回 (answer, conversation_id, sources)，否则返回None"""
+        key = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            self._check_kb_locked(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            if now - entry[3] > self.ttl:
+                del self._entries[key]
+                self._conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+                self._conn.commit()
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._touched[key] = now
+            self.stats["hits"] += 1
+            return entry[0], entry[1], list(entry[2])
+
+    def put(self, question, answer, conversation_id, sources, created_at=None):
+        """写入缓存（created_at 为回答生成时间，默认为当前时间）"""
+        key = normalize_question(question)
+        if not key:
+            return
+        with self._lock:
+            self._put_locked(key, question, answer, conversation_id, sources, created_at or time.time())
+            self._commit_locked()
+
+    def load_warm(self, path):
+        """载入预热任务生成的回答文件，返回载入条数
+
+        文件对应的知识库版本与当前不一致、或回答已超过TTL时跳过；
+        不覆盖缓存中更新的同一问题
+        """
+        if not path or not os.path.exists(path):
+            return 0
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 预热回答读取失败: {e}")
+            return 0
+
+        cutoff = time.time() - self.ttl
+        loaded = 0
+        with self._lock:
+            self._check_kb_locked(time.time())
+            if data.get("kb_version") != self.kb_version:
+                return 0
+            for item in data.get("answers", []):
+                key = normalize_question(item["question"])
+                existing = self._entries.get(key)
+                if not key or item["created_at"] < cutoff or (existing and existing[3] >= item["created_at"]):
+                    continue
+                self._put_locked(key, item["question"], item["answer"], item["conversation_id"],
+                                 item["sources"], item["created_at"])
+                loaded += 1
+            self._commit_locked()
+        return loaded
+
+    def _put_locked(self, key, question, answer, conversation_id, sources, created_at):
+        now = time.time()
+        self._entries[key] = (answer, conversation_id, list(sources or []), created_at)
+        self._entries.move_to_end(key)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, question, answer, conversation_id,
+             json.dumps(list(sources or []), ensure_ascii=False), created_at, now)
+        )
+
+        while len(self._entries) > self.max_entries:
+            old_key, _ = self._entries.popitem(last=False)
+            self._touched.pop(old_key, None)
+            self._conn.execute("DELETE FROM answers WHERE key = ?", (old_key,))
+            self.stats["evictions"] += 1
+
+    def _commit_locked(self):
+        # 顺带写回命中时记录的访问时间，保证重启后LRU顺序不丢
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE answers SET last_access = ? WHERE key = ?",
+                [(ts, k) for k, ts in self._touched.items()]
+            )
+            self._touched.clear()
+        self._conn.commit()
+
+    def invalidate(self):
+        """手动清空缓存"""
+        with self._lock:
+            self._clear_locked()
+            self.stats["invalidations"] += 1
+
+    def keys(self):
+        """缓存中的归一化问题，从最久未访问到最近访问"""
+        with self._lock:
+            return list(self._entries)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def get_stats(self):
+        """返回命中统计"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["size"] = len(self._entries)
+        total = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / total * 100 if total else 0
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
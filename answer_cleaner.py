@@ -0,0 +1,103 @@
+"""
+回答引用标记清理 - 批量版与流式版
+千帆返回的回答中带有 ^[1]^、[2] 这类引用标记，需要去掉并合并空白。
+
+流式版 StreamingCleaner 逐块输入文本，增量输出清理结果，对任意分块方式
+输出的拼接都与 clean_answer(完整回答) 完全一致：
+- 引用标记只由 ^ [ ] 数字 组成，且清理时不会删除其他字符，所以所有替换都发生在
+  这些字符组成的连续片段内部；只需暂存当前片段中从第一个 ^ 或 [ 开始的部分
+- 空白合并只需记住"是否有未输出的空白"，开头和结尾的空白直接丢弃（等价于 strip）
+每个字符只处理常数次，总耗时与回答长度成线性关系。
+"""
+
+import re
+
+_CITATION_RES = (
+    re.compile(r'\^\[\d+\]\^'),
+    re.compile(r'\[\d+\]'),
+    re.compile(r'\^(\[\d+\])+\^'),
+)
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# 引用标记可能包含的字符组成的连续片段 / 其他字符组成的片段
+_SEGMENT_RE = re.compile(r'[\^\[\]\d]+|[^\^\[\]\d]+')
+_MARKER_START_RE = re.compile(r'[\^\[]')
+_SPACE_SPLIT_RE = re.compile(r'(\s+)')
+
+
+def _strip_citations(text):
+    for pattern in _CITATION_RES:
+        text = pattern.sub('', text)
+    return text
+
+
+def clean_answer(answer):
+    """清理回答中的引用标记"""
+    if not answer:
+        return answer
+
+    cleaned = _strip_citations(answer)
+    cleaned = _WHITESPACE_RE.sub(' ', cleaned)
+    return cleaned.strip()
+
+
+class StreamingCleaner:
+    """增量清理引用标记
+
+    cleaner = StreamingCleaner()
+    for chunk in chunks:
+        display += cleaner.feed(chunk)
+    display += cleaner.finish()
+    """
+
+    def __init__(self):
+        self._pending = ""  # 暂存的、可能属于引用标记的片段
+        self._space = False  # 是否有尚未输出的空白
+        self._started = False  # 是否已输出过非空白字符
+
+    def feed(self, chunk):
+        """输入一块文本，返回可以确定的清理后文本"""
+        if not chunk:
+            return ""
+        out = []
+        for match in _SEGMENT_RE.finditer(chunk):
+            segment = match.group()
+            if segment[0] in '^[]' or segment[0].isdecimal():
+                if self._pending:
+                    self._pending += segment
+                    continue
+                # 片段中第一个 ^ 或 [ 之前的数字和 ] 不可能属于任何引用标记
+                start = _MARKER_START_RE.search(segment)
+                if start is None:
+                    self._emit(segment, out)
+                else:
+                    self._emit(segment[:start.start()], out)
+                    self._pending = segment[start.start():]
+            else:
+                if self._pending:
+                    self._emit(_strip_citations(self._pending), out)
+                    self._pending = ""
+                self._emit(segment, out)
+        return "".join(out)
+
+    def finish(self):
+        """输入结束，返回剩余的清理后文本（结尾空白丢弃）"""
+        out = []
+        if self._pending:
+            self._emit(_strip_citations(self._pending), out)
+            self._pending = ""
+        return "".join(out)
+
+    def _emit(self, text, out):
+        """空白合并：连续空白输出为一个空格，开头结尾的空白不输出"""
+        for i, part in enumerate(_SPACE_SPLIT_RE.split(text)):
+            if not part:
+                continue
+            if i % 2:
+                self._space = True
+                continue
+            if self._space and self._started:
+                out.append(' ')
+            self._space = False
+            self._started = True
+            out.append(part)
@@ -0,0 +1,92 @@
+"""
+大模型服务的 asyncio 接口
+等待中的提问挂在事件循环上，不再每个等待的调用方占用一个线程。
+这里没有单独的 asyncio HTTP 客户端：请求提交到 LLMService 的同一个调度器，
+上游请求仍由调度器的工作线程用 requests 发出，与同步调用走同一条路径——
+公平排队与准入控制、截止时间与取消、429/5xx 经限流器重试、监控指标，
+以及回答缓存和相同问题合并（同步与异步调用方问同一个问题也只请求一次上游）。
+总耗时与同步调用相同（受同样的工作线程数和限流预算约束），省下的只是等待者占用的线程。
+
+用法：
+    async with AsyncLLMService() as client:
+        answer, conversation_id, sources = await client.ask_async("奖学金怎么申请")
+"""
+
+import asyncio
+import time
+
+from llm_service import QUEUE_FULL_MESSAGE, REQUEST_TIMEOUT, TIMEOUT_MESSAGE, LLMService
+from metrics import record_stage
+from scheduler import DeadlineExceeded, QueueFullError
+
+
+def _consume(waiter):
+    """放弃等待后结果无人读取，取出异常避免事件循环报告 exception was never retrieved"""
+    if not waiter.cancelled():
+        waiter.exception()
+
+
+class AsyncLLMService:
+    """LLMService 的异步客户端
+
+    llm: 共享调度器、凭据池和缓存的 LLMService 实例，默认取单例
+    timeout: 从提问到拿到回答的总预算（秒），超时后放弃该请求
+    """
+
+    def __init__(self, llm=None, timeout=REQUEST_TIMEOUT):
+        self.llm = llm or LLMService()
+        self.timeout = timeout
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        """请求由 LLMService 的工作线程执行，这里没有需要释放的连接"""
+
+    async def ask_async(self, question, conversation_id=None, timings=None, session_id=None, use_cache=True):
+        """异步提问，返回 (answer, conversation_id, sources)，参数与 LLMService.ask 相同
+
+        协程被取消时放弃该请求（排队中直接移出，进行中尽早停止），并继续抛出 CancelledError
+        """
+        llm = self.llm
+        if not llm.api_key:
+            return "API Key未配置", None, []
+
+        start = time.perf_counter()
+        try:
+            if not conversation_id and use_cache:
+                # 缓存查询读 SQLite，放到线程中执行，不阻塞事件循环
+                cached = await asyncio.to_thread(llm._cache_lookup, question)
+                if cached:
+                    return cached
+
+            payload = llm._new_payload(question, conversation_id, session_id, timings)
+            try:
+                if conversation_id:
+                    future, is_leader = llm._submit(payload), True
+                else:
+                    future, is_leader, payload = llm._submit_coalesced(payload)
+            except QueueFullError:
+                return QUEUE_FULL_MESSAGE, None, []
+
+            # shield：超时或取消只放弃本调用方，由 _abandon 决定是否取消（可能还有其他合并的等待者）
+            waiter = asyncio.wrap_future(future)
+            waiter.add_done_callback(_consume)
+            try:
+                result = await asyncio.wait_for(asyncio.shield(waiter), self.timeout)
+            except asyncio.CancelledError:
+                dropped = future.cancelled()  # 调度器已取消该请求，而非本协程被取消
+                llm._abandon(payload, future)
+                if not dropped:
+                    raise
+                return TIMEOUT_MESSAGE, None, []
+            except (asyncio.TimeoutError, DeadlineExceeded):
+                llm._abandon(payload, future)
+                return TIMEOUT_MESSAGE, None, []
+
+            return result if is_leader else llm._follower_result(result)
+        finally:
+            record_stage(timings, "total", (time.perf_counter() - start) * 1000)
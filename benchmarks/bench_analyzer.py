@@ -0,0 +1,106 @@
+"""
+EvolutionAnalyzer 规模基准
+按 evolution_logs.csv 的表结构生成 1M / 10M 行合成日志，
+逐个报告 load_data 和各 analyze_* 方法的耗时与内存峰值（tracemalloc），
+用来判断每周分析任务何时超出运行窗口。
+
+运行方式（仓库根目录）：python -m benchmarks.bench_analyzer [--rows 1000000 10000000]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+import tracemalloc
+
+import jieba
+import numpy as np
+import pandas as pd
+
+from evolution_analyzer import EvolutionAnalyzer
+from benchmarks.bench_tokenize import synthetic_questions
+
+METHODS = [
+    "analyze_response_quality",
+    "analyze_high_frequency_questions",
+    "analyze_question_clusters",
+    "analyze_bad_responses",
+    "analyze_no_source_responses",
+    "analyze_performance",
+]
+
+
+def write_synthetic_log(path, rows, unique=50_000, chunk=1_000_000, seed=0):
+    """分块生成合成日志，避免一次性占用过多内存"""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2026-02-01")
+    header = True
+    for offset in range(0, rows, chunk):
+        n = min(chunk, rows - offset)
+        questions = synthetic_questions(n, unique, seed=seed + offset)
+        answer_len = rng.integers(20, 1100, n)
+        df = pd.DataFrame({
+            '时间': (start + pd.to_timedelta(rng.integers(0, 90 * 86400, n), unit="s")).strftime("%Y-%m-%d %H:%M:%S"),
+            '会话ID': rng.integers(0, 10**12, n).astype(str),
+            '问题': questions,
+            '回答': "同学你好，很高兴为你解答！" + pd.Series(questions) + "的办理要点如下...",
+            '回答长度': answer_len,
+            '来源数量': rng.choice([0, 1, 2, 3], n, p=[0.1, 0.6, 0.2, 0.1]),
+            '用户反馈': rng.choice(["", "like", "dislike"], n, p=[0.9, 0.07, 0.03]),
+            '响应时间(ms)': rng.lognormal(7, 0.6, n).astype(int),
+            '是否成功': answer_len > 20,
+        })
+        df.to_csv(path, mode="w" if header else "a", header=header, index=False)
+        header = False
+
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def bench(rows, tmp):
+    path = os.path.join(tmp, f"logs_{rows}.csv")
+    start = time.perf_counter()
+    write_synthetic_log(path, rows)
+    print(f"\n📄 {rows:,} 行（{os.path.getsize(path) / 2**20:.0f}MB，生成耗时 {time.perf_counter() - start:.1f}s）")
+
+    analyzer = EvolutionAnalyzer(path, token_cache_file=os.path.join(tmp, "token_cache.db"), db_file=None)
+    results = [("load_data",) + measure(analyzer.load_data)]
+    for name in METHODS:
+        results.append((name,) + measure(getattr(analyzer, name)))
+
+    for name, elapsed, peak in results:
+        print(f"  {name:<36} {elapsed:8.2f}s  峰值内存 {peak / 2**20:8.1f}MB")
+    total = sum(r[1] for r in results)
+    print(f"  {'合计':<36} {total:8.2f}s")
+    os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    args = parser.parse_args()
+
+    # 词典加载是一次性开销，不计入各方法耗时（tracemalloc下加载会被显著放慢）
+    jieba.setLogLevel(60)
+    jieba.initialize()
+
+    print("=" * 60)
+    print("📈 EvolutionAnalyzer 规模基准")
+    print("=" * 60)
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            bench(rows, tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+线程模型 vs asyncio 模型基准测试
+模拟 N 个会话同时提问（每个会话带 conversation_id，绕过缓存和请求合并），
+两种模型都提交到同一个调度器（同样的工作线程数），对比总耗时、线程数和Python堆内存峰值
+（不含线程栈，线程模型实际占用更高）。
+异步调用与同步调用共用一条路径（请求合并、放弃后丢弃）的断言见 tests/test_async_llm_service.py。
+
+运行方式（仓库根目录）：python -m benchmarks.bench_async [并发数]
+"""
+
+import asyncio
+import sys
+import threading
+import time
+import tracemalloc
+
+from async_llm_service import AsyncLLMService
+from credential_pool import Credential
+from llm_service import LLMService
+from mock_qianfan import MockQianfanServer
+from scheduler import RequestScheduler
+
+LATENCY = 0.2
+
+
+def run_threads(llm, n, workers):
+    """每个会话一个线程调用同步 ask（即Streamlit脚本线程的模型）"""
+    llm.scheduler = RequestScheduler(llm._process_request, None, workers=workers)
+    results = []
+
+    def session(i):
+        results.append(llm.ask(f"问题{i}", f"bench-{i}"))
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    peak_threads = threading.active_count()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    llm.scheduler.shutdown()
+    return elapsed, peak_threads, peak, results
+
+
+def run_async(llm, n, workers):
+    """一个事件循环同时挂起全部请求"""
+    llm.scheduler = RequestScheduler(llm._process_request, None, workers=workers)
+    peak_threads = []
+
+    async def main():
+        async with AsyncLLMService(llm) as client:
+            tasks = [asyncio.ensure_future(client.ask_async(f"问题{i}", f"bench-{i}")) for i in range(n)]
+            await asyncio.sleep(0)
+            peak_threads.append(threading.active_count())
+            return await asyncio.gather(*tasks)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    results = asyncio.run(main())
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    llm.scheduler.shutdown()
+    return elapsed, peak_threads[0], peak, results
+
+
+def report(name, n, elapsed, peak_threads, peak, results):
+    ok = sum(1 for r in results if r[1])
+    print(f"{name:<8} 成功 {ok}/{n}  耗时 {elapsed:.2f}s  "
+          f"线程数 {peak_threads}  内存峰值 {peak / 1024:.0f}KB（每请求 {peak / n / 1024:.1f}KB）")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    concurrency = 20
+
+    print("=" * 60)
+    print(f"⚡ 线程 vs asyncio：{n} 个并发会话，上游延迟 {LATENCY * 1000:.0f}ms，工作线程 {concurrency}")
+    print("=" * 60)
+
+    with MockQianfanServer(latency=LATENCY) as server:
+        # 放开限流，只比较并发模型本身
+        llm = LLMService(base_url=server.url, credentials=[
+            Credential("bench", "bench-app", rate=1e6, burst=1e6, name="bench")
+        ])
+
+        report("threads", n, *run_threads(llm, n, workers=concurrency))
+        report("asyncio", n, *run_async(llm, n, workers=concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+常见问题预热基准测试
+按 Zipf 分布模拟一天的提问（头部是 evolution_logs.csv 中的真实问题和欢迎语推荐问题，
+尾部是长尾问题，每个问题都是新对话），用上周同分布的日志做预热，对比：
+- 冷启动：回答缓存为空，每个问题当天第一次被问到时都要请求上游
+- 预热后：先用 cache_warmer 在低峰时段生成上周日志高频问题和推荐问题的回答，
+  应用启动时载入回答缓存
+输出推荐问题首次点击的耗时、高峰时段的上游请求数和常见问题首次被问到时的耗时。
+预热任务与载入的正确性断言见 tests/test_cache_warmer.py，这里只做测量。
+
+运行方式（仓库根目录）：python -m benchmarks.bench_cache_warm
+"""
+
+import csv
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import cache_warmer
+from answer_cache import AnswerCache, normalize_question
+from credential_pool import Credential, CredentialPool
+from llm_service import LLMService
+from mock_qianfan import MockQianfanServer
+
+LATENCY = 0.3
+LOG_FILE = "evolution_logs.csv"
+DAY_QUESTIONS = 600  # 一天的提问数
+LONG_TAIL = 300  # 长尾问题数
+TOP_N = 30  # 预热的日志高频问题数
+HEAD = 20  # 统计首次提问耗时的常见问题数
+
+
+def question_pool():
+    """按热度排序的问题池：推荐问题、日志中的问题、长尾问题"""
+    with open(LOG_FILE, "r", encoding="utf-8-sig", newline="") as f:
+        logged = [row["问题"] for row in csv.DictReader(f) if row.get("问题")]
+    pool = []
+    seen = set()
+    for question in list(cache_warmer.SUGGESTED_QUESTIONS) + logged:
+        key = normalize_question(question)
+        if key not in seen:
+            seen.add(key)
+            pool.append(question)
+    templates = ("{}的办理流程是什么", "{}需要准备哪些材料", "{}在哪里咨询", "{}有截止时间吗")
+    topics = ("学籍异动", "缓考", "宿舍调换", "助学贷款", "勤工助学", "转专业", "四六级", "实习证明",
+              "毕业论文", "党员发展", "心理咨询", "请假", "校园卡", "体测", "学分认定")
+    for i in range(LONG_TAIL):
+        pool.append(templates[i % len(templates)].format(topics[i // len(templates) % len(topics)]) + f"（{i}）")
+    return pool
+
+
+def sample_day(pool, rng):
+    weights = [1 / (rank + 1) ** 1.1 for rank in range(len(pool))]
+    return rng.choices(pool, weights=weights, k=DAY_QUESTIONS)
+
+
+def write_log(path, questions):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["时间", "会话ID", "问题"])
+        for question in questions:
+            writer.writerow(["2026-01-01 12:00:00", "s", question])
+
+
+def replay(llm, server, questions, head):
+    """先点击推荐问题，再重放一天的提问，返回 (推荐问题耗时, 上游请求数, 常见问题首次提问耗时)"""
+    def timed_ask(question):
+        start = time.perf_counter()
+        llm.ask(question, session_id="replay")
+        return (time.perf_counter() - start) * 1000
+
+    before = server.key_counts["bench"]
+    suggested_ms = [timed_ask(q) for q in cache_warmer.SUGGESTED_QUESTIONS]
+    head_keys = {normalize_question(q) for q in head}
+    first_ms = []
+    seen = set()
+    for question in questions:
+        elapsed = timed_ask(question)
+        key = normalize_question(question)
+        if key in head_keys and key not in seen:
+            seen.add(key)
+            first_ms.append(elapsed)
+    return suggested_ms, server.key_counts["bench"] - before, first_ms
+
+
+def report(name, suggested_ms, upstream, first_ms):
+    print(f"-- {name}")
+    print(f"   推荐问题首次点击耗时 {' / '.join(f'{ms:.1f}' for ms in suggested_ms)} ms")
+    print(f"   一天 {DAY_QUESTIONS} 次提问的上游请求 {upstream} 次")
+    print(f"   前 {HEAD} 个常见问题当天首次被问到的耗时：中位数 {statistics.median(first_ms):.1f}ms  "
+          f"最大 {max(first_ms):.1f}ms")
+
+
+def main():
+    rng = random.Random(0)
+    pool = question_pool()
+    today = sample_day(pool, rng)
+    print("=" * 60)
+    print(f"🔥 常见问题预热：一天 {DAY_QUESTIONS} 次提问（{len(pool)} 个不同问题），上游延迟 {LATENCY * 1000:.0f}ms")
+    print("=" * 60)
+
+    with MockQianfanServer(latency=LATENCY) as server, tempfile.TemporaryDirectory() as tmp:
+        llm = LLMService(base_url=server.url, credentials=[Credential("bench", "bench-app")])
+        llm.credential_pool = CredentialPool([Credential("bench", "bench-app", rate=100, burst=10, name="bench")])
+
+        # 冷启动
+        llm.answer_cache = AnswerCache(os.path.join(tmp, "cold.db"))
+        report("冷启动", *replay(llm, server, today, pool[:HEAD]))
+
+        # 低峰时段预热：用上周同分布的日志（预热任务使用独立的缓存文件，模拟另一个进程）
+        last_week = os.path.join(tmp, "last_week.csv")
+        write_log(last_week, sample_day(pool, rng) * 7)
+        llm.answer_cache = AnswerCache(os.path.join(tmp, "job.db"))
+        warm_file = os.path.join(tmp, cache_warmer.WARM_FILE)
+        warm = cache_warmer.warm_questions(last_week, TOP_N)
+        start = time.perf_counter()
+        stats = cache_warmer.run(llm, warm, warm_file, qps=20)
+        print(f"-- 预热任务：{len(warm)} 个问题，{stats}，耗时 {time.perf_counter() - start:.1f}s")
+
+        # 应用重启：新缓存载入预热文件
+        llm.answer_cache = AnswerCache(os.path.join(tmp, "app.db"))
+        print(f"   启动时载入 {llm.answer_cache.load_warm(warm_file)} 条预热回答")
+        report("预热后", *replay(llm, server, today, pool[:HEAD]))
+
+        # 再次运行预热任务：未过期的回答直接沿用
+        stats = cache_warmer.run(llm, warm, warm_file, qps=20)
+        print(f"-- 再次运行预热任务：{stats}")
+        # 缓存写入在工作线程的回调中完成，删除临时目录前等它结束
+        llm.scheduler.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+问题聚类基准测试
+用“主题 × 需求 × 问法”生成带真实分组的合成日志（同一主题同一需求的不同问法为一组，
+同一主题的不同需求、只差一个限定词的主题如“国家奖学金/校级奖学金”应分开），
+报告 MinHash + LSH 聚类的耗时、纯度（簇内多数组的占比）和完整度（每组落在最大簇中的占比），
+并在长尾日志上与两两比较 Jaccard 相似度的平方复杂度做法外推对比。
+聚类质量的断言见 tests/test_question_clusters.py，这里只做测量。
+
+运行方式（仓库根目录）：python -m benchmarks.bench_clusters [--rows 1000000] [--topics 2000]
+"""
+
+import argparse
+import itertools
+import random
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from benchmarks.bench_tokenize import synthetic_questions
+from question_clusters import (BANDS, THRESHOLD, canonical_question, cluster_questions,
+                               cluster_report)
+
+SUBJECTS = ["奖学金", "助学金", "助学贷款", "勤工助学岗位", "转专业", "考研", "推免", "四六级考试",
+            "医保报销", "校园卡补办", "宿舍调换", "选课", "缓考", "补考", "休学", "复学", "入党",
+            "入团", "实习证明", "毕业论文答辩", "教师资格证", "普通话考试", "体测", "请假", "学籍证明"]
+QUALIFIERS = ["", "国家", "校级", "省级", "本科生", "研究生", "新生", "毕业生", "留学生", "专升本"]
+# 需求 -> 该需求的不同问法
+INTENTS = {
+    "条件": ["{}有什么要求", "{}条件", "{}需要什么条件", "请问{}的要求是什么", "{}的资格"],
+    "流程": ["{}怎么申请", "{}如何办理", "{}申请流程", "{}的办理步骤", "我想问一下{}怎么办"],
+    "时间": ["{}什么时候开始", "{}的时间", "{}截止日期", "{}什么时候"],
+    "材料": ["{}需要哪些材料", "{}要准备什么资料", "{}材料"],
+}
+
+
+def synthetic_log(rows, topics, seed=0):
+    """返回 (问题列表, 真实分组列表, 点踩掩码)，问题的分组频率服从长尾分布"""
+    rng = random.Random(seed)
+    pool = [q + s for q, s in itertools.product(QUALIFIERS, SUBJECTS)]
+    rng.shuffle(pool)
+    subjects = pool[:topics]
+    groups = [(subject, intent) for subject in subjects for intent in INTENTS]
+    weights = [1 / (rank + 1) for rank in range(len(groups))]
+    chosen = rng.choices(range(len(groups)), weights=weights, k=rows)
+    questions, truth = [], []
+    for g in chosen:
+        subject, intent = groups[g]
+        questions.append(rng.choice(INTENTS[intent]).format(subject) + rng.choice(["", "？", "?", "呢"]))
+        truth.append(g)
+    dislike = np.array([rng.random() < 0.05 for _ in range(rows)])
+    return questions, np.array(truth), dislike
+
+
+def quality(labels, truth):
+    """纯度与完整度（按问题行数加权）"""
+    by_cluster = defaultdict(Counter)
+    by_truth = defaultdict(Counter)
+    for label, group in zip(labels.tolist(), truth.tolist()):
+        by_cluster[label][group] += 1
+        by_truth[group][label] += 1
+    total = len(labels)
+    purity = sum(c.most_common(1)[0][1] for c in by_cluster.values()) / total
+    completeness = sum(c.most_common(1)[0][1] for c in by_truth.values()) / total
+    return purity, completeness
+
+
+def pairwise_seconds(questions, sample=1500):
+    """两两比较 Jaccard 的做法：在 sample 个不同问题上实测，按 n^2 外推到全部不同问题"""
+    unique = list(dict.fromkeys(canonical_question(q) for q in questions))
+    shingles = [{t[i:i + 2] for i in range(len(t) - 1)} or {t} for t in unique[:sample]]
+    start = time.perf_counter()
+    for a, b in itertools.combinations(shingles, 2):
+        len(a & b) / len(a | b)
+    elapsed = time.perf_counter() - start
+    return len(unique), elapsed * (len(unique) / len(shingles)) ** 2
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--topics", type=int, default=200, help="主题数（每个主题4种需求）")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--bands", type=int, default=BANDS)
+    parser.add_argument("--scale-unique", type=int, default=50_000, help="规模测试的不同问题数")
+    args = parser.parse_args()
+
+    questions, truth, dislike = synthetic_log(args.rows, args.topics)
+    print("=" * 60)
+    print(f"🧩 问题聚类：{args.rows:,} 行，{len(set(questions)):,} 种写法，{len(set(truth.tolist())):,} 个真实分组")
+    print("=" * 60)
+
+    start = time.perf_counter()
+    labels = cluster_questions(questions, threshold=args.threshold, bands=args.bands)
+    elapsed = time.perf_counter() - start
+    purity, completeness = quality(labels, truth)
+    print(f"MinHash + LSH: {elapsed:.2f}s，{len(np.unique(labels)):,} 个簇，"
+          f"纯度 {purity:.1%}，完整度 {completeness:.1%}")
+
+    start = time.perf_counter()
+    report = cluster_report(questions, labels, {"dislike": dislike}, top_n=5)
+    print(f"簇汇总: {time.perf_counter() - start:.2f}s")
+    for c in report:
+        print(f"  {c['representative']}: {c['size']}次，{c['variants']}种问法，点踩率 {c['dislike_rate']:.1%}，"
+              f"如 {' / '.join(c['examples'])}")
+
+    unique, seconds = pairwise_seconds(questions)
+    print(f"两两比较（{unique:,} 个归一化问题）外推约 {seconds:.1f}s")
+
+    # 规模：与分词基准相同的长尾日志，不同问题数多得多
+    questions = synthetic_questions(args.rows, args.scale_unique)
+    start = time.perf_counter()
+    labels = cluster_questions(questions, threshold=args.threshold, bands=args.bands)
+    elapsed = time.perf_counter() - start
+    unique, seconds = pairwise_seconds(questions)
+    print(f"-- 长尾日志 {args.rows:,} 行，{unique:,} 个归一化问题：MinHash + LSH {elapsed:.2f}s"
+          f"（{len(np.unique(labels)):,} 个簇），两两比较外推约 {seconds:.0f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+对话记录库基准测试
+1. 分析：按 evolution_logs.csv 的表结构生成合成日志，分别用CSV全量读入 pandas 和
+   导入对话记录库后做 SQL 聚合，逐个报告 EvolutionAnalyzer 各方法的耗时与内存峰值（tracemalloc，
+   不含 SQLite 自身的页缓存）
+2. 写入：多个线程同时提交日志，比较CSV和对话记录库两种后台写入器的吞吐与丢弃数，
+   写入期间分析进程同时查询（WAL 下读不阻塞写）
+两种方式统计结果一致、并发写入不丢行、导出再导入一致的断言见 tests/test_analyzer.py 和
+tests/test_conversation_store.py，这里只做测量。
+
+运行方式（仓库根目录）：python -m benchmarks.bench_conversation_store [--rows 1000000]
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import jieba
+
+from benchmarks.bench_analyzer import METHODS, measure, write_synthetic_log
+from conversation_logger import ConversationLogger, StoreLogger
+from conversation_store import ConversationStore
+from evolution_analyzer import EvolutionAnalyzer
+
+
+def run_methods(analyzer):
+    results = [("load_data",) + measure(analyzer.load_data)]
+    for name in METHODS:
+        results.append((name,) + measure(getattr(analyzer, name)))
+    return results
+
+
+def bench_analysis(rows, tmp):
+    csv_path = os.path.join(tmp, "logs.csv")
+    db_path = os.path.join(tmp, "conversations.db")
+    write_synthetic_log(csv_path, rows)
+    print(f"\n📄 {rows:,} 行合成日志（CSV {os.path.getsize(csv_path) / 2**20:.0f}MB）")
+
+    store = ConversationStore(db_path)
+    start = time.perf_counter()
+    stats = store.import_csv(csv_path)
+    print(f"-- 导入对话记录库：{stats['imported']:,} 行，{time.perf_counter() - start:.1f}s，"
+          f"库文件 {os.path.getsize(db_path) / 2**20:.0f}MB")
+    store.close()
+
+    # 分词缓存先预热，两种方式比较的都是缓存命中后的耗时
+    token_cache = os.path.join(tmp, "token_cache.db")
+    warm = EvolutionAnalyzer(csv_path, token_cache_file=token_cache, db_file=db_path)
+    measure(lambda: warm.load_data() and warm.analyze_high_frequency_questions())
+    csv_results = run_methods(EvolutionAnalyzer(csv_path, token_cache_file=token_cache, db_file=None))
+    db_results = run_methods(EvolutionAnalyzer(csv_path, token_cache_file=token_cache, db_file=db_path))
+
+    print(f"  {'':<36} {'CSV + pandas':>24} {'SQL 聚合':>24}")
+    for (name, csv_time, csv_peak), (_, db_time, db_peak) in zip(csv_results, db_results):
+        print(f"  {name:<36} {csv_time:7.2f}s {csv_peak / 2**20:8.1f}MB  {db_time:7.2f}s {db_peak / 2**20:8.1f}MB")
+    csv_total = sum(r[1] for r in csv_results)
+    db_total = sum(r[1] for r in db_results)
+    print(f"  {'合计':<36} {csv_total:7.2f}s {'':>10}  {db_total:7.2f}s")
+
+
+def bench_writes(logger, rows, threads, reader=None):
+    """threads 个线程同时提交共 rows 行日志，返回 (耗时, 统计, 并发查询次数)"""
+    row = ["2026-03-01 12:00:00", "session", "奖学金怎么申请", "同学你好，" * 50, 250, 1, "", 800, True, 5, 300, 2]
+    per_thread = rows // threads
+    done = threading.Event()
+    queries = [0]
+
+    def submit():
+        for _ in range(per_thread):
+            logger.log(row)
+
+    def query():
+        store = ConversationStore(reader)
+        while not done.is_set():
+            store.quality_stats()
+            queries[0] += 1
+        store.close()
+
+    workers = [threading.Thread(target=submit) for _ in range(threads)]
+    watcher = threading.Thread(target=query) if reader else None
+    start = time.perf_counter()
+    if watcher:
+        watcher.start()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    logger.flush(timeout=120)
+    elapsed = time.perf_counter() - start
+    done.set()
+    if watcher:
+        watcher.join()
+    logger.close()
+    return elapsed, logger.get_stats(), queries[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--write-rows", type=int, default=200_000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    jieba.setLogLevel(60)
+    jieba.initialize()
+
+    print("=" * 60)
+    print("🗄️ 对话记录库：SQL 聚合 vs CSV 全量读入")
+    print("=" * 60)
+    with tempfile.TemporaryDirectory() as tmp:
+        bench_analysis(args.rows, tmp)
+
+        print(f"\n✍️ {args.threads} 个线程同时提交 {args.write_rows:,} 行日志")
+        for name, logger, reader in (
+            ("CSV", ConversationLogger(os.path.join(tmp, "writes.csv"), max_queue=10000, block_timeout=5.0), None),
+            ("对话记录库", StoreLogger(os.path.join(tmp, "writes.db"), max_queue=10000, block_timeout=5.0),
+             os.path.join(tmp, "writes.db")),
+        ):
+            elapsed, stats, queries = bench_writes(logger, args.write_rows, args.threads, reader)
+            note = f"，期间并发查询 {queries} 次" if reader else ""
+            print(f"-- {name}: {stats['written'] / elapsed:,.0f} 行/秒，写入 {stats['written']:,}，"
+                  f"丢弃 {stats['dropped']}，错误 {stats['errors']}，{stats['flushes']} 批{note}")
+
+
+if __name__ == "__main__":
+    main()
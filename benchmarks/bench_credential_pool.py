@@ -0,0 +1,77 @@
+"""
+凭据池基准测试（本地模拟服务器按 API Key 限流，超出返回429）
+1. 吞吐扩展：每个Key客户端预算与服务端上限相同，1/2/4 个Key的总QPS应线性增长且没有429
+2. 摘除：其中一个Key在服务端的上限远低于客户端预算，返回429后被摘除，流量转到其他Key
+正确性断言见 tests/test_credential_pool.py，这里只做测量。
+
+运行方式（仓库根目录）：python -m benchmarks.bench_credential_pool [每轮请求数]
+"""
+
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from credential_pool import Credential, CredentialPool
+from llm_service import LLMService
+from mock_qianfan import MockQianfanServer
+from scheduler import RequestScheduler
+
+KEY_QPS = 5.0
+KEY_BURST = 2  # 服务端允许少量突发，吸收网络抖动
+LATENCY = 0.05
+
+
+def run_round(llm, credentials, n, tag, eject_seconds=30.0):
+    llm.credential_pool = CredentialPool(credentials, eject_seconds=eject_seconds)
+    llm.scheduler = RequestScheduler(llm._process_request, None, workers=len(credentials) * 2)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        # 每个请求带 conversation_id，绕过缓存和请求合并
+        results = list(pool.map(lambda i: llm.ask(f"问题{i}", f"{tag}-{i}"), range(n)))
+    elapsed = time.perf_counter() - start
+    llm.scheduler.shutdown()
+    ok = sum(1 for answer, cid, _ in results if cid)
+    return elapsed, ok
+
+
+def bench_scaling(server, llm, n):
+    print(f"-- 吞吐扩展：每个Key {KEY_QPS:.0f} QPS，{n} 个请求")
+    for keys in (1, 2, 4):
+        credentials = [
+            Credential(f"scale-{keys}-{i}", "bench-app", rate=KEY_QPS, name=f"scale-{keys}-{i}")
+            for i in range(keys)
+        ]
+        server.rejected.clear()
+        elapsed, ok = run_round(llm, credentials, n, f"scale{keys}")
+        print(f"{keys} 个Key  成功 {ok}/{n}  耗时 {elapsed:.2f}s  "
+              f"吞吐 {n / elapsed:.1f} QPS  429次数 {sum(server.rejected.values())}")
+
+
+def bench_ejection(server, llm, n):
+    print(f"-- 摘除：3 个Key，其中 eject-1 在服务端只有 1 QPS")
+    server.key_qps = {"eject-0": KEY_QPS, "eject-1": 1.0, "eject-2": KEY_QPS}
+    credentials = [
+        Credential(f"eject-{i}", "bench-app", rate=KEY_QPS, name=f"eject-{i}") for i in range(3)
+    ]
+    elapsed, ok = run_round(llm, credentials, n, "eject", eject_seconds=5.0)
+    accepted = {key: count for key, count in sorted(server.key_counts.items()) if key.startswith("eject")}
+    print(f"成功 {ok}/{n}  耗时 {elapsed:.2f}s  服务端受理 {accepted}")
+    for name, stats in llm.credential_pool.get_stats().items():
+        print(f"   {name}: {stats}")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    print("=" * 60)
+    print("🔑 凭据池：按Key限流 + 负载均衡 + 故障摘除")
+    print("=" * 60)
+
+    with MockQianfanServer(latency=LATENCY, key_qps=KEY_QPS, key_burst=KEY_BURST) as server:
+        llm = LLMService(base_url=server.url, credentials=[Credential("bench", "bench-app")])
+        bench_scaling(server, llm, n)
+        bench_ejection(server, llm, n)
+
+
+if __name__ == "__main__":
+    main()
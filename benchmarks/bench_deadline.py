@@ -0,0 +1,123 @@
+"""
+请求截止时间与取消基准测试
+CLIENTS 位同学同时提问，凭据预算 RATE QPS，每人最多等待 PATIENCE 秒：
+- 无截止时间（原实现）：放弃等待的请求仍留在队列里，之后照样占用预算、请求上游，回答被丢弃
+- 有截止时间：排队中过期/取消的请求直接丢弃，进行中的请求HTTP超时收紧到剩余预算
+输出上游实际收到的请求数、其中有用/浪费的次数，以及队列排空所需时间。
+最后演示流式回答中途关闭生成器时，上游连接被尽早关闭。
+正确性断言见 tests/test_deadline.py，这里只做测量。
+
+运行方式（仓库根目录）：python -m benchmarks.bench_deadline
+"""
+
+import threading
+import time
+
+import llm_service
+from credential_pool import Credential, CredentialPool
+from llm_service import UPSTREAM_CALLS, DROPPED_REQUESTS, LLMService
+from mock_qianfan import MockQianfanServer
+from scheduler import RequestScheduler
+
+CLIENTS = 30
+RATE = 3.0
+PATIENCE = 2.0
+LATENCY = 0.3
+
+
+def counter_values():
+    return {
+        "useful": UPSTREAM_CALLS.value(outcome="useful"),
+        "wasted": UPSTREAM_CALLS.value(outcome="wasted"),
+        "expired": DROPPED_REQUESTS.value(reason="expired"),
+        "cancelled": DROPPED_REQUESTS.value(reason="cancelled"),
+    }
+
+
+def run_mode(llm, server, name, with_deadline):
+    llm.credential_pool = CredentialPool([Credential("bench", "bench-app", rate=RATE, burst=1, name="bench")])
+    llm.scheduler = RequestScheduler(llm._process_request, None, workers=4)
+    if with_deadline:
+        llm.__dict__.pop("_new_payload", None)
+        llm.__dict__.pop("_abandon", None)
+    else:
+        # 模拟原实现：没有截止时间，调用方超时后请求仍留在队列中
+        new_payload = LLMService._new_payload.__get__(llm)
+
+        def legacy_payload(*args, **kwargs):
+            payload = new_payload(*args, **kwargs)
+            payload["deadline"] += 3600
+            return payload
+
+        llm._new_payload = legacy_payload
+        llm._abandon = lambda payload, future: None
+    server.key_counts.clear()
+    before = counter_values()
+
+    answered = []
+
+    def client(i):
+        answer, cid, _ = llm.ask(f"问题{name}-{i}", f"conv-{name}-{i}", session_id=f"s{i}")
+        if cid:
+            answered.append(i)
+
+    start = time.monotonic()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(CLIENTS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # 等待队列排空、进行中的请求结束
+    while llm.scheduler.qsize() or any(c.in_flight for c in llm.credential_pool.credentials):
+        time.sleep(0.05)
+    drained = time.monotonic() - start
+    llm.scheduler.shutdown()
+
+    after = counter_values()
+    delta = {k: after[k] - before[k] for k in after}
+    print(f"-- {name}")
+    upstream = server.key_counts["bench"]
+    print(f"   收到回答 {len(answered)}/{CLIENTS}  上游请求 {upstream} 次，其中回答被丢弃 "
+          f"{upstream - len(answered)} 次  队列排空耗时 {drained:.1f}s")
+    if with_deadline:
+        print(f"   计数器：上游有用 {delta['useful']}，浪费 {delta['wasted']}；"
+              f"未请求上游即丢弃：过期 {delta['expired']}，取消 {delta['cancelled']}")
+
+
+def run_stream_cancel(llm, server):
+    llm.credential_pool = CredentialPool([Credential("bench", "bench-app", rate=RATE, burst=1, name="bench")])
+    llm.scheduler = RequestScheduler(llm._process_request, None, workers=1)
+    llm.__dict__.pop("_new_payload", None)
+    llm.__dict__.pop("_abandon", None)
+    before = counter_values()
+
+    stream = llm.ask_stream("流式取消测试", "conv-stream", session_id="stream")
+    next(stream)
+    start = time.monotonic()
+    stream.close()  # 页面重跑，生成器被关闭
+    while any(c.in_flight for c in llm.credential_pool.credentials):
+        time.sleep(0.01)
+    elapsed = time.monotonic() - start
+    llm.scheduler.shutdown()
+
+    after = counter_values()
+    print(f"-- 流式回答收到首块后关闭生成器：{elapsed:.2f}s 后上游连接释放"
+          f"（完整回答共 {server.chunk_delay * len(server.split_answer()):.1f}s），"
+          f"浪费的上游请求 {after['wasted'] - before['wasted']} 次")
+
+
+def main():
+    llm_service.REQUEST_TIMEOUT = PATIENCE
+    print("=" * 60)
+    print(f"⏳ 截止时间与取消：{CLIENTS} 人同时提问，预算 {RATE:.0f} QPS，每人最多等待 {PATIENCE:.0f}s")
+    print("=" * 60)
+
+    with MockQianfanServer(latency=LATENCY, chunk_delay=0.2) as server:
+        llm = LLMService(base_url=server.url, credentials=[Credential("bench", "bench-app")])
+        run_mode(llm, server, "无截止时间", with_deadline=False)
+        run_mode(llm, server, "截止时间 + 取消", with_deadline=True)
+        run_stream_cancel(llm, server)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+公平排队基准测试（调度器层面，派发速率 10 QPS）
+1. 一个会话连续提交 20 个请求后，另外 5 个会话各提交 1 个：
+   对比 FIFO 与按会话轮转时，其他会话的请求排在第几个被派发
+2. 全局排队上限：队列满时 submit 立即拒绝，统计拒绝耗时
+3. 预计等待：提交时的估算等待时间 vs 实际等待时间
+4. 匿名调用方：不带会话ID和对话ID的并发提问（key 为None）不受单会话上限限制，全部得到回答
+正确性断言见 tests/test_fair_queue.py，这里只做测量。
+
+运行方式（仓库根目录）：python -m benchmarks.bench_fair_queue
+"""
+
+import statistics
+import threading
+import time
+
+from credential_pool import Credential
+from llm_service import QUEUE_FULL_MESSAGE, LLMService
+from mock_qianfan import MockQianfanServer
+from scheduler import QueueFullError, RequestScheduler, TokenBucket
+
+RATE = 10.0
+ANONYMOUS = 6  # 超过单会话未完成请求上限（3）
+
+
+def run_order(fair):
+    order = []
+    scheduler = RequestScheduler(order.append, TokenBucket(rate=RATE), workers=1,
+                                 max_in_flight_per_key=1 if fair else None)
+    futures = []
+    for i in range(20):
+        futures.append(scheduler.submit(f"spam-{i}", key="spammer" if fair else None))
+    for i in range(5):
+        futures.append(scheduler.submit(f"student-{i}", key=f"student-{i}" if fair else None))
+    for future in futures:
+        future.result()
+    scheduler.shutdown()
+    return [i + 1 for i, item in enumerate(order) if item.startswith("student")]
+
+
+def bench_fairness():
+    print("-- 公平性：spammer 先提交20个，5位同学各提交1个")
+    fifo = run_order(fair=False)
+    fair = run_order(fair=True)
+    print(f"FIFO    同学们的派发名次 {fifo}  最后一位约等待 {fifo[-1] / RATE:.1f}s")
+    print(f"轮转    同学们的派发名次 {fair}  最后一位约等待 {fair[-1] / RATE:.1f}s")
+
+
+def bench_rejection(max_queue=50):
+    scheduler = RequestScheduler(lambda payload: payload, TokenBucket(rate=RATE), max_queue=max_queue)
+    rejected, reject_times = 0, []
+    for i in range(max_queue * 2):
+        start = time.perf_counter()
+        try:
+            scheduler.submit(i, key=f"s{i}")
+        except QueueFullError:
+            rejected += 1
+            reject_times.append((time.perf_counter() - start) * 1e6)
+    scheduler.shutdown(wait=False)
+    print(f"-- 排队上限 {max_queue}：提交 {max_queue * 2} 个，拒绝 {rejected} 个，"
+          f"拒绝耗时中位数 {statistics.median(reject_times):.1f}µs")
+
+
+def bench_estimate(sessions=8, per_session=3):
+    submitted = {}
+    actual = {}
+
+    def handler(payload):
+        actual[payload] = time.perf_counter() - submitted[payload]
+
+    scheduler = RequestScheduler(handler, TokenBucket(rate=RATE), max_in_flight_per_key=1)
+    estimates = {}
+    futures = []
+    for round_ in range(per_session):
+        for s in range(sessions):
+            name = f"s{s}-{round_}"
+            estimates[name] = scheduler.requests_ahead(key=f"s{s}") / RATE
+            submitted[name] = time.perf_counter()
+            futures.append(scheduler.submit(name, key=f"s{s}"))
+    for future in futures:
+        future.result()
+    scheduler.shutdown()
+
+    errors = [abs(estimates[name] - actual[name]) for name in estimates]
+    print(f"-- 预计等待：{len(errors)} 个请求，估算误差中位数 {statistics.median(errors):.2f}s，"
+          f"最大 {max(errors):.2f}s（最长实际等待 {max(actual.values()):.1f}s）")
+
+
+def bench_anonymous():
+    """与线上相同的单会话上限（未完成3个、并发1个），ANONYMOUS 个匿名调用方同时提问"""
+    with MockQianfanServer(latency=0.2) as server:
+        llm = LLMService(base_url=server.url, credentials=[
+            Credential("bench", "bench-app", rate=1e6, burst=1e6)
+        ])
+        llm.scheduler = RequestScheduler(llm._process_request, None, workers=4, max_queue=100,
+                                         max_pending_per_key=3, max_in_flight_per_key=1)
+        results = []
+
+        def client(i):
+            results.append(llm.ask(f"匿名问题{i}", use_cache=False))
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(ANONYMOUS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        llm.scheduler.shutdown()
+
+    answered = sum(1 for answer, cid, _ in results if cid)
+    rejected = sum(1 for answer, _, _ in results if answer == QUEUE_FULL_MESSAGE)
+    print(f"-- 匿名调用方：{ANONYMOUS} 个同时提问，回答 {answered} 个，拒绝 {rejected} 个，耗时 {elapsed:.2f}s")
+
+
+def main():
+    print("=" * 60)
+    print("⚖️ 按会话公平排队")
+    print("=" * 60)
+    bench_fairness()
+    bench_rejection()
+    bench_estimate()
+    bench_anonymous()
+
+
+if __name__ == "__main__":
+    main()
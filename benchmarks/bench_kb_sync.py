@@ -0,0 +1,89 @@
+"""
+知识库增量同步基准测试
+把 zhishiku 复制到临时目录，先全量同步一次，再依次做几种典型编辑并增量同步，
+上传器模拟远程知识库：每次操作固定开销 + 按上传字节计的重新索引耗时。
+对比每次编辑后的上传量、耗时与“整份文档重新上传”的做法。
+只推送变化小节的断言见 tests/test_kb_sync.py，这里只做测量。
+
+运行方式（仓库根目录）：python -m benchmarks.bench_kb_sync
+"""
+
+import os
+import shutil
+import tempfile
+import time
+
+import kb_sync
+
+PER_OP = 0.005  # 每次远程调用的固定开销（秒）
+PER_KB = 0.002  # 远程重新索引每KB的耗时（秒）
+
+
+class SimulatedUploader(kb_sync.LocalUploader):
+    def upsert(self, chunk_id, chunk, remote_id=None):
+        before = self.stats["bytes"]
+        remote_id = super().upsert(chunk_id, chunk, remote_id)
+        time.sleep(PER_OP + PER_KB * (self.stats["bytes"] - before) / 1024)
+        return remote_id
+
+    def delete(self, chunk_id, remote_id):
+        super().delete(chunk_id, remote_id)
+        time.sleep(PER_OP)
+
+
+def edit(path, transform):
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(transform(text))
+
+
+def full_upload_cost(paths):
+    """原做法：重新上传被修改的整份文档"""
+    size = sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+    return len(paths), size, len(paths) * PER_OP + PER_KB * size / 1024
+
+
+def main():
+    print("=" * 60)
+    print("📚 知识库增量同步：每次操作 %.0fms + 每KB %.0fms" % (PER_OP * 1000, PER_KB * 1000))
+    print("=" * 60)
+    with tempfile.TemporaryDirectory() as tmp:
+        kb_dir = os.path.join(tmp, "zhishiku")
+        shutil.copytree("zhishiku", kb_dir)
+        manifest = os.path.join(tmp, kb_sync.MANIFEST_FILE)
+        uploader = SimulatedUploader(os.path.join(tmp, "remote"))
+        big = os.path.join(kb_dir, "04_学工流程.md")
+        other = os.path.join(kb_dir, "05_职能部门.md")
+
+        def step(name, changed_files, apply=None):
+            if apply:
+                apply()
+            before = dict(uploader.stats)
+            start = time.perf_counter()
+            stats = kb_sync.sync(uploader, kb_dir, manifest)
+            elapsed = time.perf_counter() - start
+            pushed = (uploader.stats["bytes"] - before["bytes"]) / 1024
+            ops = (uploader.stats["upserts"] - before["upserts"]) + (uploader.stats["deletes"] - before["deletes"])
+            print(f"-- {name}")
+            print(f"   增量：新增 {stats['added']} 修改 {stats['changed']} 删除 {stats['deleted']}，"
+                  f"{ops} 次操作，上传 {pushed:.1f}KB，耗时 {elapsed:.2f}s")
+            if changed_files:
+                docs, size, cost = full_upload_cost(changed_files)
+                print(f"   整份重传：{docs} 个文档，{size / 1024:.1f}KB，约 {cost:.2f}s")
+
+        all_files = [os.path.join(kb_dir, name) for name in sorted(os.listdir(kb_dir))]
+        step("首次全量同步", all_files)
+        step("无变化", [])
+        step("只改空白（OCR重排、汉字间加空格）", [big],
+             lambda: edit(big, lambda t: t.replace("录取通知书", "录取 通知 书")
+                                      .replace("《报到须知》的要\n求", "《报到须知》\n的要求")
+                                      .replace("\n", "  \n")))
+        step("改一个错字", [big], lambda: edit(big, lambda t: t.replace("办理人学手续", "办理入学手续", 1)))
+        step("新增一个小节", [other],
+             lambda: edit(other, lambda t: t + "\n###10.9.9 新增事项\n新增事项的办理说明。\n"))
+        step("删除一个文档", [], lambda: os.remove(other))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+消息渲染微基准
+对 10 / 100 / 1000 条消息的对话历史，比较：
+- 原实现：每次重跑逐条调用旧版 format_with_line_breaks（多次 replace + 正则）
+- 当前 format_with_line_breaks（无缓存，应与原实现相当）
+- 带渲染缓存的重跑（历史消息全部命中缓存）
+与旧实现输出一致的断言见 tests/test_message_renderer.py，这里只做测量。
+
+运行方式（仓库根目录）：python -m benchmarks.bench_render
+"""
+
+import re
+import time
+
+import pandas as pd
+
+from message_renderer import format_with_line_breaks, render_message
+
+
+def legacy_format_with_line_breaks(text):
+    """旧版实现，仅用于对照"""
+    if not text:
+        return text
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    text = text.replace('。', '。\n')
+    text = text.replace('？', '？\n')
+    text = text.replace('！', '！\n')
+    text = text.replace('；', '；\n')
+    text = text.replace('：', '：\n')
+    text = re.sub(r'(\d+\.)', r'\n\1', text)
+    text = re.sub(r'([一二三四五六七八九十])[、.]', r'\n\1、', text)
+    text = re.sub(r'（(\d+)）', r'\n（\1）', text)
+    text = re.sub(r'\n\s*\n', '\n\n', text)
+    return '<br>'.join(text.split('\n'))
+
+
+def build_history(n):
+    """用日志中的真实问答拼出 n 条消息的对话历史"""
+    df = pd.read_csv("evolution_logs.csv")
+    pairs = list(zip(df['问题'].astype(str), df['回答'].astype(str)))
+    history = []
+    for i in range(n // 2):
+        question, answer = pairs[i % len(pairs)]
+        # 每轮内容略有不同，避免不同轮次互相命中缓存
+        history.append({"role": "user", "content": f"{question}（第{i}轮）"})
+        history.append({"role": "assistant", "content": f"{answer}\n\n---\n第{i}轮 测试阶段，请在下方进行反馈"})
+    return history
+
+
+def timed(func, history, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(history)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def rerun_legacy(history):
+    for m in history:
+        if m["role"] != "user":
+            legacy_format_with_line_breaks(m["content"])
+
+
+def rerun_uncached(history):
+    for m in history:
+        if m["role"] != "user":
+            format_with_line_breaks(m["content"])
+
+
+def rerun_cached(history):
+    for m in history:
+        render_message(m["role"], m["content"])
+
+
+def main():
+    print("=" * 60)
+    print("🖋️ 消息渲染微基准（每次重跑耗时，取5次最优）")
+    print("=" * 60)
+    for n in (10, 100, 1000):
+        history = build_history(n)
+        rerun_cached(history)  # 预热：模拟之前的重跑已渲染过这些消息
+        legacy = timed(rerun_legacy, history)
+        uncached = timed(rerun_uncached, history)
+        cached = timed(rerun_cached, history)
+        print(f"{n:>5} 条消息  旧实现 {legacy:8.3f}ms  无缓存 {uncached:8.3f}ms  缓存重跑 {cached:8.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
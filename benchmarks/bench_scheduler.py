@@ -0,0 +1,72 @@
+"""
+调度器基准测试
+1. 空闲时工作线程的唤醒次数（应为0，即没有轮询）
+2. 有预算时从提交到派发的延迟（应在亚毫秒级）
+3. 多工作线程共享同一预算时的实际QPS（不应超过配置值）
+正确性断言见 tests/test_scheduler.py，这里只做测量。
+
+运行方式（仓库根目录）：python -m benchmarks.bench_scheduler
+"""
+
+import statistics
+import time
+
+from scheduler import TokenBucket, RequestScheduler
+
+
+def bench_idle_wakeups(idle_seconds=1.0, workers=4):
+    """空闲一段时间后统计工作线程被唤醒的次数"""
+    bucket = TokenBucket(rate=1000, burst=1000)
+    scheduler = RequestScheduler(lambda payload: payload, bucket, workers=workers)
+    time.sleep(idle_seconds)
+    wakeups = scheduler.stats["wakeups"]
+    scheduler.shutdown()
+    print(f"空闲 {idle_seconds:.1f}s，{workers} 个工作线程，唤醒次数: {wakeups}")
+    return wakeups
+
+
+def bench_dispatch_latency(n=2000):
+    """预算充足时，从 submit 到 handler 开始执行的延迟"""
+    bucket = TokenBucket(rate=1e6, burst=1e6)
+    scheduler = RequestScheduler(lambda submitted_at: time.perf_counter() - submitted_at, bucket)
+
+    latencies = []
+    for _ in range(n):
+        future = scheduler.submit(time.perf_counter())
+        latencies.append(future.result())
+    scheduler.shutdown()
+
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(f"派发延迟（{n}次）: p50={p50:.3f}ms  p99={p99:.3f}ms")
+    return p50, p99
+
+
+def bench_shared_budget(rate=20, burst=1, workers=4, seconds=2.0):
+    """多工作线程共享一个令牌桶时，实际派发速率应不超过 rate"""
+    bucket = TokenBucket(rate=rate, burst=burst)
+    scheduler = RequestScheduler(lambda payload: time.monotonic(), bucket, workers=workers)
+
+    total = int(rate * seconds)
+    futures = [scheduler.submit(i) for i in range(total)]
+    stamps = sorted(f.result() for f in futures)
+    scheduler.shutdown()
+
+    elapsed = stamps[-1] - stamps[0]
+    qps = (len(stamps) - 1) / elapsed if elapsed > 0 else float("inf")
+    print(f"共享预算: 配置 {rate} QPS，{workers} 个工作线程，实际 {qps:.2f} QPS")
+    return qps
+
+
+def main():
+    print("=" * 60)
+    print("⏱️ 调度器基准测试")
+    print("=" * 60)
+    bench_idle_wakeups()
+    bench_dispatch_latency()
+    bench_shared_budget()
+
+
+if __name__ == "__main__":
+    main()
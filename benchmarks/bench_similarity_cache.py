@@ -0,0 +1,153 @@
+"""
+相似问题缓存基准测试
+1. 准确性：用问题聚类基准的“主题 × 需求 × 问法”数据，每组缓存一种问法，
+   用同组其他问法（应命中）和同主题其他需求 / 只差限定词的主题（不应命中）查询，
+   报告不同阈值下的命中率和误命中率
+2. 延迟：索引 10 万个不同问题（知识库短语套问法模板）后，测单次 lookup 的 p50/p99，
+   并与对全部缓存做一次向量化余弦（不用倒排表和前缀过滤）对比；
+   另测大量问题只差编号、共享全部特征的最坏情况
+淘汰、数字校验和权重重算的断言见 tests/test_similarity_cache.py，这里只做测量。
+
+运行方式（仓库根目录）：python -m benchmarks.bench_similarity_cache [--entries 100000]
+"""
+
+import argparse
+import glob
+import random
+import re
+import time
+
+import numpy as np
+
+from benchmarks.bench_clusters import INTENTS, QUALIFIERS, SUBJECTS
+from benchmarks.bench_tokenize import synthetic_questions
+from answer_cache import normalize_question
+from similarity_cache import SimilarityCache
+
+
+def accuracy(threshold, rng):
+    """返回 (同义问法命中率, 不同需求误命中率)"""
+    cache = SimilarityCache(max_entries=10_000, threshold=threshold)
+    groups = {}
+    for qualifier in QUALIFIERS:
+        for subject in SUBJECTS:
+            for intent, templates in INTENTS.items():
+                phrasings = [t.format(qualifier + subject) for t in templates]
+                rng.shuffle(phrasings)
+                groups[(qualifier + subject, intent)] = phrasings
+                cache.add(phrasings[0])
+
+    same = wrong = same_total = other_total = 0
+    for (topic, intent), phrasings in groups.items():
+        for question in phrasings[1:]:
+            match = cache.lookup(question)
+            same_total += 1
+            if match is None:
+                continue
+            if match in {normalize_question(p) for p in phrasings}:
+                same += 1
+            else:
+                wrong += 1
+    # 缓存中没有的需求：换一批只差限定词的主题再查
+    probe = SimilarityCache(max_entries=10_000, threshold=threshold)
+    for subject in SUBJECTS:
+        for intent, templates in INTENTS.items():
+            probe.add(templates[0].format("国家" + subject))
+    for qualifier in QUALIFIERS:
+        if qualifier == "国家":
+            continue
+        for subject in SUBJECTS:
+            for templates in INTENTS.values():
+                other_total += 1
+                if probe.lookup(templates[1].format(qualifier + subject)) is not None:
+                    wrong += 1
+    return same / same_total, wrong / (same_total + other_total)
+
+
+def kb_questions(count, rng):
+    """从知识库正文中随机截取短语套上问法模板，生成 count 个不同的问题"""
+    text = ""
+    for path in sorted(glob.glob("zhishiku/*.md")):
+        with open(path, "r", encoding="utf-8") as f:
+            text += f.read()
+    spans = [s for s in re.split(r'[^\u4e00-\u9fff]+', text) if len(s) >= 4]
+    templates = [t for group in INTENTS.values() for t in group]
+    questions = set()
+    while len(questions) < count:
+        span = rng.choice(spans)
+        start = rng.randrange(len(span) - 3)
+        phrase = span[start:start + rng.randint(4, 10)]
+        questions.add(rng.choice(templates).format(phrase))
+    return sorted(questions)
+
+
+def measure(cache, probes):
+    latencies = []
+    for question in probes:
+        start = time.perf_counter()
+        cache.lookup(question)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return percentile(latencies, 50), percentile(latencies, 99)
+
+
+def full_scan(cache, question):
+    """对照：不用倒排表，对全部缓存行做一次向量化余弦"""
+    features, weights, _ = cache._vectorize(question)
+    order = np.argsort(features)
+    sorted_features, sorted_weights = features[order], weights[order]
+    index = np.minimum(np.searchsorted(sorted_features, cache._features), len(sorted_features) - 1)
+    matched = sorted_features[index] == cache._features
+    scores = (cache._weights * np.where(matched, sorted_weights[index], 0)).sum(axis=1)
+    return int(np.argmax(scores))
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=5_000)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🔎 相似问题缓存")
+    print("=" * 60)
+    for threshold in (0.85, 0.9, 0.93, 0.95):
+        hit_rate, false_rate = accuracy(threshold, random.Random(0))
+        print(f"-- 阈值 {threshold}: 同义问法命中率 {hit_rate:.1%}，误命中率 {false_rate:.2%}")
+
+    rng = random.Random(1)
+    questions = kb_questions(args.entries, rng)
+    cache = SimilarityCache(max_entries=args.entries)
+    start = time.perf_counter()
+    cache.add_many(questions)
+    print(f"-- 索引 {len(cache):,} 个问题（知识库短语 × 问法模板）：{time.perf_counter() - start:.1f}s")
+
+    # 一半是缓存问题的变体（加语气词、换标点、换问法），一半是新问题
+    probes = [rng.choice(questions) + rng.choice(["呢", "？", "啊"]) for _ in range(args.queries // 2)]
+    probes += kb_questions(args.entries + args.queries // 2, random.Random(2))[-(args.queries // 2):]
+    rng.shuffle(probes)
+    p50, p99 = measure(cache, probes)
+    stats = cache.get_stats()
+    print(f"-- lookup（倒排表 + 前缀过滤）：p50 {p50:.3f}ms  p99 {p99:.3f}ms，命中率 {stats['hit_rate']:.1f}%")
+
+    scan = []
+    for question in probes[:200]:
+        start = time.perf_counter()
+        full_scan(cache, question)
+        scan.append((time.perf_counter() - start) * 1000)
+    print(f"-- 对照：全量向量化余弦 p50 {percentile(scan, 50):.2f}ms")
+
+    # 最坏情况：大量缓存问题只差编号，共享全部特征，候选数受 MAX_CANDIDATES 限制
+    numbered = list(dict.fromkeys(synthetic_questions(args.entries * 4, args.entries * 2)))[:args.entries]
+    dense = SimilarityCache(max_entries=args.entries)
+    dense.add_many(numbered)
+    probes = [rng.choice(numbered) + "呢" for _ in range(1000)]
+    dense_p50, dense_p99 = measure(dense, probes)
+    print(f"-- 最坏情况（{len(dense):,} 个只差编号的问题）：p50 {dense_p50:.3f}ms  p99 {dense_p99:.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+冷启动基准测试
+1. 按 python -X importtime 的输出统计各入口模块的导入耗时和最重的依赖，
+   以及 streamlit / pandas / jieba 这些重模块是否在导入时被提前加载
+2. 全新进程中首次分词的耗时（含导入 jieba）：jieba 从 dict.txt 生成词典（新容器）、
+   jieba 自带的 /tmp 缓存（marshal.load 逐块读文件）、
+   预构建的 jieba_dict.cache（含知识库关键词，内存映射后 marshal.loads）
+重模块延迟加载的断言见 tests/test_startup.py，这里只做测量。
+
+运行方式（仓库根目录）：python -m benchmarks.bench_startup
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+# 入口模块 -> 导入时不应加载的重模块
+ENTRY_MODULES = {
+    "llm_service": ("streamlit", "pandas", "jieba"),
+    "cache_warmer": ("streamlit", "pandas", "jieba"),
+    "kb_retrieval": ("jieba",),
+    "evolution_analyzer": ("streamlit", "jieba"),
+}
+REPEAT = 3
+
+
+def import_times(module):
+    """在新进程中导入 module，返回 {模块名: (自身耗时us, 累计耗时us)}，只保留顶层导入顺序"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            continue  # 表头
+        times[parts[2].strip()] = (self_us, cumulative_us)
+    return times
+
+
+def report_imports():
+    interpreter = set(import_times("sys"))  # 解释器启动时本来就会导入的模块
+    for module, forbidden in ENTRY_MODULES.items():
+        times = min((import_times(module) for _ in range(REPEAT)), key=lambda run: run[module][1])
+        total_ms = times[module][1] / 1000
+        loaded = [name for name in forbidden if name in times]
+        heaviest = sorted(
+            ((name, cumulative) for name, (_, cumulative) in times.items()
+             if "." not in name and name != module and name not in interpreter),
+            key=lambda item: -item[1]
+        )[:4]
+        print(f"-- import {module}: {total_ms:.0f}ms  最重的依赖 "
+              + "，".join(f"{name} {us / 1000:.0f}ms" for name, us in heaviest)
+              + (f"  提前加载了 {', '.join(loaded)}" if loaded else ""))
+
+
+FIRST_CUT = """
+import time
+start = time.perf_counter()
+{setup}
+words = jieba.lcut("勤工助学和留鲁就业怎么办理")
+print((time.perf_counter() - start) * 1000, "/".join(words))
+"""
+
+
+def first_cut_ms(setup, tmp_dir):
+    env = dict(os.environ, TMPDIR=tmp_dir)
+    result = subprocess.run([sys.executable, "-c", FIRST_CUT.format(setup=setup)],
+                            capture_output=True, text=True, check=True, env=env)
+    ms, words = result.stdout.split()
+    return float(ms), words
+
+
+def report_dictionary():
+    plain = "import jieba\njieba.setLogLevel(60)"
+    prebuilt = "from jieba_dict import get_jieba\njieba = get_jieba()"
+    if not os.path.exists("jieba_dict.cache"):
+        subprocess.run([sys.executable, "jieba_dict.py"], check=True, capture_output=True)
+
+    with tempfile.TemporaryDirectory() as empty, tempfile.TemporaryDirectory() as warm:
+        cold_ms, cold_words = first_cut_ms(plain, empty)
+        first_cut_ms(plain, warm)  # 生成 jieba 自带的缓存
+        warm_ms = min(first_cut_ms(plain, warm)[0] for _ in range(REPEAT))
+        runs = [first_cut_ms(prebuilt, empty) for _ in range(REPEAT)]
+        prebuilt_ms, prebuilt_words = min(runs)
+    print(f"-- 首次分词（新容器，无 /tmp 缓存）  {cold_ms:.0f}ms  {cold_words}")
+    print(f"-- 首次分词（jieba 自带 /tmp 缓存）   {warm_ms:.0f}ms")
+    print(f"-- 首次分词（预构建 jieba_dict.cache） {prebuilt_ms:.0f}ms  {prebuilt_words}")
+
+
+def main():
+    print("=" * 60)
+    print("🚀 冷启动基准测试")
+    print("=" * 60)
+    report_imports()
+    report_dictionary()
+
+
+if __name__ == "__main__":
+    main()
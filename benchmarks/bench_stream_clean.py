@@ -0,0 +1,47 @@
+"""
+流式引用清理 / 格式化基准
+每块都对累计回答重跑批量清理+格式化（原实现，O(n²)）vs 流式版本（O(n)）。
+流式与批量输出一致、中间结果不含残缺引用标记的检查见 tests/test_answer_cleaner.py。
+
+运行方式（仓库根目录）：python -m benchmarks.bench_stream_clean
+"""
+
+import time
+
+from answer_cleaner import StreamingCleaner, clean_answer
+from message_renderer import StreamingFormatter, format_with_line_breaks
+from mock_qianfan import DEFAULT_ANSWER
+
+
+def bench(repeat_answer=40, chunk_size=4):
+    text = DEFAULT_ANSWER * repeat_answer
+    chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+
+    start = time.perf_counter()
+    answer = ""
+    for chunk in chunks:
+        answer += chunk
+        format_with_line_breaks(clean_answer(answer))
+    baseline = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    cleaner, formatter = StreamingCleaner(), StreamingFormatter()
+    for chunk in chunks:
+        formatter.feed(cleaner.feed(chunk))
+    formatter.feed(cleaner.finish())
+    formatter.finish()
+    streaming = (time.perf_counter() - start) * 1000
+
+    print(f"⏱️ {len(text)} 字 / {len(chunks)} 块：累计重跑 {baseline:.1f}ms  流式 {streaming:.1f}ms")
+
+
+def main():
+    print("=" * 60)
+    print("🧹 流式引用清理 / 格式化")
+    print("=" * 60)
+    for repeat in (1, 10, 40):
+        bench(repeat)
+
+
+if __name__ == "__main__":
+    main()
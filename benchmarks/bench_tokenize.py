@@ -0,0 +1,96 @@
+"""
+分词阶段基准测试
+用 evolution_logs.csv 中的问题生成数百万行的合成日志（大部分为重复问题），
+对比原来的逐行 jieba.lcut 循环与“去重 + 持久化缓存 + 多进程”的分词阶段。
+
+运行方式（仓库根目录）：python -m benchmarks.bench_tokenize [--rows 2000000] [--unique 50000]
+原始循环较慢，默认只在前 --baseline-rows 行上实测，再按行数线性外推。
+与逐行分词结果一致的断言见 tests/test_question_tokenizer.py，这里只做测量。
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+
+import pandas as pd
+
+from evolution_analyzer import STOP_WORDS
+from jieba_dict import get_jieba
+from question_tokenizer import TokenCache, count_keywords
+
+SEED_QUESTIONS = [
+    "奖学金怎么申请", "医保报销比例", "考研有什么要求", "选课系统怎么进",
+    "图书馆开放时间", "校园卡丢了怎么办", "助学贷款怎么办理", "入党流程是什么",
+    "心理咨询怎么预约", "出国留学需要什么条件", "学费怎么缴纳", "宿舍报修电话",
+]
+
+
+def synthetic_questions(rows, unique, seed=0):
+    """生成 rows 条问题，其中约 unique 个不同问题，频率服从长尾分布"""
+    rng = random.Random(seed)
+    try:
+        seeds = pd.read_csv("evolution_logs.csv")['问题'].dropna().astype(str).unique().tolist()
+    except (OSError, KeyError):
+        seeds = []
+    seeds = list(dict.fromkeys(seeds + SEED_QUESTIONS))
+
+    pool = seeds[:]
+    suffixes = ["", "？", "呢", "啊", "流程", "需要哪些材料", "在哪里办理", "截止时间"]
+    while len(pool) < unique:
+        pool.append(f"{rng.choice(seeds)}{rng.choice(suffixes)}{len(pool)}")
+
+    weights = [1 / (i + 1) for i in range(len(pool))]
+    return rng.choices(pool, weights=weights, k=rows)
+
+
+def baseline(questions):
+    """原实现：逐行 jieba.lcut（同一预构建词典）"""
+    lcut = get_jieba().lcut
+    words = []
+    for q in questions:
+        words.extend(lcut(str(q)))
+    return Counter(w for w in words if len(w) > 1 and w not in STOP_WORDS)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--unique", type=int, default=50_000)
+    parser.add_argument("--baseline-rows", type=int, default=200_000)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    get_jieba()
+
+    print("=" * 60)
+    print(f"✂️ 分词基准：{args.rows:,} 行，约 {args.unique:,} 个不同问题")
+    print("=" * 60)
+    questions = synthetic_questions(args.rows, args.unique)
+
+    sample = questions[:args.baseline_rows]
+    start = time.perf_counter()
+    baseline(sample)
+    sample_seconds = time.perf_counter() - start
+    baseline_seconds = sample_seconds * len(questions) / len(sample)
+    print(f"原逐行循环: {sample_seconds:.2f}s / {len(sample):,} 行，外推全量约 {baseline_seconds:.1f}s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = TokenCache(os.path.join(tmp, "token_cache.db"))
+
+        start = time.perf_counter()
+        count_keywords(questions, STOP_WORDS, cache=cache, workers=args.workers)
+        cold = time.perf_counter() - start
+        print(f"去重 + 多进程（冷缓存）: {cold:.2f}s，加速 {baseline_seconds / cold:.1f}x")
+
+        start = time.perf_counter()
+        count_keywords(questions, STOP_WORDS, cache=cache, workers=args.workers)
+        warm = time.perf_counter() - start
+        print(f"去重 + 持久化缓存（热缓存）: {warm:.2f}s，加速 {baseline_seconds / warm:.1f}x")
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
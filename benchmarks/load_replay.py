@@ -0,0 +1,264 @@
+"""
+线上日志回放压测
+按 evolution_logs.csv 中的问题顺序，以带突发的到达过程向 LLMService 提问
+（平时 BASE_QPS，每隔 BURST_EVERY 秒出现一段 BURST_SECONDS 秒的课间高峰 BURST_QPS），
+上游为本地模拟千帆服务器（对数正态延迟、按Key限流、随机429/5xx）。
+也可以用 --speedup 按日志时间戳的真实间隔加速回放。
+
+输出吞吐、各类结果数、排队等待和端到端延迟的 p50/p95/p99；
+--save 保存结果，--compare 与保存的基线对比，吞吐下降或尾延迟上升超过容差时以非0退出，
+可作为回归基准。
+
+运行方式（仓库根目录）：
+    python -m benchmarks.load_replay --duration 30
+    python -m benchmarks.load_replay --save baseline.json
+    python -m benchmarks.load_replay --compare baseline.json
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from adaptive_limiter import AdaptiveTokenBucket
+from answer_cache import AnswerCache
+from credential_pool import Credential, CredentialPool
+from llm_service import QUEUE_FULL_MESSAGE, TIMEOUT_MESSAGE, LLMService
+from mock_qianfan import MockQianfanServer, lognormal_latency
+from scheduler import RequestScheduler
+
+LOG_FILE = "evolution_logs.csv"
+TOLERANCE = 0.15  # 回归对比的容差
+ERROR_PREFIXES = ("错误", "API调用失败")
+
+
+def load_log(path):
+    """返回 [(时间戳秒, 问题)]，按时间排序"""
+    rows = []
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            question = (row.get("问题") or "").strip()
+            if not question:
+                continue
+            try:
+                ts = datetime.strptime(row["时间"], "%Y-%m-%d %H:%M:%S").timestamp()
+            except (KeyError, ValueError):
+                ts = None
+            rows.append((ts, question))
+    return rows
+
+
+def burst_arrivals(duration, base_qps, burst_qps, burst_every, burst_seconds, rng):
+    """非齐次泊松到达：课间高峰时段速率为 burst_qps，其余为 base_qps，返回到达时刻列表"""
+    arrivals = []
+    t = 0.0
+    peak = max(base_qps, burst_qps)
+    while True:
+        t += rng.expovariate(peak)
+        if t >= duration:
+            return arrivals
+        rate = burst_qps if t % burst_every < burst_seconds else base_qps
+        if rng.random() < rate / peak:  # 稀疏化采样
+            arrivals.append(t)
+
+
+def log_arrivals(rows, speedup, duration):
+    """按日志时间戳的真实间隔加速回放"""
+    stamps = [ts for ts, _ in rows if ts is not None]
+    if not stamps:
+        return []
+    start = stamps[0]
+    return [(ts - start) / speedup for ts in stamps if (ts - start) / speedup < duration]
+
+
+def percentile(values, q):
+    """最近秩法分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def configure(llm, args, server):
+    """按线上默认参数重建凭据池和调度器（自适应限流、按会话公平排队）"""
+    credentials = [
+        Credential(f"load-{i}", "load-app", name=f"load-{i}",
+                   limiter=AdaptiveTokenBucket(args.key_qps, burst=1, max_rate=args.key_qps * 5))
+        for i in range(args.keys)
+    ]
+    llm.credential_pool = CredentialPool(credentials, eject_seconds=5)
+    llm.session = llm._create_retry_session()
+    llm.scheduler = RequestScheduler(
+        llm._process_request, None, workers=args.keys * 2,
+        max_queue=100, max_pending_per_key=3, max_in_flight_per_key=1
+    )
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    rows = load_log(args.log)
+    questions = [q for _, q in rows]
+    if args.speedup:
+        arrivals = log_arrivals(rows, args.speedup, args.duration)
+    else:
+        arrivals = burst_arrivals(args.duration, args.base_qps, args.burst_qps,
+                                  args.burst_every, args.burst_seconds, rng)
+
+    latency = lognormal_latency(args.latency, args.latency_p99, random.Random(args.seed))
+    server = MockQianfanServer(latency=latency, key_qps=args.server_qps, key_burst=2, retry_after=True,
+                               throttle_rate=args.throttle_rate, error_rate=args.error_rate,
+                               chunk_delay=0.02, seed=args.seed)
+    results = []
+    results_lock = threading.Lock()
+
+    with server, tempfile.TemporaryDirectory() as tmp:
+        llm = LLMService(base_url=server.url, credentials=[Credential("load-0", "load-app")])
+        configure(llm, args, server)
+        # 默认不命中回答缓存（TTL为0），测的是上游链路；相同问题同时在途时仍会合并
+        llm.answer_cache = AnswerCache(os.path.join(tmp, "cache.db"), ttl=args.cache_ttl)
+
+        def user(i, question):
+            timings = {}
+            start = time.perf_counter()
+            if args.stream:
+                answer = None
+                for answer, _, _ in llm.ask_stream(question, timings=timings, session_id=f"user-{i}"):
+                    pass
+            else:
+                answer, _, _ = llm.ask(question, timings=timings, session_id=f"user-{i}")
+            elapsed = (time.perf_counter() - start) * 1000
+            if answer == QUEUE_FULL_MESSAGE:
+                outcome = "queue_full"
+            elif answer == TIMEOUT_MESSAGE:
+                outcome = "timeout"
+            elif not answer or answer.startswith(ERROR_PREFIXES):
+                outcome = "error"
+            else:
+                outcome = "ok"  # 缓存命中和合并请求的跟随者不带 conversation_id
+            with results_lock:
+                results.append({"outcome": outcome, "total_ms": elapsed,
+                                "queue_wait_ms": timings.get("queue_wait_ms"), "ttft_ms": timings.get("ttft_ms")})
+
+        threads = []
+        start = time.monotonic()
+        for i, at in enumerate(arrivals):
+            delay = start + at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            question = questions[i % len(questions)]
+            if args.unique:
+                question += f"（{i}）"
+            thread = threading.Thread(target=user, args=(i, question), daemon=True)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - start
+        llm.scheduler.shutdown()
+
+    return summarize(results, elapsed, server)
+
+
+def summarize(results, elapsed, server):
+    outcomes = Counter(r["outcome"] for r in results)
+    ok = [r for r in results if r["outcome"] == "ok"]
+    totals = [r["total_ms"] for r in ok]
+    waits = [r["queue_wait_ms"] for r in results if r["queue_wait_ms"] is not None]
+    ttfts = [r["ttft_ms"] for r in ok if r["ttft_ms"] is not None]
+    summary = {
+        "requests": len(results),
+        "elapsed_s": round(elapsed, 2),
+        "throughput_qps": round(len(ok) / elapsed, 3) if elapsed else 0,
+        "outcomes": dict(outcomes),
+        "upstream_accepted": sum(server.key_counts.values()),
+        "upstream_rejected": sum(server.rejected.values()),
+        "upstream_injected": {str(k): v for k, v in server.injected.items()},
+    }
+    for name, values in (("total_ms", totals), ("queue_wait_ms", waits), ("ttft_ms", ttfts)):
+        if values:
+            summary[name] = {f"p{q}": round(percentile(values, q), 1) for q in (50, 95, 99)}
+    return summary
+
+
+def print_summary(summary):
+    print(f"请求 {summary['requests']} 个，耗时 {summary['elapsed_s']}s，成功吞吐 {summary['throughput_qps']} QPS")
+    print(f"结果：{summary['outcomes']}")
+    print(f"上游：受理 {summary['upstream_accepted']}，限流429 {summary['upstream_rejected']}，"
+          f"注入故障 {summary['upstream_injected']}")
+    for name, label in (("total_ms", "端到端延迟"), ("queue_wait_ms", "排队等待"), ("ttft_ms", "首字延迟")):
+        if name in summary:
+            p = summary[name]
+            print(f"{label}: p50={p['p50']:.1f}ms  p95={p['p95']:.1f}ms  p99={p['p99']:.1f}ms")
+
+
+def compare(summary, baseline, tolerance):
+    """与基线对比，返回回归项列表"""
+    regressions = []
+    if summary["throughput_qps"] < baseline["throughput_qps"] * (1 - tolerance):
+        regressions.append(f"吞吐 {baseline['throughput_qps']} -> {summary['throughput_qps']} QPS")
+    for name in ("total_ms", "queue_wait_ms"):
+        for q in ("p95", "p99"):
+            old = baseline.get(name, {}).get(q)
+            new = summary.get(name, {}).get(q)
+            if old and new and new > old * (1 + tolerance):
+                regressions.append(f"{name} {q} {old} -> {new}ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="线上日志回放压测")
+    parser.add_argument("--log", default=LOG_FILE)
+    parser.add_argument("--duration", type=float, default=30.0, help="回放时长（秒）")
+    parser.add_argument("--base-qps", type=float, default=1.0, help="平时的到达速率")
+    parser.add_argument("--burst-qps", type=float, default=8.0, help="课间高峰的到达速率")
+    parser.add_argument("--burst-every", type=float, default=15.0, help="高峰周期（秒）")
+    parser.add_argument("--burst-seconds", type=float, default=4.0, help="每次高峰持续时长（秒）")
+    parser.add_argument("--speedup", type=float, default=None, help="按日志时间戳回放的加速倍数（替代突发模型）")
+    parser.add_argument("--stream", action="store_true", help="使用流式接口 ask_stream")
+    parser.add_argument("--unique", action="store_true", help="给每个问题加编号，不触发相同问题合并")
+    parser.add_argument("--keys", type=int, default=2, help="凭据数")
+    parser.add_argument("--key-qps", type=float, default=1.0, help="每个凭据的初始速率")
+    parser.add_argument("--server-qps", type=float, default=3.0, help="模拟服务器每个Key的配额")
+    parser.add_argument("--latency", type=float, default=0.8, help="上游延迟中位数（秒）")
+    parser.add_argument("--latency-p99", type=float, default=3.0, help="上游延迟99分位（秒）")
+    parser.add_argument("--throttle-rate", type=float, default=0.01, help="随机429比例")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="随机5xx比例")
+    parser.add_argument("--cache-ttl", type=float, default=0, help="回答缓存TTL（秒），默认不命中缓存")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="保存结果到JSON文件")
+    parser.add_argument("--compare", help="与保存的基线JSON对比")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("📈 线上日志回放压测")
+    print("=" * 60)
+    summary = run(args)
+    print_summary(summary)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"💾 结果已保存到 {args.save}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(summary, baseline, args.tolerance)
+        if regressions:
+            print("❌ 相比基线出现回归：")
+            for item in regressions:
+                print(f"   - {item}")
+            sys.exit(1)
+        print(f"✅ 与基线相比无回归（容差 {args.tolerance:.0%}）")
+
+
+if __name__ == "__main__":
+    main()
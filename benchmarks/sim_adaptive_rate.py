@@ -0,0 +1,106 @@
+"""
+自适应限流模拟
+模拟服务器的配额随时间变化（2 → 6 → 3 QPS，各持续 PHASE_SECONDS 秒），
+客户端始终有足够多的排队请求，对比三种策略：
+- 固定 0.83 QPS + urllib3 在429时自行重发（原实现）：配额放宽后仍然用不满
+- 固定 4 QPS + urllib3 在429时自行重发：配额收紧时429被重发放大
+- 自适应（AIMD + Retry-After，重试重新经过限流器）
+输出每个阶段服务端实际受理的QPS与配额之比、429次数和用户看到的失败数。
+限流器行为的断言见 tests/test_adaptive_limiter.py，这里只做测量。
+
+运行方式（仓库根目录）：python -m benchmarks.sim_adaptive_rate [每阶段秒数]
+"""
+
+import sys
+import threading
+import time
+
+import requests
+from urllib3.util.retry import Retry
+
+from adaptive_limiter import AdaptiveTokenBucket
+from credential_pool import Credential, CredentialPool
+from llm_service import QUEUE_FULL_MESSAGE, LLMService, _TimedHTTPAdapter
+from mock_qianfan import MockQianfanServer
+from scheduler import RequestScheduler, TokenBucket
+
+PHASES = (2.0, 6.0, 3.0)
+CLIENTS = 12
+
+
+def legacy_session():
+    """原实现的重试配置：429/5xx 由 urllib3 绕过限流器直接重发"""
+    session = requests.Session()
+    retry = Retry(total=3, read=3, connect=3, backoff_factor=0.5,
+                  status_forcelist=[429, 500, 502, 503, 504], allowed_methods=["POST"],
+                  raise_on_status=False)
+    adapter = _TimedHTTPAdapter(max_retries=retry)
+    session.mount("http://", adapter)
+    return session
+
+
+def run_mode(llm, server, name, limiter, session, phase_seconds):
+    # 固定速率的对照组不启用凭据摘除，只比较限流策略本身
+    llm.credential_pool = CredentialPool([Credential("sim", "sim-app", name="sim", limiter=limiter)],
+                                         eject_seconds=0)
+    llm.session = session
+    llm.scheduler = RequestScheduler(llm._process_request, None, workers=8,
+                                     max_pending_per_key=1)
+    server.key_counts.clear()
+    server.rejected.clear()
+    server.key_qps = lambda t: PHASES[min(int(t // phase_seconds), len(PHASES) - 1)]
+
+    stop = threading.Event()
+    failures = []
+
+    def client(i):
+        n = 0
+        while not stop.is_set():
+            n += 1
+            try:
+                answer, cid, _ = llm.ask(f"问题{i}-{n}", f"sim-{name}-{i}-{n}", session_id=f"s{i}")
+            except Exception:
+                return  # 本轮结束，调度器已关闭
+            if answer == QUEUE_FULL_MESSAGE:
+                time.sleep(1)  # 被拒绝的同学过一会儿再问
+            elif not cid and not stop.is_set():
+                failures.append(answer)
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(CLIENTS)]
+    server.started_at = time.monotonic()
+    for t in threads:
+        t.start()
+
+    rows = []
+    accepted_before = rejected_before = 0
+    for quota in PHASES:
+        time.sleep(phase_seconds)
+        accepted, rejected = server.key_counts["sim"], server.rejected["sim"]
+        rows.append((quota, (accepted - accepted_before) / phase_seconds, rejected - rejected_before))
+        accepted_before, rejected_before = accepted, rejected
+    stop.set()
+    llm.scheduler.shutdown(wait=False)
+
+    print(f"-- {name}")
+    for quota, qps, rejected in rows:
+        print(f"   配额 {quota:.0f} QPS  受理 {qps:4.2f} QPS（利用率 {qps / quota:4.0%}）  429 {rejected} 次")
+    print(f"   用户看到的失败 {len(failures)} 次，最终速率 {limiter.rate:.2f} QPS "
+          f"{getattr(limiter, 'stats', '')}")
+
+
+def main():
+    phase_seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+    print("=" * 60)
+    print(f"📈 自适应限流模拟：配额 {' → '.join(f'{q:.0f}' for q in PHASES)} QPS，每阶段 {phase_seconds:.0f}s")
+    print("=" * 60)
+
+    with MockQianfanServer(latency=0.05, key_burst=2, retry_after=True) as server:
+        llm = LLMService(base_url=server.url, credentials=[Credential("sim", "sim-app")])
+        run_mode(llm, server, "固定 0.83 QPS + urllib3重试", TokenBucket(1 / 1.2), legacy_session(), phase_seconds)
+        run_mode(llm, server, "固定 4 QPS + urllib3重试", TokenBucket(4.0), legacy_session(), phase_seconds)
+        run_mode(llm, server, "自适应 AIMD + Retry-After", AdaptiveTokenBucket(1 / 1.2, max_rate=10),
+                 llm._create_retry_session(), phase_seconds)
+
+
+if __name__ == "__main__":
+    main()
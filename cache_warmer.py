@@ -0,0 +1,191 @@
+"""
+常见问题离线预热
+从对话日志中取出现次数最多的 N 个问题（按归一化问题合并），加上欢迎语里推荐的问题，
+在低峰时段按限流预算逐个请求上游生成回答，写入预热文件；
+应用启动时 LLMService 把预热文件载入回答缓存，每天第一位提问的同学也能直接命中缓存。
+
+用法（建议用 cron 在凌晨运行）：
+    python cache_warmer.py --top 50 --qps 0.5 --hours 1-6
+"""
+
+import argparse
+import csv
+import json
+import os
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from answer_cache import knowledge_base_version, normalize_question
+from conversation_logger import STORE_SUFFIXES
+from conversation_store import ConversationStore, resolve_log
+from scheduler import TokenBucket
+
+# 欢迎语中推荐的问题（chat_app.py 的欢迎语也由此生成）
+SUGGESTED_QUESTIONS = (
+    "奖学金怎么申请？",
+    "医保报销比例？",
+    "考研有什么要求？",
+    "选课系统怎么进？",
+)
+
+WARM_FILE = "warm_answers.json"
+
+
+def _question_counts(log_file):
+    """日志中的 (问题, 次数)：对话记录库按问题分组查询，CSV日志逐行读取"""
+    if log_file.endswith(STORE_SUFFIXES):
+        store = ConversationStore(log_file)
+        try:
+            for question, count, _, _ in store.question_stats():
+                yield question, count
+        finally:
+            store.close()
+        return
+    with open(log_file, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            yield row.get("问题") or "", 1
+
+
+def top_questions(log_file, top_n):
+    """日志中出现次数最多的 top_n 个问题，返回 [(问题, 次数)]；同一归一化问题取最常见的写法"""
+    counts = Counter()
+    variants = defaultdict(Counter)
+    if os.path.exists(log_file):
+        for question, count in _question_counts(log_file):
+            question = question.strip()
+            key = normalize_question(question)
+            # 旧CSV日志中被截断的长问题不完整，不适合作为缓存问题
+            if not key or question.endswith("..."):
+                continue
+            counts[key] += count
+            variants[key][question] += count
+    return [(variants[key].most_common(1)[0][0], count) for key, count in counts.most_common(top_n)]
+
+
+def warm_questions(log_file, top_n, suggested=SUGGESTED_QUESTIONS):
+    """需要预热的问题：推荐问题在前，再按日志频次，按归一化问题去重"""
+    questions = []
+    seen = set()
+    for question in list(suggested) + [q for q, _ in top_questions(log_file, top_n)]:
+        key = normalize_question(question)
+        if key and key not in seen:
+            seen.add(key)
+            questions.append(question)
+    return questions
+
+
+def load_warm_file(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ 预热文件读取失败，将重新生成: {e}")
+        return {}
+
+
+def save_warm_file(path, kb_version, answers):
+    data = {"kb_version": kb_version, "generated_at": time.time(), "answers": answers}
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def in_hours(hours, now=None):
+    """当前小时是否在 (开始, 结束) 时段内，支持跨零点（如 (22, 6)）"""
+    if hours is None:
+        return True
+    start, end = hours
+    hour = (now or datetime.now()).hour
+    return start <= hour < end if start <= end else hour >= start or hour < end
+
+
+def run(llm, questions, output=WARM_FILE, qps=0.5, max_age=12 * 3600, hours=None,
+        kb_dir="zhishiku", clock=time.time):
+    """逐个生成回答并写入预热文件，返回统计
+
+    llm: LLMService 实例（请求经过其调度器和凭据池，受同一限流预算约束）
+    qps: 预热任务自身的请求速率上限，低于线上预算，给同时在线的同学留出余量
+    max_age: 预热文件中不超过该时长（秒）的回答直接沿用，不重复请求
+    hours: 允许运行的时段 (开始小时, 结束小时)，超出时段后停止，已生成的回答仍会保存
+    """
+    kb_version = knowledge_base_version(kb_dir)
+    previous = load_warm_file(output)
+    kept = {}
+    if previous.get("kb_version") == kb_version:
+        for item in previous.get("answers", []):
+            if clock() - item["created_at"] <= max_age:
+                kept[normalize_question(item["question"])] = item
+
+    limiter = TokenBucket(rate=qps)
+    answers = []
+    stats = {"questions": len(questions), "reused": 0, "generated": 0, "failed": 0, "skipped": 0}
+    for question in questions:
+        key = normalize_question(question)
+        if key in kept:
+            answers.append(kept[key])
+            stats["reused"] += 1
+            continue
+        if not in_hours(hours):
+            stats["skipped"] += 1
+            continue
+
+        limiter.acquire()
+        answer, conversation_id, sources = llm.ask(question, session_id="cache-warmer", use_cache=False)
+        if not conversation_id:
+            print(f"⚠️ 生成失败：{question} -> {answer[:50]}")
+            stats["failed"] += 1
+            continue
+        answers.append({
+            "question": question,
+            "answer": answer,
+            "conversation_id": conversation_id,
+            "sources": sources,
+            "created_at": clock(),
+        })
+        stats["generated"] += 1
+
+    save_warm_file(output, kb_version, answers)
+    return stats
+
+
+def _parse_hours(value):
+    start, end = value.split("-")
+    return int(start), int(end)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="医小管常见问题离线预热")
+    parser.add_argument("--log", default=None,
+                        help="对话记录库（.db）或CSV对话日志；默认用 conversations.db（先导入 evolution_logs.csv "
+                             "中尚未导入的行），库不存在时用 evolution_logs.csv")
+    parser.add_argument("--top", type=int, default=50, help="预热日志中出现次数最多的问题数")
+    parser.add_argument("--output", default=WARM_FILE, help="预热回答文件")
+    parser.add_argument("--qps", type=float, default=0.5, help="预热请求速率上限（次/秒）")
+    parser.add_argument("--max-age", type=float, default=12, help="已有回答在多少小时内不重新生成")
+    parser.add_argument("--hours", type=_parse_hours, default=None,
+                        help="只在该时段内请求上游，如 1-6（凌晨1点到6点）")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🔥 医小管常见问题预热")
+    print("=" * 60)
+
+    if not in_hours(args.hours):
+        print(f"⏸️ 当前不在预热时段 {args.hours[0]}-{args.hours[1]} 点，退出")
+        return
+
+    from llm_service import LLMService  # 不在时段内时不必加载 streamlit 等依赖
+
+    questions = warm_questions(args.log or resolve_log(), args.top)
+    print(f"📋 待预热问题 {len(questions)} 个（推荐问题 {len(SUGGESTED_QUESTIONS)} 个 + 日志高频问题）")
+    stats = run(LLMService(), questions, args.output, args.qps, args.max_age * 3600, args.hours)
+    print(f"✅ 新生成 {stats['generated']}，沿用 {stats['reused']}，失败 {stats['failed']}，"
+          f"超出时段未生成 {stats['skipped']}，已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,15 @@
+import uuid
 import streamlit as st
-import time
-import re
-import csv
-import os
-import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime
 from llm_service import LLMService
+from cache_warmer import SUGGESTED_QUESTIONS
+from conversation_logger import get_logger
+from conversation_store import DB_FILE as CONVERSATION_DB
+from metrics import stage_timer
+from message_renderer import format_with_line_breaks, render_message, render_history, StreamingFormatter
+
+HISTORY_WINDOW = 10  # 完整渲染（带反馈按钮、来源）的最近对话轮数
+HISTORY_PAGE = 20  # 每次点击展开的更早消息条数
 
 # ========== 页面配置 ==========
 st.set_page_config(
@@ -27,10 +31,7 @@ if "messages" not in st.session_state:
 ---
 
 💡 试试问我：
-• 奖学金怎么申请？
-• 医保报销比例？
-• 考研有什么要求？
-• 选课系统怎么进？"""
+""" + "\n".join(f"• {q}" for q in SUGGESTED_QUESTIONS)
         }
     ]
 
@@ -40,78 +41,56 @@ if "llm" not in st.session_state:
 if "conversation_id" not in st.session_state:
     st.session_state.conversation_id = None
 
+if "session_key" not in st.session_state:
+    st.session_state.session_key = uuid.uuid4().hex  # 公平排队用的浏览器会话标识
+
 if "input_key" not in st.session_state:
     st.session_state.input_key = 0
 
 if "is_loading" not in st.session_state:
     st.session_state.is_loading = False
 
+if "earlier_shown" not in st.session_state:
+    st.session_state.earlier_shown = 0  # 已展开的更早消息条数
+
 # ========== 日志记录函数 ==========
-def log_conversation(question, answer, sources, feedback=None, session_id=None):
-    """记录对话日志，用于后续分析"""
-    log_file = "evolution_logs.csv"
+def _ms(timings, stage):
+    """timings 中某阶段的耗时（整数毫秒），未记录时为空"""
+    value = timings.get(f"{stage}_ms")
+    return int(value) if value is not None else ''
 
-    try:
-        if not os.path.exists(log_file):
-            with open(log_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow([
-                    '时间', '会话ID', '问题', '回答', '回答长度',
-                    '来源数量', '用户反馈', '响应时间(ms)', '是否成功'
-                ])
 
-        is_success = len(sources) > 0 and len(answer) > 20
+def log_conversation(question, answer, sources, feedback=None, session_id=None, timings=None):
+    """记录对话日志，用于后续分析（只入内存队列，由后台线程批量写入对话记录库）
 
-        with open(log_file, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                session_id or '',
-                question[:100] + '...' if len(question) > 100 else question,
-                answer[:200] + '...' if len(answer) > 200 else answer,
-                len(answer),
-                len(sources) if sources else 0,
-                feedback or '',
-                int((time.time() % 1) * 1000),
-                is_success
-            ])
+    问题和回答完整保存；timings: 该回答的各阶段耗时（毫秒），
+    响应时间 = 模型调用总耗时 + 格式化耗时，另记排队等待、首字延迟和格式化耗时
+    """
+    try:
+        is_success = len(sources) > 0 and len(answer) > 20
+        timings = timings or {}
+        if "total_ms" in timings:
+            response_ms = int(timings["total_ms"] + timings.get("format_ms", 0))
+        else:
+            response_ms = ''
+
+        get_logger(CONVERSATION_DB).log([
+            datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            session_id or '',
+            question,
+            answer,
+            len(answer),
+            len(sources) if sources else 0,
+            feedback or '',
+            response_ms,
+            is_success,
+            _ms(timings, "queue_wait"),
+            _ms(timings, "ttft"),
+            _ms(timings, "format"),
+        ])
     except Exception as e:
         print(f"日志记录失败: {e}")
 
-# ========== 强制换行函数 ==========
-def format_with_line_breaks(text):
-    """
-    强制处理换行，确保AI回答中的每个句子都能正确换行
-    """
-    if not text:
-        return text
-
-    # 1. 处理各种换行符
-    text = text.replace('\r\n', '\n').replace('\r', '\n')
-
-    # 2. 在中文标点符号后添加换行
-    text = text.replace('。', '。\n')
-    text = text.replace('？', '？\n')
-    text = text.replace('！', '！\n')
-    text = text.replace('；', '；\n')
-    text = text.replace('：', '：\n')
-
-    # 3. 在数字序号前添加换行（如 1. 2. 3. 或 一、二、三）
-    text = re.sub(r'(\d+\.)', r'\n\1', text)
-    text = re.sub(r'([一二三四五六七八九十])[、.]', r'\n\1、', text)
-
-    # 4. 处理括号内的序号
-    text = re.sub(r'（(\d+)）', r'\n（\1）', text)
-
-    # 5. 将连续的换行符替换为单个换行
-    text = re.sub(r'\n\s*\n', '\n\n', text)
-
-    # 6. 最后将换行符转换为HTML的<br>标签
-    lines = text.split('\n')
-    formatted = '<br>'.join(lines)
-
-    return formatted
-
 # ========== 极简CSS（高级感） ==========
 st.markdown("""
 <style>
@@ -353,73 +332,79 @@ with st.sidebar:
             {"role": "assistant", "content": "👋 你好，我是医小管\n\n**你的专属AI辅导员**"}
         ]
         st.session_state.conversation_id = None
+        st.session_state.earlier_shown = 0
         st.rerun()
 
 # ========== 聊天区域 ==========
 st.markdown('<div class="chat-container">', unsafe_allow_html=True)
 
-for idx, message in enumerate(st.session_state.messages):
-    if message["role"] == "user":
-        # 用户消息 - 去掉时间戳
-        st.markdown(f"""
-        <div class="message-row user">
-            <div class="message-bubble user">
-                <div class="message-content">{message["content"]}</div>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
-    else:
-        formatted_content = format_with_line_breaks(message["content"])
-
-        # AI消息 - 去掉时间戳
-        st.markdown(f"""
-        <div class="message-row assistant">
-            <div class="message-bubble assistant">
-                <div class="message-content">{formatted_content}</div>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
-
-        col1, col2 = st.columns([1, 10])
-        with col1:
-            fb_col1, fb_col2 = st.columns(2)
-            with fb_col1:
-                if st.button("👍", key=f"like_{idx}", help="有帮助"):
-                    prev_question = st.session_state.messages[idx-1]["content"] if idx > 0 else ""
-                    log_conversation(
-                        prev_question,
-                        message["content"],
-                        message.get("sources", []),
-                        feedback="like",
-                        session_id=st.session_state.conversation_id
-                    )
-                    st.toast("感谢反馈 🙏")
-            with fb_col2:
-                if st.button("👎", key=f"dislike_{idx}", help="需改进"):
-                    prev_question = st.session_state.messages[idx-1]["content"] if idx > 0 else ""
-                    log_conversation(
-                        prev_question,
-                        message["content"],
-                        message.get("sources", []),
-                        feedback="dislike",
-                        session_id=st.session_state.conversation_id
-                    )
-                    st.toast("感谢反馈，我会努力改进")
-
-        with col2:
-            if st.button("📋", key=f"copy_{idx}", help="复制回答"):
-                js = f"navigator.clipboard.writeText(`{message['content']}`);"
-                st.components.v1.html(f"<script>{js}</script>", height=0)
-                st.toast("已复制")
-
-        if "sources" in message and message["sources"]:
-            with st.expander("📚 来源"):
-                for i, source in enumerate(message["sources"], 1):
-                    st.markdown(f"""
-                    <div class="source-item">
-                        <span>📄</span> {source[:150]}...
-                    </div>
-                    """, unsafe_allow_html=True)
+def render_message_actions(idx, message):
+    """AI回答下方的反馈、复制按钮和来源"""
+    col1, col2 = st.columns([1, 10])
+    with col1:
+        fb_col1, fb_col2 = st.columns(2)
+        with fb_col1:
+            if st.button("👍", key=f"like_{idx}", help="有帮助"):
+                prev_question = st.session_state.messages[idx-1]["content"] if idx > 0 else ""
+                log_conversation(
+                    prev_question,
+                    message["content"],
+                    message.get("sources", []),
+                    feedback="like",
+                    session_id=st.session_state.conversation_id,
+                    timings=message.get("timings")
+                )
+                st.toast("感谢反馈 🙏")
+        with fb_col2:
+            if st.button("👎", key=f"dislike_{idx}", help="需改进"):
+                prev_question = st.session_state.messages[idx-1]["content"] if idx > 0 else ""
+                log_conversation(
+                    prev_question,
+                    message["content"],
+                    message.get("sources", []),
+                    feedback="dislike",
+                    session_id=st.session_state.conversation_id,
+                    timings=message.get("timings")
+                )
+                st.toast("感谢反馈，我会努力改进")
+
+    with col2:
+        if st.button("📋", key=f"copy_{idx}", help="复制回答"):
+            js = f"navigator.clipboard.writeText(`{message['content']}`);"
+            st.components.v1.html(f"<script>{js}</script>", height=0)
+            st.toast("已复制")
+
+    if "sources" in message and message["sources"]:
+        with st.expander("📚 来源"):
+            for i, source in enumerate(message["sources"], 1):
+                st.markdown(f"""
+                <div class="source-item">
+                    <span>📄</span> {source[:150]}...
+                </div>
+                """, unsafe_allow_html=True)
+
+# 只完整渲染最近 HISTORY_WINDOW 轮，更早的消息折叠，按需分页展开为纯HTML
+messages = st.session_state.messages
+window_start = max(0, len(messages) - HISTORY_WINDOW * 2)
+
+if window_start > 0:
+    shown = min(st.session_state.earlier_shown, window_start)
+    hidden = window_start - shown
+    if hidden:
+        if st.button(f"⬆️ 显示更早的消息（还有 {hidden} 条）", key="show_earlier"):
+            st.session_state.earlier_shown = shown + HISTORY_PAGE
+            st.rerun()
+    if shown:
+        earlier = tuple((m["role"], m["content"]) for m in messages[window_start - shown:window_start])
+        st.markdown(render_history(earlier), unsafe_allow_html=True)
+
+for idx in range(window_start, len(messages)):
+    message = messages[idx]
+    # 消息气泡HTML按内容缓存，重跑时历史消息不再重新格式化
+    st.markdown(render_message(message["role"], message["content"]), unsafe_allow_html=True)
+
+    if message["role"] != "user":
+        render_message_actions(idx, message)
 
 st.markdown('</div>', unsafe_allow_html=True)
 
@@ -460,21 +445,35 @@ if st.session_state.is_loading:
         message_placeholder = st.empty()
         message_placeholder.markdown("🤔 医小管正在思考...")
 
-        # 调用 API
-        result = st.session_state.llm.ask(
+        def show_wait(ahead, wait_seconds):
+            """排队时用预计等待时间代替"正在思考" """
+            if ahead:
+                message_placeholder.markdown(
+                    f"⏳ 前面还有 {ahead} 位同学在提问，预计等待约 {int(wait_seconds) + 1} 秒..."
+                )
+            else:
+                message_placeholder.markdown("🤔 医小管正在思考...")
+
+        # 流式调用 API，边接收边更新占位符
+        # 回答只在末尾追加，只格式化新增部分
+        timings = {}
+        reply, new_conversation_id, sources = "", None, []
+        formatter = StreamingFormatter()
+        streamed, formatted = "", ""
+        for reply, new_conversation_id, sources in st.session_state.llm.ask_stream(
             last_user_message,
-            st.session_state.conversation_id
-        )
-
-        if isinstance(result, tuple) and len(result) == 3:
-            reply, new_conversation_id, sources = result
-        elif isinstance(result, tuple) and len(result) == 2:
-            reply, new_conversation_id = result
-            sources = ["回答基于知识库生成"]
-        else:
-            reply = result
-            new_conversation_id = None
-            sources = []
+            st.session_state.conversation_id,
+            timings=timings,
+            session_id=st.session_state.session_key,
+            on_wait=show_wait
+        ):
+            if reply.startswith(streamed):
+                formatted += formatter.feed(reply[len(streamed):])
+            else:
+                formatter = StreamingFormatter()
+                formatted = formatter.feed(reply)
+            streamed = reply
+            message_placeholder.markdown(formatted + " ▌")
 
         if new_conversation_id:
             st.session_state.conversation_id = new_conversation_id
@@ -482,20 +481,23 @@ if st.session_state.is_loading:
         # 添加引导语
         reply += "\n\n---\n测试阶段，请在下方进行反馈"
 
-        # 记录日志
-        log_conversation(
-            last_user_message,
-            reply,
-            sources,
-            session_id=st.session_state.conversation_id
-        )
-
         # 显示回答
-        formatted_reply = format_with_line_breaks(reply)
-        message_placeholder.markdown(formatted_reply)
+        with stage_timer(timings, "format"):
+            formatted_reply = format_with_line_breaks(reply)
+            message_placeholder.markdown(formatted_reply)
+
+        # 记录日志（含各阶段耗时）
+        with stage_timer(timings, "log"):
+            log_conversation(
+                last_user_message,
+                reply,
+                sources,
+                session_id=st.session_state.conversation_id,
+                timings=timings
+            )
 
     # 添加AI回答到消息历史
-    message_data = {"role": "assistant", "content": reply}
+    message_data = {"role": "assistant", "content": reply, "timings": timings}
     if sources:
         message_data["sources"] = sources
     st.session_state.messages.append(message_data)
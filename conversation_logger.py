@@ -0,0 +1,275 @@
+"""
+对话日志异步写入器
+界面线程只把日志行放进有界内存队列，由后台线程批量写入CSV或对话记录库（.db，见 conversation_store）：
+- 攒够 batch_size 行或距上次写入超过 flush_interval 秒即落盘
+- 队列满时按 block_timeout 等待，仍满则丢弃并计数（不阻塞聊天）
+- CSV 支持按文件大小或按日期轮转；对话记录库每批一个事务，不轮转
+"""
+
+import atexit
+import csv
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+LOG_HEADER = [
+    '时间', '会话ID', '问题', '回答', '回答长度',
+    '来源数量', '用户反馈', '响应时间(ms)', '是否成功',
+    '排队等待(ms)', '首字延迟(ms)', '格式化耗时(ms)'
+]
+
+STORE_SUFFIXES = ('.db', '.sqlite', '.sqlite3')
+
+_loggers = {}
+_loggers_lock = threading.Lock()
+
+
+def get_logger(log_file="evolution_logs.csv", **kwargs):
+    """获取进程内共享的日志写入器（每个文件一个），.db 文件写入对话记录库"""
+    with _loggers_lock:
+        logger = _loggers.get(log_file)
+        if logger is None:
+            cls = StoreLogger if log_file.endswith(STORE_SUFFIXES) else ConversationLogger
+            logger = cls(log_file, **kwargs)
+            _loggers[log_file] = logger
+        return logger
+
+
+class ConversationLogger:
+    """后台批量写入的CSV日志
+
+    log_file: 日志文件路径
+    max_queue: 内存队列上限（行）
+    batch_size: 每批最多写入的行数
+    flush_interval: 最长多少秒落盘一次
+    block_timeout: 队列满时最多等待的秒数，0表示立即丢弃
+    max_bytes: 文件超过该大小时轮转，None表示不按大小轮转
+    rotate_daily: 是否在日期变化时轮转
+    backup_count: 按大小轮转时保留的历史文件数
+    """
+
+    def __init__(self, log_file="evolution_logs.csv", max_queue=10000, batch_size=100,
+                 flush_interval=1.0, block_timeout=0.0, max_bytes=None,
+                 rotate_daily=False, backup_count=5, header=LOG_HEADER):
+        self.log_file = log_file
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.backup_count = backup_count
+        self.header = header
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._file = None
+        self._writer = None
+        self._opened_date = None
+
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "enqueued": 0,
+            "written": 0,
+            "dropped": 0,
+            "blocked": 0,  # 因队列满而等待过的次数
+            "flushes": 0,
+            "rotations": 0,
+            "errors": 0,
+        }
+
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _count(self, name, n=1):
+        with self._stats_lock:
+            self.stats[name] += n
+
+    def log(self, row):
+        """提交一行日志，不触碰磁盘；返回是否成功入队"""
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            if self.block_timeout <= 0:
+                self._count("dropped")
+                return False
+            self._count("blocked")
+            try:
+                self._queue.put(row, timeout=self.block_timeout)
+            except queue.Full:
+                self._count("dropped")
+                return False
+        self._count("enqueued")
+        return True
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["pending"] = self._queue.qsize()
+        return stats
+
+    def flush(self, timeout=5.0):
+        """等待队列中的日志全部写入（测试和退出时使用）"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._stats_lock:
+                done = self.stats["written"] + self.stats["errors"] >= self.stats["enqueued"]
+            if done:
+                return True
+            time.sleep(0.01)
+        return False
+
+    def close(self):
+        """停止后台线程并写完剩余日志"""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+    # ===== 后台写入线程 =====
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._take_batch()
+            if batch:
+                self._write(batch)
+
+        # 退出前写完剩余日志
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._write(batch)
+        self._close_file()
+
+    def _take_batch(self):
+        """阻塞等待第一行，然后在 flush_interval 内尽量凑满一批"""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        try:
+            self._maybe_rotate()
+            self._ensure_open()
+            self._writer.writerows(batch)
+            self._file.flush()
+            self._count("written", len(batch))
+            self._count("flushes")
+        except Exception as e:
+            self._count("errors", len(batch))
+            print(f"日志记录失败: {e}")
+
+    def _ensure_open(self):
+        if self._file is not None:
+            return
+        is_new = not os.path.exists(self.log_file) or os.path.getsize(self.log_file) == 0
+        if not is_new and self.header:
+            self._upgrade_header()
+        self._file = open(self.log_file, 'a', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        self._opened_date = datetime.now().date()
+        if is_new and self.header:
+            self._writer.writerow(self.header)
+
+    def _upgrade_header(self):
+        """已有文件的表头与当前不同（旧版本缺少新增列）时，按列名把旧行改写为当前表头，缺少的列留空"""
+        with open(self.log_file, 'r', newline='', encoding='utf-8-sig') as f:
+            header = next(csv.reader(f), None)
+        if header == self.header:
+            return
+        tmp = self.log_file + ".tmp"
+        with open(self.log_file, 'r', newline='', encoding='utf-8-sig') as src, \
+                open(tmp, 'w', newline='', encoding='utf-8') as dst:
+            reader = csv.reader(src)
+            header = next(reader)
+            positions = [header.index(name) if name in header else None for name in self.header]
+            writer = csv.writer(dst)
+            writer.writerow(self.header)
+            for row in reader:
+                if len(row) != len(header):
+                    writer.writerow(row)  # 列数不对的行原样保留，导入和分析时照旧跳过
+                    continue
+                writer.writerow([row[p] if p is not None else '' for p in positions])
+        os.replace(tmp, self.log_file)
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
+
+    def _maybe_rotate(self):
+        if not os.path.exists(self.log_file):
+            return
+        base, ext = os.path.splitext(self.log_file)
+
+        if self.rotate_daily:
+            file_date = (self._opened_date or
+                         datetime.fromtimestamp(os.path.getmtime(self.log_file)).date())
+            if file_date != datetime.now().date():
+                self._close_file()
+                target = f"{base}.{file_date.strftime('%Y%m%d')}{ext}"
+                suffix = 1
+                while os.path.exists(target):
+                    target = f"{base}.{file_date.strftime('%Y%m%d')}_{suffix}{ext}"
+                    suffix += 1
+                os.replace(self.log_file, target)
+                self._count("rotations")
+                return
+
+        if self.max_bytes and os.path.getsize(self.log_file) >= self.max_bytes:
+            self._close_file()
+            for i in range(self.backup_count - 1, 0, -1):
+                src = f"{base}.{i}{ext}"
+                if os.path.exists(src):
+                    os.replace(src, f"{base}.{i + 1}{ext}")
+            if self.backup_count > 0:
+                os.replace(self.log_file, f"{base}.1{ext}")
+            else:
+                os.remove(self.log_file)
+            self._count("rotations")
+
+
+class StoreLogger(ConversationLogger):
+    """后台批量写入对话记录库（SQLite），每批一个事务；参数同 ConversationLogger，轮转参数不适用"""
+
+    def __init__(self, log_file="conversations.db", **kwargs):
+        self._store = None
+        super().__init__(log_file, **kwargs)
+
+    def _write(self, batch):
+        try:
+            if self._store is None:
+                # 连接只能在创建它的线程中使用，因此在写入线程中打开
+                from conversation_store import ConversationStore
+                self._store = ConversationStore(self.log_file)
+            self._store.insert_many(batch)
+            self._count("written", len(batch))
+            self._count("flushes")
+        except Exception as e:
+            self._count("errors", len(batch))
+            print(f"日志记录失败: {e}")
+
+    def _close_file(self):
+        if self._store is not None:
+            self._store.close()
+            self._store = None
@@ -0,0 +1,389 @@
+"""
+对话记录库 - 取代 evolution_logs.csv
+对话日志原来追加到一个CSV文件，分析时整份读入 pandas，回答还被截断到200字。这里改存 SQLite：
+- WAL 模式：聊天进程的后台写入线程批量写入（一批一个事务），分析脚本可以同时读
+- 列带类型（整数 / 文本 / 空值），问题和回答完整保存
+- 时间、会话ID、用户反馈建索引，按时间范围、按会话、查点踩记录不必扫全表
+- 分析用的统计（平均值、占比、95分位、按问题计数、按日计数）都是 SQL 聚合，不把整表读进内存
+- 与原CSV格式互相导入 / 导出（表头为 LOG_HEADER）；记录每个CSV已导入到第几行，
+  分析脚本和预热任务每次运行前把旧 evolution_logs.csv 中尚未导入的行补进来，历史记录不会遗漏
+
+用法：
+    python conversation_store.py import evolution_logs.csv
+    python conversation_store.py export conversations.csv
+"""
+
+import argparse
+import csv
+import hashlib
+import os
+import sqlite3
+from datetime import datetime
+
+from conversation_logger import LOG_HEADER
+
+DB_FILE = "conversations.db"
+LEGACY_CSV = "evolution_logs.csv"  # 改用对话记录库之前的CSV日志
+IMPORT_BATCH = 10000  # 导入CSV时每个事务写入的行数
+
+# 长文本列放在最后：统计数值列时不必越过问题和回答
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id INTEGER PRIMARY KEY,
+    ts TEXT NOT NULL,
+    session_id TEXT,
+    answer_length INTEGER,
+    source_count INTEGER,
+    feedback TEXT,
+    response_ms INTEGER,
+    success INTEGER,
+    queue_wait_ms INTEGER,
+    ttft_ms INTEGER,
+    format_ms INTEGER,
+    question TEXT NOT NULL,
+    answer TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_conversations_ts ON conversations (ts);
+CREATE INDEX IF NOT EXISTS idx_conversations_session ON conversations (session_id);
+CREATE INDEX IF NOT EXISTS idx_conversations_feedback ON conversations (feedback) WHERE feedback IS NOT NULL;
+CREATE TABLE IF NOT EXISTS imports (
+    path TEXT PRIMARY KEY,
+    rows INTEGER,
+    size INTEGER,
+    first_row TEXT,
+    imported_at TEXT
+);
+"""
+_COLUMNS = ("ts", "session_id", "question", "answer", "answer_length",
+            "source_count", "feedback", "response_ms", "success",
+            "queue_wait_ms", "ttft_ms", "format_ms")  # 与 LOG_HEADER 顺序一致
+_INSERT = f"INSERT INTO conversations ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})"
+
+
+def _int(value):
+    if value is None or value == '':
+        return None
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _bool(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        return int(value.strip().lower() in ('true', '1'))
+    return int(bool(value))
+
+
+def to_record(row):
+    """把一行日志（LOG_HEADER 顺序的列表，CSV读出的字符串或应用写入的原始值）转为入库的类型化元组
+
+    旧版本的日志行没有末尾的阶段耗时列，按空值处理
+    """
+    row = list(row) + [None] * (len(_COLUMNS) - len(row))
+    (ts, session_id, question, answer, answer_length, source_count, feedback, response_ms, success,
+     queue_wait_ms, ttft_ms, format_ms) = row
+    return (
+        str(ts),
+        str(session_id) if session_id else None,
+        '' if question is None else str(question),
+        None if answer is None else str(answer),
+        _int(answer_length),
+        _int(source_count),
+        str(feedback) if feedback else None,
+        _int(response_ms),
+        _bool(success),
+        _int(queue_wait_ms),
+        _int(ttft_ms),
+        _int(format_ms),
+    )
+
+
+def _to_csv_row(record):
+    (ts, session_id, question, answer, answer_length, source_count, feedback, response_ms, success,
+     queue_wait_ms, ttft_ms, format_ms) = record
+    return [
+        ts, session_id or '', question, answer or '',
+        '' if answer_length is None else answer_length,
+        '' if source_count is None else source_count,
+        feedback or '',
+        '' if response_ms is None else response_ms,
+        '' if success is None else bool(success),
+        *('' if ms is None else ms for ms in (queue_wait_ms, ttft_ms, format_ms)),
+    ]
+
+
+def _positions(header):
+    """LOG_HEADER 各列在CSV表头中的位置，缺少的列为None"""
+    return [header.index(name) if name in header else None for name in LOG_HEADER]
+
+
+def _first_row_digest(csv_path):
+    """CSV第一条记录（按列名取值）的摘要，用于识别文件是否被轮转或更换；没有记录时返回None"""
+    with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None) or []
+        row = next(reader, None)
+    if row is None:
+        return None
+    if len(row) == len(header):
+        row = to_record([row[p] if p is not None else None for p in _positions(header)])
+    return hashlib.sha1(repr(row).encode("utf-8")).hexdigest()
+
+
+def _quantile(histogram, q):
+    """由 [(值, 次数)]（按值升序）计算分位数，与 pandas 的线性插值一致"""
+    total = sum(count for _, count in histogram)
+    position = (total - 1) * q
+    lower = int(position)
+    low_value = high_value = None
+    seen = 0
+    for value, count in histogram:
+        seen += count
+        if low_value is None and seen > lower:
+            low_value = value
+        if seen > lower + 1 or seen == total:
+            high_value = value
+            break
+    return low_value + (position - lower) * (high_value - low_value)
+
+
+class ConversationStore:
+    """对话记录的 SQLite 存储（一个连接只在创建它的线程中使用）"""
+
+    def __init__(self, db_path=DB_FILE, timeout=30.0):
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path, timeout=timeout)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL 下 NORMAL 只在检查点时同步，断电最多丢最近的事务，不会损坏数据库
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+        self._conn.commit()
+
+    def _migrate(self):
+        """旧版本创建的库缺少的列补上（新增列只能追加在表尾）"""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(imports)")}
+        if "size" not in columns:
+            self._conn.execute("ALTER TABLE imports ADD COLUMN size INTEGER")
+        if "first_row" not in columns:
+            self._conn.execute("ALTER TABLE imports ADD COLUMN first_row TEXT")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(conversations)")}
+        for name in ("queue_wait_ms", "ttft_ms", "format_ms"):
+            if name not in columns:
+                self._conn.execute(f"ALTER TABLE conversations ADD COLUMN {name} INTEGER")
+
+    # ===== 写入 =====
+    def insert_many(self, rows):
+        """批量写入日志行（LOG_HEADER 顺序），整批一个事务，返回写入行数"""
+        records = [to_record(row) for row in rows]
+        with self._conn:
+            self._conn.executemany(_INSERT, records)
+        return len(records)
+
+    def import_csv(self, csv_path, batch_size=IMPORT_BATCH, force=False):
+        """导入CSV日志（如 evolution_logs.csv），返回 {"imported", "skipped"}
+
+        按表头列名取值，列数不对或缺少时间的行跳过并计数。
+        记录每个文件已读到第几行、文件大小和第一条记录的摘要：再次导入同一文件时只导入之后追加的行，
+        文件大小未变时直接返回；第一条记录变了或文件变小（被轮转、更换或截断）时从头导入。
+        第一条记录按列名比较，表头新增列（旧行补空）不算更换。force=True 时从头重新导入。
+        """
+        path = os.path.abspath(csv_path)
+        size = os.path.getsize(csv_path)
+        first_row = _first_row_digest(csv_path)
+        done = 0
+        if not force:
+            previous = self._conn.execute(
+                "SELECT rows, size, first_row FROM imports WHERE path = ?", (path,)
+            ).fetchone()
+            if previous is not None:
+                rows, previous_size, previous_first = previous
+                same_file = (previous_first is None or previous_first == first_row) and size >= (previous_size or 0)
+                if same_file and size == previous_size:
+                    return {"imported": 0, "skipped": 0}
+                if same_file:
+                    done = rows or 0
+
+        imported = skipped = read = 0
+        with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader, None) or []
+            positions = _positions(header)
+            batch = []
+            with self._conn:
+                for row in reader:
+                    read += 1
+                    if read <= done:
+                        continue
+                    if len(row) != len(header) or positions[0] is None or not row[positions[0]]:
+                        skipped += 1
+                        continue
+                    batch.append(to_record([row[p] if p is not None else None for p in positions]))
+                    if len(batch) >= batch_size:
+                        self._conn.executemany(_INSERT, batch)
+                        imported += len(batch)
+                        batch = []
+                if batch:
+                    self._conn.executemany(_INSERT, batch)
+                    imported += len(batch)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO imports (path, rows, size, first_row, imported_at) VALUES (?, ?, ?, ?, ?)",
+                    (path, max(read, done), size, first_row, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                )
+        return {"imported": imported, "skipped": skipped}
+
+    def export_csv(self, csv_path, since=None):
+        """按写入顺序导出为原CSV格式，since 为起始时间（含），返回导出行数"""
+        query = f"SELECT {', '.join(_COLUMNS)} FROM conversations"
+        params = ()
+        if since:
+            query += " WHERE ts >= ?"
+            params = (since,)
+        cursor = self._conn.execute(query + " ORDER BY id", params)
+        count = 0
+        with open(csv_path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(LOG_HEADER)
+            while True:
+                records = cursor.fetchmany(IMPORT_BATCH)
+                if not records:
+                    break
+                writer.writerows(_to_csv_row(r) for r in records)
+                count += len(records)
+        return count
+
+    # ===== 统计（SQL聚合） =====
+    def count(self):
+        return self._conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+
+    def quality_stats(self):
+        """平均回答长度、平均来源数、无来源比例、点赞/点踩数与满意度"""
+        total, avg_length, avg_sources, source_rows, no_source = self._conn.execute(
+            "SELECT COUNT(*), AVG(answer_length), AVG(source_count), COUNT(source_count), "
+            "SUM(source_count = 0) FROM conversations"
+        ).fetchone()
+        feedback = dict(self._conn.execute(
+            "SELECT feedback, COUNT(*) FROM conversations WHERE feedback IN ('like', 'dislike') GROUP BY feedback"
+        ).fetchall())
+        stats = {}
+        if avg_length is not None:
+            stats['avg_response_length'] = avg_length
+        if source_rows:
+            stats['avg_sources'] = avg_sources
+            stats['no_source_pct'] = no_source / total * 100
+        like_count, dislike_count = feedback.get('like', 0), feedback.get('dislike', 0)
+        stats['like_count'] = like_count
+        stats['dislike_count'] = dislike_count
+        total_feedback = like_count + dislike_count
+        stats['satisfaction_rate'] = like_count / total_feedback * 100 if total_feedback else 0
+        return stats
+
+    def question_stats(self):
+        """按问题原文分组，返回 [(问题, 次数, 点踩数, 无来源数)]"""
+        return self._conn.execute(
+            "SELECT question, COUNT(*), SUM(feedback = 'dislike'), SUM(source_count = 0) "
+            "FROM conversations GROUP BY question"
+        ).fetchall()
+
+    def disliked(self):
+        """点踩记录 [(问题, 时间)]，按写入顺序"""
+        return self._conn.execute(
+            "SELECT question, ts FROM conversations WHERE feedback = 'dislike' ORDER BY id"
+        ).fetchall()
+
+    def no_source_questions(self, limit=10):
+        """返回 (无来源回答数, 最早的 limit 个无来源问题)"""
+        count = self._conn.execute("SELECT COUNT(*) FROM conversations WHERE source_count = 0").fetchone()[0]
+        questions = [q for q, in self._conn.execute(
+            "SELECT question FROM conversations WHERE source_count = 0 ORDER BY id LIMIT ?", (limit,)
+        )]
+        return count, questions
+
+    def performance_stats(self):
+        """平均、最大和95分位响应时间（毫秒）；95分位由各响应时间的次数精确算出"""
+        histogram = self._conn.execute(
+            "SELECT response_ms, COUNT(*) FROM conversations WHERE response_ms IS NOT NULL "
+            "GROUP BY response_ms ORDER BY response_ms"
+        ).fetchall()
+        if not histogram:
+            return {}
+        total = sum(count for _, count in histogram)
+        return {
+            'avg_response_time': sum(value * count for value, count in histogram) / total,
+            'max_response_time': histogram[-1][0],
+            'p95_response_time': _quantile(histogram, 0.95),
+        }
+
+    def daily_counts(self, since=None):
+        """{日期: 对话数}，since 为起始日期（含），如 2026-03-01；一次查询，扫描时间索引（覆盖索引，不读表）按日期分组"""
+        query = "SELECT date(ts) AS day, COUNT(*) FROM conversations"
+        params = ()
+        if since:
+            query += " WHERE ts >= ?"
+            params = (since[:10],)
+        rows = self._conn.execute(query + " GROUP BY day ORDER BY day", params).fetchall()
+        return {day: count for day, count in rows if day is not None}
+
+    def rows_after(self, last_id, limit):
+        """id 大于 last_id 的最多 limit 条记录 [(id, LOG_HEADER 顺序的各列)]，按写入顺序（增量分析用）"""
+        return self._conn.execute(
+            f"SELECT id, {', '.join(_COLUMNS)} FROM conversations WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, limit)
+        ).fetchall()
+
+    def row_key(self, row_id):
+        """某条记录的 (时间, 问题)，不存在时返回None"""
+        return self._conn.execute("SELECT ts, question FROM conversations WHERE id = ?", (row_id,)).fetchone()
+
+    def session(self, session_id):
+        """某个会话的全部记录，按写入顺序"""
+        return self._conn.execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM conversations WHERE session_id = ? ORDER BY id", (session_id,)
+        ).fetchall()
+
+    def close(self):
+        self._conn.close()
+
+
+def resolve_log(db_path=DB_FILE, csv_path=LEGACY_CSV):
+    """选择要分析的日志，返回路径：对话记录库存在时先把旧CSV中尚未导入的行导入库中再用库，否则用CSV"""
+    if not db_path or not os.path.exists(db_path):
+        return csv_path
+    if csv_path and os.path.exists(csv_path):
+        store = ConversationStore(db_path)
+        try:
+            stats = store.import_csv(csv_path)
+        finally:
+            store.close()
+        if stats["imported"]:
+            print(f"📥 已把 {csv_path} 中的 {stats['imported']} 条历史记录导入 {db_path}")
+    return db_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对话记录库导入 / 导出")
+    parser.add_argument("action", choices=["import", "export"])
+    parser.add_argument("csv_file", help="导入的CSV日志 / 导出的目标文件")
+    parser.add_argument("--db", default=DB_FILE, help="对话记录库")
+    parser.add_argument("--since", help="只导出该时间之后的记录，如 2026-03-01")
+    parser.add_argument("--force", action="store_true", help="从头重新导入（默认只导入上次之后追加的行）")
+    args = parser.parse_args()
+
+    store = ConversationStore(args.db)
+    try:
+        if args.action == "import":
+            stats = store.import_csv(args.csv_file, force=args.force)
+            print(f"✅ 导入 {stats['imported']} 条，跳过格式错误的 {stats['skipped']} 条，"
+                  f"库中共 {store.count()} 条")
+        else:
+            count = store.export_csv(args.csv_file, since=args.since)
+            print(f"✅ 导出 {count} 条到 {args.csv_file}")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
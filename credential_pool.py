@@ -0,0 +1,193 @@
+"""
+多密钥 / 多应用凭据池
+每个凭据（API Key + 应用ID）有独立的令牌桶预算，总吞吐随凭据数量线性增加：
+- 派发时在未被摘除、且有预算的凭据中选择进行中请求最少的一个
+- 凭据返回 5xx 时暂时摘除，连续失败时摘除时间翻倍；返回 429 时交给该凭据的
+  自适应限流器降速并按 Retry-After 暂停（非自适应限流器同样按摘除处理）
+- 千帆的会话属于某个应用，带 conversation_id 的追问必须使用创建该会话的凭据
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from adaptive_limiter import AdaptiveTokenBucket
+from scheduler import TokenBucket
+
+MAX_CONVERSATIONS = 10000  # 会话 -> 凭据 映射最多保留的条数
+
+
+class Credential:
+    """一个千帆应用凭据及其限流预算
+
+    api_key: 千帆API Key
+    app_id: 应用ID
+    rate / burst: 该凭据自己的令牌桶参数
+    name: 用于统计和日志的名称，默认取 API Key 末4位
+    limiter: 自定义限流器（如 AdaptiveTokenBucket），指定时忽略 rate / burst
+    """
+
+    def __init__(self, api_key, app_id, rate=1 / 1.2, burst=1, name=None, limiter=None,
+                 clock=time.monotonic):
+        self.api_key = api_key
+        self.app_id = app_id
+        self.name = name or f"key-{str(api_key)[-4:]}"
+        self.limiter = limiter or TokenBucket(rate=rate, burst=burst, clock=clock)
+
+        # 以下由 CredentialPool 在锁内维护
+        self.in_flight = 0
+        self.ejected_until = 0.0
+        self.failures = 0  # 连续失败次数
+        self.stats = {"requests": 0, "errors": 0, "ejections": 0, "throttled": 0}
+
+
+class Lease:
+    """一次请求占用的凭据，请求方把响应状态码、响应延迟（秒）和 Retry-After（秒）写回"""
+
+    def __init__(self, credential):
+        self.credential = credential
+        self.status = None
+        self.latency = None
+        self.retry_after = None
+
+
+class CredentialPool:
+    """在多个凭据之间做限流和负载均衡
+
+    credentials: Credential 列表
+    eject_seconds: 首次摘除的时长（秒）
+    max_eject_seconds: 连续失败时摘除时长的上限（秒）
+    """
+
+    def __init__(self, credentials, eject_seconds=30.0, max_eject_seconds=300.0, clock=time.monotonic):
+        if not credentials:
+            raise ValueError("至少需要一个凭据")
+        self.credentials = list(credentials)
+        self.eject_seconds = eject_seconds
+        self.max_eject_seconds = max_eject_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._conversations = OrderedDict()  # conversation_id -> Credential
+
+    def __len__(self):
+        return len(self.credentials)
+
+    @property
+    def primary(self):
+        return self.credentials[0]
+
+    # ===== 会话绑定 =====
+    def for_conversation(self, conversation_id):
+        """返回创建该会话的凭据，未知会话返回None"""
+        if not conversation_id:
+            return None
+        with self._lock:
+            credential = self._conversations.get(conversation_id)
+            if credential is not None:
+                self._conversations.move_to_end(conversation_id)
+            return credential
+
+    def bind(self, conversation_id, credential):
+        """记录会话所属的凭据"""
+        if not conversation_id:
+            return
+        with self._lock:
+            self._conversations[conversation_id] = credential
+            self._conversations.move_to_end(conversation_id)
+            while len(self._conversations) > MAX_CONVERSATIONS:
+                self._conversations.popitem(last=False)
+
+    # ===== 取用与归还 =====
+    def try_acquire(self, credential=None):
+        """尝试取一个有预算的凭据；成功返回 (凭据, 0)，否则返回 (None, 还需等待的秒数)
+
+        credential: 指定只能使用的凭据（会话追问），为None时在全部凭据中选择
+        """
+        with self._lock:
+            now = self._clock()
+            candidates = [credential] if credential is not None else self.credentials
+            wait = None
+            for cred in sorted(candidates, key=lambda c: c.in_flight):
+                if cred.ejected_until > now:
+                    cred_wait = cred.ejected_until - now
+                else:
+                    cred_wait = cred.limiter.try_acquire()
+                    if cred_wait <= 0:
+                        cred.in_flight += 1
+                        cred.stats["requests"] += 1
+                        return cred, 0.0
+                wait = cred_wait if wait is None else min(wait, cred_wait)
+            return None, wait
+
+    def acquire(self, credential=None, timeout=None):
+        """阻塞直到取得一个凭据；指定 timeout 时超时返回None"""
+        deadline = None if timeout is None else self._clock() + timeout
+        while True:
+            cred, wait = self.try_acquire(credential)
+            if cred is not None:
+                return cred
+            if deadline is not None:
+                remaining = deadline - self._clock()
+                if remaining < wait:
+                    return None
+            time.sleep(wait)
+
+    def release(self, credential, status=None, latency=None, retry_after=None):
+        """归还凭据并反馈结果
+
+        429：自适应限流器降速并暂停 retry_after 秒；非自适应限流器按5xx处理
+        5xx：暂时摘除该凭据（至少 retry_after 秒）
+        其他：自适应限流器按延迟加速或降速
+        """
+        limiter = credential.limiter
+        adaptive = isinstance(limiter, AdaptiveTokenBucket)
+        with self._lock:
+            credential.in_flight -= 1
+            if status is None:
+                return
+            if status == 429 and adaptive:
+                credential.stats["throttled"] += 1
+            elif status == 429 or status >= 500:
+                credential.failures += 1
+                credential.stats["errors"] += 1
+                credential.stats["ejections"] += 1
+                duration = min(self.max_eject_seconds, self.eject_seconds * 2 ** (credential.failures - 1))
+                credential.ejected_until = self._clock() + max(duration, retry_after or 0)
+            else:
+                credential.failures = 0
+
+        if adaptive:
+            if status == 429:
+                limiter.record_throttle(retry_after)
+            elif 200 <= status < 300:
+                limiter.record_success(latency)
+
+    @contextmanager
+    def lease(self, credential):
+        """with pool.lease(cred) as lease: ...; lease.status = 响应状态码"""
+        lease = Lease(credential)
+        try:
+            yield lease
+        finally:
+            self.release(credential, lease.status, lease.latency, lease.retry_after)
+
+    def total_rate(self):
+        """当前未被摘除的凭据的总预算（次/秒），全部被摘除时返回最小的单个预算"""
+        now = self._clock()
+        with self._lock:
+            rates = [c.limiter.rate for c in self.credentials if c.ejected_until <= now]
+            return sum(rates) or min(c.limiter.rate for c in self.credentials)
+
+    def get_stats(self):
+        now = self._clock()
+        with self._lock:
+            return {
+                cred.name: {
+                    **cred.stats,
+                    "in_flight": cred.in_flight,
+                    "ejected": cred.ejected_until > now,
+                    "rate": round(cred.limiter.rate, 3),
+                }
+                for cred in self.credentials
+            }
@@ -1,57 +1,208 @@
 """
 医小管自我进化分析脚本
 每周运行一次，生成优化建议清单
+对话记录库（conversations.db）存在时各项统计直接用 SQL 聚合，否则读入旧的CSV日志
 """
 
+import numpy as np
 import pandas as pd
-import jieba
-from collections import Counter
-from datetime import datetime, timedelta
+from datetime import datetime
+import argparse
 import os
+from analyzer_checkpoint import AnalysisCheckpoint
+from conversation_store import DB_FILE, ConversationStore, resolve_log
+from question_clusters import cluster_questions, cluster_report
+from question_tokenizer import TokenCache, count_keywords
+
+# 过滤停用词
+STOP_WORDS = ['的', '了', '是', '在', '有', '和', '与', '吗', 
+              '呢', '怎么', '如何', '什么', '为什么', '哪个', 
+              '可以', '需要', '申请', '办理']
 
 class EvolutionAnalyzer:
-    def __init__(self, log_file="evolution_logs.csv"):
+    def __init__(self, log_file="evolution_logs.csv", checkpoint_file="evolution_checkpoint.json",
+                 token_cache_file="token_cache.db", db_file=DB_FILE):
         self.log_file = log_file
+        self.checkpoint_file = checkpoint_file
+        self.token_cache_file = token_cache_file
+        self.db_file = db_file
         self.df = None
+        self._masks = None
+        self.store = None
+        self._question_stats = None
+        self.checkpoint = None
+    
+    def _has_store(self):
+        return bool(self.db_file) and os.path.exists(self.db_file)
         
     def load_data(self):
-        """加载日志数据"""
+        """加载日志数据：优先使用对话记录库（不读入内存，只在分析时做聚合查询）
+        
+        使用对话记录库时先把 log_file（旧CSV日志）中尚未导入的行导入库中，历史记录一并分析
+        """
+        if self._has_store():
+            resolve_log(self.db_file, self.log_file)
+            self.store = ConversationStore(self.db_file)
+            self._question_stats = None
+            print(f"✅ 对话记录库中有 {self.store.count()} 条对话记录")
+            return True
+        
         if not os.path.exists(self.log_file):
             print("❌ 暂无日志数据")
             return False
         
-        self.df = pd.read_csv(self.log_file)
+        self.df = pd.read_csv(self.log_file, dtype={'用户反馈': 'category'})
+        self._masks = None
         print(f"✅ 加载了 {len(self.df)} 条对话记录")
         return True
     
+    def _get_masks(self):
+        """一次性计算各分析共用的布尔掩码（NumPy数组），之后直接复用"""
+        if self._masks is None:
+            df = self.df
+            masks = {}
+            if '用户反馈' in df.columns:
+                feedback = df['用户反馈']
+                masks['like'] = (feedback == 'like').to_numpy()
+                masks['dislike'] = (feedback == 'dislike').to_numpy()
+            if '来源数量' in df.columns:
+                masks['no_source'] = (df['来源数量'] == 0).to_numpy()
+            self._masks = masks
+        return self._masks
+    
+    def _get_question_stats(self):
+        """对话记录库按问题分组的结果：(问题列表, 次数数组, {dislike/no_source: 次数数组})，只查询一次"""
+        if self._question_stats is None:
+            rows = self.store.question_stats()
+            questions = [q for q, _, _, _ in rows]
+            counts = np.fromiter((c for _, c, _, _ in rows), dtype=np.int64, count=len(rows))
+            masks = {
+                'dislike': np.fromiter((d or 0 for _, _, d, _ in rows), dtype=np.int64, count=len(rows)),
+                'no_source': np.fromiter((n or 0 for _, _, _, n in rows), dtype=np.int64, count=len(rows)),
+            }
+            self._question_stats = (questions, counts, masks)
+        return self._question_stats
+    
     def analyze_high_frequency_questions(self, top_n=20):
         """分析高频问题关键词"""
-        if self.df is None or len(self.df) == 0:
+        if self.store is not None:
+            questions, counts, _ = self._get_question_stats()
+            word_count = self._extract_keywords(questions, counts)
+        elif self.df is None or len(self.df) == 0:
             return []
-        
-        questions = self.df['问题'].tolist()
-        words = []
-        for q in questions:
-            # 使用jieba分词
-            words.extend(jieba.lcut(str(q)))
-        
-        # 过滤停用词
-        stop_words = ['的', '了', '是', '在', '有', '和', '与', '吗', 
-                      '呢', '怎么', '如何', '什么', '为什么', '哪个', 
-                      '可以', '需要', '申请', '办理']
-        filtered_words = [w for w in words if len(w) > 1 and w not in stop_words]
-        
-        word_count = Counter(filtered_words)
+        else:
+            word_count = self._extract_keywords(self.df['问题'].tolist())
         top_words = word_count.most_common(top_n)
-        
+        self._print_top_words(top_words, top_n)
+        return top_words
+    
+    def analyze_question_clusters(self, top_n=10):
+        """把不同问法的同一需求聚成簇（MinHash + LSH），报告簇大小、代表问题和点踩/无来源比例"""
+        if self.store is not None:
+            # 按问题分组后聚类，簇大小和点踩/无来源比例按次数加权
+            questions, counts, masks = self._get_question_stats()
+            labels = cluster_questions(questions, counts=counts)
+            clusters = cluster_report(questions, labels, masks, top_n=top_n, counts=counts)
+        elif self.df is None or len(self.df) == 0:
+            return []
+        else:
+            questions = self.df['问题'].fillna('').astype(str).tolist()
+            labels = cluster_questions(questions)
+            clusters = cluster_report(questions, labels, self._get_masks(), top_n=top_n)
+        
+        print(f"\n🧩 高频问题簇 TOP{top_n}：")
+        for c in clusters:
+            print(f"  {c['representative']}: {c['size']}次（{c['variants']}种问法）")
+        return clusters
+    
+    def _extract_keywords(self, questions, counts=None):
+        """对问题分词并过滤停用词和单字，返回关键词计数
+        
+        只对去重后的问题分词，结果缓存在 token_cache_file 中；counts 为各问题的出现次数
+        """
+        cache = TokenCache(self.token_cache_file) if self.token_cache_file else None
+        try:
+            return count_keywords(questions, STOP_WORDS, cache=cache, counts=counts)
+        finally:
+            if cache:
+                cache.close()
+    
+    def _print_top_words(self, top_words, top_n):
         print(f"\n🔥 高频关键词 TOP{top_n}：")
         for word, count in top_words:
             print(f"  {word}: {count}次")
+    
+    def load_incremental(self):
+        """增量加载：只处理检查点之后新增的日志，并更新累计统计
+        
+        对话记录库存在时按 id 高水位读取新增记录（先导入旧CSV中尚未导入的行），否则按字节偏移读取CSV日志；
+        日志被轮转/截断、表头变化或对话记录库被更换时自动全量重建。
+        """
+        if self._has_store():
+            return self._load_incremental_store()
+        if not os.path.exists(self.log_file):
+            print("❌ 暂无日志数据")
+            return False
         
-        return top_words
+        state = self._load_checkpoint(self.log_file)
+        if state.head_hash is not None and not state.is_valid_for(self.log_file):
+            print("♻️ 日志文件已轮转或被修改，全量重建统计")
+            state.reset()
+            state.source = os.path.abspath(self.log_file)
+        
+        new_df = state.read_new_rows(self.log_file)
+        if new_df is None:
+            print("♻️ 日志表头已变化，全量重建统计")
+            state.reset()
+            state.source = os.path.abspath(self.log_file)
+            new_df = state.read_new_rows(self.log_file)
+        
+        if len(new_df) > 0:
+            questions = new_df['问题'].tolist() if '问题' in new_df.columns else []
+            state.update(new_df, self._extract_keywords(questions))
+        state.save(self.checkpoint_file)
+        
+        self.checkpoint = state
+        print(f"✅ 新增 {len(new_df)} 条对话记录（累计 {state.total_rows} 条）")
+        return True
+    
+    def _load_incremental_store(self):
+        """对话记录库的增量加载：逐批读取高水位之后的记录"""
+        resolve_log(self.db_file, self.log_file)
+        state = self._load_checkpoint(self.db_file)
+        store = ConversationStore(self.db_file)
+        new_rows = 0
+        try:
+            if not state.is_valid_for_store(store):
+                print("♻️ 对话记录库已更换，全量重建统计")
+                state.reset()
+                state.source = os.path.abspath(self.db_file)
+            for new_df in state.read_store_rows(store):
+                state.update(new_df, self._extract_keywords(new_df['问题'].tolist()))
+                new_rows += len(new_df)
+        finally:
+            store.close()
+        state.save(self.checkpoint_file)
+        
+        self.checkpoint = state
+        print(f"✅ 新增 {new_rows} 条对话记录（累计 {state.total_rows} 条）")
+        return True
+    
+    def _load_checkpoint(self, source):
+        """读取检查点；检查点属于另一个日志（CSV与对话记录库之间切换）时从头统计"""
+        state = AnalysisCheckpoint.load(self.checkpoint_file)
+        source = os.path.abspath(source)
+        if state.source != source:
+            if state.source is not None:
+                print("♻️ 日志来源已变化，全量重建统计")
+            state.reset()
+            state.source = source
+        return state
     
     def analyze_response_quality(self):
         """分析回答质量"""
+        if self.store is not None:
+            return self.store.quality_stats()
         if self.df is None:
             return {}
         
@@ -65,15 +216,17 @@ class EvolutionAnalyzer:
         if '来源数量' in self.df.columns:
             quality_stats['avg_sources'] = self.df['来源数量'].mean()
         
+        masks = self._get_masks()
+        
         # 无来源回答比例
-        if '来源数量' in self.df.columns:
-            no_source_pct = (self.df['来源数量'] == 0).mean() * 100
+        if 'no_source' in masks:
+            no_source_pct = masks['no_source'].mean() * 100
             quality_stats['no_source_pct'] = no_source_pct
         
         # 用户反馈统计
-        if '用户反馈' in self.df.columns:
-            like_count = (self.df['用户反馈'] == 'like').sum()
-            dislike_count = (self.df['用户反馈'] == 'dislike').sum()
+        if 'dislike' in masks:
+            like_count = masks['like'].sum()
+            dislike_count = masks['dislike'].sum()
             total_feedback = like_count + dislike_count
             
             quality_stats['like_count'] = like_count
@@ -87,69 +240,119 @@ class EvolutionAnalyzer:
     
     def analyze_bad_responses(self):
         """分析用户点踩的问题"""
+        if self.store is not None:
+            bad = self.store.disliked()
+            if not bad:
+                print("\n👍 暂无点踩记录，继续保持！")
+                return []
+            print(f"\n👎 用户点踩的问题（{len(bad)}条）：")
+            print("\n".join(f"  问题: {q}\n  时间: {t}" for q, t in bad))
+            return [q for q, _ in bad]
         if self.df is None:
             return []
         
-        bad_df = self.df[self.df['用户反馈'] == 'dislike']
+        masks = self._get_masks()
+        if 'dislike' not in masks:
+            return []
+        
+        bad_df = self.df.loc[masks['dislike'], ['问题', '时间']]
         
         if len(bad_df) == 0:
             print("\n👍 暂无点踩记录，继续保持！")
             return []
         
         print(f"\n👎 用户点踩的问题（{len(bad_df)}条）：")
-        bad_questions = []
-        for _, row in bad_df.iterrows():
-            print(f"  问题: {row['问题']}")
-            print(f"  时间: {row['时间']}")
-            bad_questions.append(row['问题'])
+        questions = bad_df['问题'].astype(str)
+        lines = "  问题: " + questions + "\n  时间: " + bad_df['时间'].astype(str)
+        print(lines.str.cat(sep="\n"))
         
-        return bad_questions
+        return questions.tolist()
     
     def analyze_no_source_responses(self):
         """分析没有来源的回答"""
-        if self.df is None:
+        if self.store is not None:
+            no_source_count, questions = self.store.no_source_questions(10)
+        elif self.df is None:
             return []
-        
-        if '来源数量' not in self.df.columns:
-            return []
-        
-        no_source_df = self.df[self.df['来源数量'] == 0]
-        
-        if len(no_source_df) == 0:
+        else:
+            masks = self._get_masks()
+            if 'no_source' not in masks:
+                return []
+            no_source_count = int(masks['no_source'].sum())
+            questions = self.df.loc[masks['no_source'], '问题'].head(10).astype(str).tolist()
+        
+        if no_source_count == 0:
             print("\n📚 所有回答都有来源，很棒！")
             return []
         
-        print(f"\n📚 需要补充知识库的问题（{len(no_source_df)}条）：")
-        questions = []
-        for _, row in no_source_df.head(10).iterrows():
-            print(f"  问题: {row['问题']}")
-            questions.append(row['问题'])
+        print(f"\n📚 需要补充知识库的问题（{no_source_count}条）：")
+        print("\n".join("  问题: " + q for q in questions))
         
         return questions
     
     def analyze_performance(self):
         """分析性能指标"""
+        if self.store is not None:
+            return self.store.performance_stats()
         if self.df is None:
             return {}
         
         perf_stats = {}
         
         if '响应时间(ms)' in self.df.columns:
-            perf_stats['avg_response_time'] = self.df['响应时间(ms)'].mean()
-            perf_stats['max_response_time'] = self.df['响应时间(ms)'].max()
-            perf_stats['p95_response_time'] = self.df['响应时间(ms)'].quantile(0.95)
+            times = pd.to_numeric(self.df['响应时间(ms)'], errors='coerce')
+            perf_stats['avg_response_time'] = times.mean()
+            perf_stats['max_response_time'] = times.max()
+            perf_stats['p95_response_time'] = times.quantile(0.95)
         
         return perf_stats
     
-    def generate_optimization_todo(self):
-        """生成知识库优化待办清单"""
-        if not self.load_data():
-            return
+    def generate_optimization_todo(self, incremental=False):
+        """生成知识库优化待办清单
+        
+        incremental: 为True时基于检查点增量统计，只处理新增日志（CSV日志或对话记录库）
+        """
+        if incremental:
+            if not self.load_incremental():
+                return
+            state = self.checkpoint
+            quality = state.quality_stats()
+            top_words = state.top_words(10)
+            self._print_top_words(top_words, 10)
+            bad_questions = state.bad_questions
+            print(f"\n👎 用户点踩的问题（累计{state.dislike_count}条）")
+            no_source = state.no_source_questions[:10]
+            print(f"\n📚 需要补充知识库的问题（累计{state.no_source_count}条）")
+            perf = state.performance_stats()
+            clusters = []  # 检查点不保留原始问题，聚类只在全量分析时进行
+        else:
+            if not self.load_data():
+                return
+            quality = self.analyze_response_quality()
+            top_words = self.analyze_high_frequency_questions(top_n=10)
+            clusters = self.analyze_question_clusters(top_n=10)
+            bad_questions = self.analyze_bad_responses()
+            no_source = self.analyze_no_source_responses()
+            perf = self.analyze_performance()
+        
+        suggestions = self._build_suggestions(quality, top_words, bad_questions, no_source, perf, clusters)
         
+        # 生成Markdown格式的待办清单
+        filename = f"kb_optimization_{datetime.now().strftime('%Y%m%d')}.md"
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write(f"# 📚 医小管知识库优化清单\n\n")
+            f.write(f"生成时间：{datetime.now().strftime('%Y-%m-%d %H:%M')}\n\n")
+            for s in suggestions:
+                f.write(f"{s}\n")
+        
+        print(f"\n✅ 已生成优化清单：{filename}")
+        return suggestions
+    
+    def _build_suggestions(self, quality, top_words, bad_questions, no_source, perf, clusters=None):
+        """把各项分析结果整理为Markdown待办条目"""
         suggestions = []
         
         # 1. 质量分析
-        quality = self.analyze_response_quality()
         if quality:
             suggestions.append(f"## 质量报告")
             suggestions.append(f"- 平均回答长度: {quality.get('avg_response_length', 0):.1f}字")
@@ -159,7 +362,6 @@ class EvolutionAnalyzer:
             suggestions.append("")
         
         # 2. 高频词建议
-        top_words = self.analyze_high_frequency_questions(top_n=10)
         if top_words:
             suggestions.append(f"## 高频关键词（可能缺失的知识）")
             for word, count in top_words:
@@ -167,24 +369,35 @@ class EvolutionAnalyzer:
                     suggestions.append(f"- [ ] 需要补充关于「{word}」的知识文档（出现{count}次）")
             suggestions.append("")
         
-        # 3. 点踩问题
-        bad_questions = self.analyze_bad_responses()
+        # 3. 问题簇：同一需求的不同问法
+        if clusters:
+            suggestions.append(f"## 高频问题簇（同一需求的不同问法）")
+            suggestions.append("| 代表问题 | 次数 | 问法数 | 点踩率 | 无来源率 | 其他问法 |")
+            suggestions.append("| --- | --- | --- | --- | --- | --- |")
+            for c in clusters:
+                dislike_pct = f"{c['dislike_rate'] * 100:.1f}%" if c['dislike_rate'] is not None else "-"
+                no_source_pct = f"{c['no_source_rate'] * 100:.1f}%" if c['no_source_rate'] is not None else "-"
+                others = "；".join(q[:20] for q in c['examples']).replace("|", "\\|") or "-"
+                representative = c['representative'][:30].replace("|", "\\|")
+                suggestions.append(f"| {representative} | {c['size']} | {c['variants']} | "
+                                   f"{dislike_pct} | {no_source_pct} | {others} |")
+            suggestions.append("")
+        
+        # 4. 点踩问题
         if bad_questions:
             suggestions.append(f"## 需要优化的回答")
             for q in bad_questions[:5]:
                 suggestions.append(f"- [ ] 优化回答: {q[:50]}...")
             suggestions.append("")
         
-        # 4. 无来源问题
-        no_source = self.analyze_no_source_responses()
+        # 5. 无来源问题
         if no_source:
             suggestions.append(f"## 需要补充知识库的问题")
             for q in no_source[:5]:
                 suggestions.append(f"- [ ] 补充知识: {q[:50]}...")
             suggestions.append("")
         
-        # 5. 性能分析
-        perf = self.analyze_performance()
+        # 6. 性能分析
         if perf:
             suggestions.append(f"## 性能报告")
             suggestions.append(f"- 平均响应时间: {perf.get('avg_response_time', 0):.0f}ms")
@@ -192,30 +405,41 @@ class EvolutionAnalyzer:
             if perf.get('p95_response_time', 0) > 5000:
                 suggestions.append(f"- [ ] 响应时间过长，建议优化知识库检索")
         
-        # 生成Markdown格式的待办清单
-        filename = f"kb_optimization_{datetime.now().strftime('%Y%m%d')}.md"
-        with open(filename, "w", encoding="utf-8") as f:
-            f.write(f"# 📚 医小管知识库优化清单\n\n")
-            f.write(f"生成时间：{datetime.now().strftime('%Y-%m-%d %H:%M')}\n\n")
-            for s in suggestions:
-                f.write(f"{s}\n")
-        
-        print(f"\n✅ 已生成优化清单：{filename}")
         return suggestions
 
 
 def main():
+    parser = argparse.ArgumentParser(description="医小管自我进化分析")
+    parser.add_argument("--incremental", action="store_true",
+                        help="只分析上次运行之后新增的日志（基于检查点）")
+    parser.add_argument("--db", default=DB_FILE, help="对话记录库，不存在时分析 --log 指定的CSV日志")
+    parser.add_argument("--log", default="evolution_logs.csv",
+                        help="旧的CSV对话日志（对话记录库存在时，其中尚未导入的行先导入库中）")
+    args = parser.parse_args()
+    
     print("="*60)
     print("🧬 医小管自我进化分析系统 v2.0")
     print("="*60)
     
-    analyzer = EvolutionAnalyzer()
+    analyzer = EvolutionAnalyzer(log_file=args.log, db_file=args.db)
     
     # 生成优化清单
-    analyzer.generate_optimization_todo()
+    analyzer.generate_optimization_todo(incremental=args.incremental)
     
     # 显示简要统计
-    if analyzer.df is not None:
+    if analyzer.checkpoint is not None:
+        print("\n📊 简要统计：")
+        print(f"总对话数: {analyzer.checkpoint.total_rows}")
+        daily = analyzer.checkpoint.daily_counts
+        if daily:
+            print(f"日均对话: {sum(daily.values()) / len(daily):.1f}条")
+    elif analyzer.store is not None:
+        print("\n📊 简要统计：")
+        print(f"总对话数: {analyzer.store.count()}")
+        daily = analyzer.store.daily_counts()
+        if daily:
+            print(f"日均对话: {sum(daily.values()) / len(daily):.1f}条")
+    elif analyzer.df is not None:
         print("\n📊 简要统计：")
         print(f"总对话数: {len(analyzer.df)}")
         
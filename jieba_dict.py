@@ -0,0 +1,119 @@
+"""
+预构建的 jieba 词典
+jieba 首次分词时要从 dict.txt 生成前缀词典（约1秒），新容器里 /tmp 没有它的缓存，
+每次重启或新开工作进程都要重新生成；知识库关键词还要逐个 add_word。
+这里把 默认词典 + zhishiku 头信息中的关键词 生成的前缀词典序列化到 jieba_dict.cache，
+启动时用内存映射读入，跳过生成过程。关键词或 jieba 版本变化时自动重建。
+
+构建（建议在镜像构建或部署时执行）：python jieba_dict.py
+"""
+
+import glob
+import hashlib
+import marshal
+import mmap
+import os
+import threading
+
+CACHE_PATH = "jieba_dict.cache"
+CACHE_VERSION = 1
+
+_lock = threading.Lock()
+_loaded = False
+
+
+def knowledge_base_keywords(kb_dir="zhishiku"):
+    """zhishiku/*.md 头信息中的全部关键词（去重，保持顺序）"""
+    from kb_retrieval import parse_front_matter
+
+    keywords = []
+    for path in sorted(glob.glob(os.path.join(kb_dir, "*.md"))):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                meta, _ = parse_front_matter(f.read())
+        except OSError:
+            continue
+        keywords.extend(meta.get("关键词", []))
+    return list(dict.fromkeys(keywords))
+
+
+def dictionary_version(kb_dir="zhishiku", keywords=None):
+    """词典内容版本（知识库关键词的哈希），不导入 jieba；分词结果缓存以此区分词典"""
+    if keywords is None:
+        keywords = knowledge_base_keywords(kb_dir)
+    digest = hashlib.sha1(str(CACHE_VERSION).encode("utf-8"))
+    digest.update("\n".join(keywords).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _fingerprint(jieba, keywords):
+    return f"{jieba.__version__}:{dictionary_version(keywords=keywords)}"
+
+
+def build(kb_dir="zhishiku", cache_path=CACHE_PATH):
+    """生成 默认词典 + 知识库关键词 的前缀词典并写入 cache_path，返回关键词数"""
+    import jieba
+
+    jieba.setLogLevel(60)
+    keywords = knowledge_base_keywords(kb_dir)
+    tokenizer = jieba.Tokenizer()
+    tokenizer.initialize()
+    for word in keywords:
+        tokenizer.add_word(word)
+
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        marshal.dump((_fingerprint(jieba, keywords), tokenizer.FREQ, tokenizer.total), f)
+    os.replace(tmp_path, cache_path)
+    return len(keywords)
+
+
+def _load(jieba, keywords, cache_path):
+    """从 cache_path 载入前缀词典到 jieba 默认分词器，文件不存在或已过期时返回False"""
+    if not os.path.exists(cache_path):
+        return False
+    try:
+        with open(cache_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            fingerprint, freq, total = marshal.loads(mapped)
+    except (OSError, ValueError, EOFError, TypeError) as e:
+        print(f"⚠️ jieba词典缓存读取失败，将重建: {e}")
+        return False
+    if fingerprint != _fingerprint(jieba, keywords):
+        return False
+
+    tokenizer = jieba.dt
+    with tokenizer.lock:
+        tokenizer.FREQ, tokenizer.total = freq, total
+        tokenizer.initialized = True
+    return True
+
+
+def get_jieba(kb_dir="zhishiku", cache_path=CACHE_PATH):
+    """返回已载入预构建词典的 jieba 模块（首次调用时导入并载入，之后直接返回）"""
+    global _loaded
+    import jieba
+
+    if _loaded:
+        return jieba
+    with _lock:
+        if not _loaded:
+            jieba.setLogLevel(60)
+            keywords = knowledge_base_keywords(kb_dir)
+            if not _load(jieba, keywords, cache_path):
+                try:
+                    build(kb_dir, cache_path)
+                    _load(jieba, keywords, cache_path)
+                except OSError as e:
+                    print(f"⚠️ jieba词典缓存写入失败: {e}")
+                    for word in keywords:
+                        jieba.add_word(word)
+            _loaded = True
+    return jieba
+
+
+if __name__ == "__main__":
+    import time
+
+    start = time.perf_counter()
+    count = build()
+    print(f"✅ 已生成 {CACHE_PATH}（含知识库关键词 {count} 个），耗时 {time.perf_counter() - start:.2f}s")
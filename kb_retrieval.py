@@ -0,0 +1,274 @@
+"""
+本地知识库检索 - zhishiku/*.md 的BM25索引
+1. 解析YAML头信息（关键词）和 #/##/### 标题层级，按小节切块
+2. 用jieba分词建立倒排索引，BM25打分（jieba 在首次分词时才导入，并载入预构建词典）
+3. 只重建修改时间或内容哈希变化了的文件，索引持久化到本地
+"""
+
+import glob
+import hashlib
+import math
+import os
+import pickle
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+
+from jieba_dict import get_jieba
+
+INDEX_VERSION = 1
+HEADING_RE = re.compile(r'^(#{1,6})\s*(.+?)\s*$')
+
+# 检索时忽略的问句虚词
+STOP_WORDS = {'的', '了', '是', '在', '有', '和', '与', '吗', '呢', '吧', '要',
+              '怎么', '如何', '什么', '为什么', '哪个', '哪些', '可以', '需要', '我', '我们'}
+
+
+def parse_front_matter(text):
+    """解析 --- 包裹的头信息，返回 (meta, 正文)"""
+    meta = {}
+    if not text.startswith("---"):
+        return meta, text
+
+    end = text.find("\n---", 3)
+    if end == -1:
+        return meta, text
+
+    for line in text[3:end].splitlines():
+        if ":" in line:
+            key, value = line.split(":", 1)
+            meta[key.strip()] = value.strip()
+
+    if "关键词" in meta:
+        meta["关键词"] = [k.strip() for k in re.split(r'[,，、]', meta["关键词"]) if k.strip()]
+
+    body_start = text.find("\n", end + 4)
+    return meta, text[body_start + 1:] if body_start != -1 else ""
+
+
+def split_sections(body):
+    """按标题切分小节，返回 [(标题路径列表, 正文)]，正文为空的标题也保留"""
+    sections = []
+    path = []
+    lines = []
+
+    def flush():
+        content = "\n".join(lines).strip()
+        if path or content:
+            sections.append((list(path), content))
+
+    for line in body.splitlines():
+        match = HEADING_RE.match(line)
+        if match:
+            flush()
+            lines = []
+            level = len(match.group(1))
+            path = path[:level - 1] + [match.group(2)]
+        else:
+            lines.append(line)
+    flush()
+    return sections
+
+
+def tokenize(text):
+    """分词并过滤空白、标点和停用词，英文统一小写"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return [
+        w for w in get_jieba().lcut(text)
+        if w.strip() and w not in STOP_WORDS
+        and not all(unicodedata.category(ch)[0] in "PSZ" for ch in w)
+    ]
+
+
+class Chunk:
+    """知识库中的一个小节"""
+
+    __slots__ = ("file", "title", "text", "keywords", "tf", "length")
+
+    def __init__(self, file, title, text, keywords):
+        self.file = file
+        self.title = title
+        self.text = text
+        self.keywords = keywords
+        tokens = tokenize(title + "\n" + text)
+        self.tf = Counter(tokens)
+        self.length = len(tokens)
+
+    def snippet(self, limit=120):
+        text = re.sub(r'\s+', ' ', self.text)
+        return text[:limit]
+
+
+class KnowledgeBaseIndex:
+    """zhishiku 目录的BM25倒排索引
+
+    kb_dir: 知识库目录
+    index_path: 索引缓存文件，设为None则不持久化
+    """
+
+    def __init__(self, kb_dir="zhishiku", index_path="kb_index.pkl", k1=1.5, b=0.75):
+        self.kb_dir = kb_dir
+        self.index_path = index_path
+        self.k1 = k1
+        self.b = b
+
+        self._lock = threading.Lock()
+        self._files = {}  # path -> {"mtime_ns", "size", "sha1", "chunks": [chunk_id]}
+        self._chunks = {}  # chunk_id -> Chunk
+        self._postings = defaultdict(dict)  # term -> {chunk_id: tf}
+        self._total_length = 0
+        self._next_id = 0
+
+        self.stats = {"files_rebuilt": 0, "files_skipped": 0}
+        self._load()
+
+    # ===== 持久化 =====
+    def _load(self):
+        if not self.index_path or not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, "rb") as f:
+                state = pickle.load(f)
+        except Exception as e:
+            print(f"知识库索引读取失败，将重建: {e}")
+            return
+        if state.get("version") != INDEX_VERSION:
+            return
+        self._files = state["files"]
+        self._chunks = state["chunks"]
+        self._next_id = state["next_id"]
+        # 知识库关键词已包含在预构建词典中，这里不必导入 jieba
+        for chunk_id, chunk in self._chunks.items():
+            self._add_postings(chunk_id, chunk)
+
+    def _save(self):
+        if not self.index_path:
+            return
+        state = {
+            "version": INDEX_VERSION,
+            "files": self._files,
+            "chunks": self._chunks,
+            "next_id": self._next_id,
+        }
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.index_path)
+
+    # ===== 增量更新 =====
+    def _add_postings(self, chunk_id, chunk):
+        for term, tf in chunk.tf.items():
+            self._postings[term][chunk_id] = tf
+        self._total_length += chunk.length
+
+    def _remove_file(self, path):
+        info = self._files.pop(path, None)
+        if not info:
+            return
+        for chunk_id in info["chunks"]:
+            chunk = self._chunks.pop(chunk_id)
+            self._total_length -= chunk.length
+            for term in chunk.tf:
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(chunk_id, None)
+                    if not postings:
+                        del self._postings[term]
+
+    def _index_file(self, path, text, stat, sha1):
+        meta, body = parse_front_matter(text)
+        keywords = meta.get("关键词", [])
+        jieba = get_jieba()
+        for word in keywords:
+            jieba.add_word(word)
+        doc_title = meta.get("知识库名称", os.path.splitext(os.path.basename(path))[0])
+
+        chunk_ids = []
+        for heading_path, content in split_sections(body):
+            title = " > ".join([doc_title] + heading_path)
+            chunk = Chunk(os.path.basename(path), title, content, keywords)
+            chunk_id = self._next_id
+            self._next_id += 1
+            self._chunks[chunk_id] = chunk
+            self._add_postings(chunk_id, chunk)
+            chunk_ids.append(chunk_id)
+
+        self._files[path] = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha1": sha1,
+            "keywords": keywords,
+            "chunks": chunk_ids,
+        }
+
+    def refresh(self):
+        """同步索引与磁盘上的文件，返回是否有变化"""
+        with self._lock:
+            changed = False
+            paths = sorted(glob.glob(os.path.join(self.kb_dir, "*.md")))
+
+            for path in set(self._files) - set(paths):
+                self._remove_file(path)
+                changed = True
+
+            for path in paths:
+                stat = os.stat(path)
+                info = self._files.get(path)
+                if info and info["mtime_ns"] == stat.st_mtime_ns and info["size"] == stat.st_size:
+                    self.stats["files_skipped"] += 1
+                    continue
+
+                with open(path, "rb") as f:
+                    raw = f.read()
+                sha1 = hashlib.sha1(raw).hexdigest()
+                if info and info["sha1"] == sha1:
+                    # 只是修改时间变了，内容没变
+                    info["mtime_ns"] = stat.st_mtime_ns
+                    self.stats["files_skipped"] += 1
+                    changed = True
+                    continue
+
+                self._remove_file(path)
+                self._index_file(path, raw.decode("utf-8"), stat, sha1)
+                self.stats["files_rebuilt"] += 1
+                changed = True
+
+            if changed:
+                self._save()
+            return changed
+
+    # ===== 检索 =====
+    def search(self, query, top_k=3):
+        """BM25检索，返回 [(score, Chunk)]，按分数从高到低"""
+        terms = set(tokenize(query))
+        with self._lock:
+            n = len(self._chunks)
+            if not n or not terms:
+                return []
+            avgdl = self._total_length / n
+            scores = defaultdict(float)
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                for chunk_id, tf in postings.items():
+                    length = self._chunks[chunk_id].length
+                    denom = tf + self.k1 * (1 - self.b + self.b * length / avgdl)
+                    scores[chunk_id] += idf * tf * (self.k1 + 1) / denom
+
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+            return [(score, self._chunks[chunk_id]) for chunk_id, score in ranked]
+
+    def lookup_sources(self, query, top_k=3, min_score=1.0):
+        """检索并格式化为 LLMService 的 sources 字符串列表"""
+        return [
+            f"{chunk.title}：{chunk.snippet()}"
+            for score, chunk in self.search(query, top_k)
+            if score >= min_score
+        ]
+
+    def __len__(self):
+        return len(self._chunks)
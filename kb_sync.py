@@ -0,0 +1,221 @@
+"""
+知识库增量同步 - 把 zhishiku/*.md 推送到智能体的远程知识库
+1. 按标题把每个文档切成小节，小节ID由 文件名 + 标题路径 组成，编辑正文不会改变ID
+2. 清理OCR噪声（汉字间多余的空格、PDF换行断句等），只改空白的编辑不会触发上传
+3. 每个小节按内容哈希与本地清单对比，只把新增、修改、删除的小节交给上传器
+上传器可替换：实现 upsert / delete 即可对接远程知识库，LocalUploader 写入本地目录，供检查和测试使用。
+
+用法：python kb_sync.py [--dry-run] [--target kb_remote]
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import time
+from abc import ABC, abstractmethod
+
+from kb_retrieval import parse_front_matter, split_sections
+
+MANIFEST_VERSION = 1
+MANIFEST_FILE = "kb_sync_manifest.json"
+
+CJK = r'㐀-鿿豈-﫿'
+CJK_PUNCT = r'　-〿！-／：-＠［-｀｛-･'
+# 两侧都是汉字或中文标点时，中间的空白是OCR噪声
+_CJK_SPACE_RE = re.compile(rf'(?<=[{CJK}{CJK_PUNCT}])[ \t\u00a0\u3000]+(?=[{CJK}{CJK_PUNCT}])')
+# 行尾是句末标点的才是真正的段落结束，其余换行是PDF排版断行
+_SENTENCE_END = tuple("。；！？：…)）】」』\"”")
+_LIST_ITEM_RE = re.compile(r'^\s*(?:[(（][一二三四五六七八九十\d]+[)）]|\d+[.、．]|[一二三四五六七八九十]+[、．]|[-*+•])')
+
+
+def normalize_text(text):
+    """清理OCR噪声：去掉汉字之间的空格、合并被排版断开的行、压缩多余空白"""
+    paragraphs = []
+    current = ""
+    for raw in text.splitlines():
+        line = _CJK_SPACE_RE.sub("", raw.replace("\u00a0", " ")).strip()
+        line = re.sub(r'[ \t]{2,}', ' ', line)
+        if not line:
+            if current:
+                paragraphs.append(current)
+                current = ""
+            continue
+        if current and not current.endswith(_SENTENCE_END) and not _LIST_ITEM_RE.match(line):
+            # 汉字之间直接拼接，英文单词之间补一个空格
+            joiner = " " if current[-1].isascii() and line[0].isascii() else ""
+            current += joiner + line
+        else:
+            if current:
+                paragraphs.append(current)
+            current = line
+    if current:
+        paragraphs.append(current)
+    return "\n".join(paragraphs)
+
+
+def normalize_heading(heading):
+    return _CJK_SPACE_RE.sub("", re.sub(r'\s+', ' ', heading)).strip()
+
+
+def content_hash(title, text):
+    return hashlib.sha1(f"{title}\n{text}".encode("utf-8")).hexdigest()
+
+
+def document_chunks(path, text=None):
+    """把一个文档切成小节，返回 {小节ID: {"file", "title", "text", "sha1"}}
+
+    小节ID = 文件名#标题路径，同一文件中标题路径重复时依次加 ~2、~3
+    """
+    if text is None:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+    meta, body = parse_front_matter(text)
+    name = os.path.basename(path)
+    doc_title = meta.get("知识库名称", os.path.splitext(name)[0])
+
+    chunks = {}
+    seen = {}
+    for heading_path, content in split_sections(body):
+        headings = [normalize_heading(h) for h in heading_path]
+        content = normalize_text(content)
+        if not content:
+            continue  # 只有标题的小节不上传，其标题已包含在下级小节的标题路径中
+        key = " > ".join(headings)
+        seen[key] = seen.get(key, 0) + 1
+        chunk_id = f"{name}#{key}" + (f"~{seen[key]}" if seen[key] > 1 else "")
+        title = " > ".join([doc_title] + headings)
+        chunks[chunk_id] = {"file": name, "title": title, "text": content, "sha1": content_hash(title, content)}
+    return chunks
+
+
+def collect_chunks(kb_dir="zhishiku"):
+    """知识库目录下全部文档的小节"""
+    chunks = {}
+    for path in sorted(glob.glob(os.path.join(kb_dir, "*.md"))):
+        chunks.update(document_chunks(path))
+    return chunks
+
+
+def load_manifest(path):
+    """本地清单：{小节ID: {"file", "sha1", "remote_id"}}，文件不存在或版本不符时为空"""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ 同步清单读取失败，将全量同步: {e}")
+        return {}
+    if data.get("version") != MANIFEST_VERSION:
+        return {}
+    return data.get("chunks", {})
+
+
+def save_manifest(path, chunks):
+    data = {"version": MANIFEST_VERSION, "synced_at": time.time(), "chunks": chunks}
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def plan(chunks, manifest):
+    """对比当前小节与清单，返回 (新增ID列表, 修改ID列表, 删除ID列表)"""
+    added = [cid for cid in chunks if cid not in manifest]
+    changed = [cid for cid in chunks if cid in manifest and manifest[cid]["sha1"] != chunks[cid]["sha1"]]
+    deleted = [cid for cid in manifest if cid not in chunks]
+    return added, changed, deleted
+
+
+class Uploader(ABC):
+    """远程知识库上传器接口"""
+
+    @abstractmethod
+    def upsert(self, chunk_id, chunk, remote_id=None):
+        """新增或覆盖一个小节，返回远程文档ID（remote_id 为上次同步返回的ID，新增时为None）"""
+
+    @abstractmethod
+    def delete(self, chunk_id, remote_id):
+        """删除一个小节（remote_id 为上次同步返回的ID）"""
+
+
+class LocalUploader(Uploader):
+    """本地替身：每个小节写成 target 目录下的一个 .md 文件，并统计上传量"""
+
+    def __init__(self, target="kb_remote"):
+        self.target = target
+        os.makedirs(target, exist_ok=True)
+        self.stats = {"upserts": 0, "deletes": 0, "bytes": 0}
+
+    def _path(self, remote_id):
+        return os.path.join(self.target, f"{remote_id}.md")
+
+    def upsert(self, chunk_id, chunk, remote_id=None):
+        remote_id = remote_id or hashlib.sha1(chunk_id.encode("utf-8")).hexdigest()[:16]
+        data = f"# {chunk['title']}\n\n{chunk['text']}\n".encode("utf-8")
+        with open(self._path(remote_id), "wb") as f:
+            f.write(data)
+        self.stats["upserts"] += 1
+        self.stats["bytes"] += len(data)
+        return remote_id
+
+    def delete(self, chunk_id, remote_id):
+        try:
+            os.remove(self._path(remote_id))
+        except FileNotFoundError:
+            pass
+        self.stats["deletes"] += 1
+
+
+def sync(uploader, kb_dir="zhishiku", manifest_path=MANIFEST_FILE, dry_run=False):
+    """把知识库的变更推送给 uploader，返回统计
+
+    每个成功的操作立即记入清单；中途失败时已推送的部分不会重复上传，下次运行从失败处继续。
+    """
+    chunks = collect_chunks(kb_dir)
+    manifest = load_manifest(manifest_path)
+    added, changed, deleted = plan(chunks, manifest)
+    stats = {"chunks": len(chunks), "added": len(added), "changed": len(changed),
+             "deleted": len(deleted), "unchanged": len(chunks) - len(added) - len(changed)}
+    if dry_run or not (added or changed or deleted):
+        return stats
+
+    try:
+        for chunk_id in deleted:
+            uploader.delete(chunk_id, manifest[chunk_id].get("remote_id"))
+            del manifest[chunk_id]
+        for chunk_id in added + changed:
+            chunk = chunks[chunk_id]
+            previous = manifest.get(chunk_id, {}).get("remote_id")
+            remote_id = uploader.upsert(chunk_id, chunk, previous)
+            manifest[chunk_id] = {"file": chunk["file"], "sha1": chunk["sha1"], "remote_id": remote_id}
+    finally:
+        save_manifest(manifest_path, manifest)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="知识库增量同步")
+    parser.add_argument("--kb-dir", default="zhishiku")
+    parser.add_argument("--manifest", default=MANIFEST_FILE, help="本地同步清单")
+    parser.add_argument("--target", default="kb_remote", help="LocalUploader 的输出目录")
+    parser.add_argument("--dry-run", action="store_true", help="只列出变更，不上传")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("📚 知识库增量同步")
+    print("=" * 60)
+    uploader = LocalUploader(args.target)
+    start = time.perf_counter()
+    stats = sync(uploader, args.kb_dir, args.manifest, args.dry_run)
+    print(f"小节 {stats['chunks']} 个：新增 {stats['added']}，修改 {stats['changed']}，"
+          f"删除 {stats['deleted']}，未变 {stats['unchanged']}")
+    if not args.dry_run:
+        print(f"✅ 上传 {uploader.stats['bytes'] / 1024:.1f}KB，耗时 {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,134 +1,346 @@
 """
 大模型服务 - 调用千帆Agent
-紧急版本：强制每秒最多1次请求，确保不触发限流
+通过调度器排队、凭据池按每个凭据的令牌桶限流，确保不触发限流；
+令牌桶按 429 / Retry-After / 延迟自适应调整速率，429和5xx重新经过限流器重试；
+每个请求带截止时间，调用方放弃后排队中的请求直接丢弃、进行中的请求尽早停止
 """
 
 import requests
-import re
-import streamlit as st
 import json
+import os
+import sys
 import time
 import random
+from email.utils import parsedate_to_datetime
 import threading
+import queue
 from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
 from urllib3.util.retry import Retry
+from concurrent.futures import CancelledError, TimeoutError as FutureTimeoutError
+from scheduler import RequestScheduler, QueueFullError, DeadlineExceeded
+from credential_pool import Credential, CredentialPool
+from adaptive_limiter import AdaptiveTokenBucket
+from answer_cache import AnswerCache, normalize_question
+from answer_cleaner import clean_answer, StreamingCleaner
+from similarity_cache import SimilarityCache
+from kb_retrieval import KnowledgeBaseIndex
+from metrics import REGISTRY, record_stage, stage_timer
+
+QUEUE_FULL_MESSAGE = "当前提问的同学较多，请稍后再试"
+TIMEOUT_MESSAGE = "请求超时，请稍后再试"
+REQUEST_TIMEOUT = 30  # 从提问到拿到回答（流式为收到首字）的总预算（秒）
+CONNECT_TIMEOUT = 10
+MAX_ATTEMPTS = 3  # 429/5xx 时最多尝试的次数（每次都重新经过限流器）
+RETRY_MAX_WAIT = 10  # 重试时最多等待凭据预算的秒数，超过则直接返回错误
+
+UPSTREAM_RETRIES = REGISTRY.counter(
+    "yixiaoguan_upstream_retries", "因429/5xx重新经过限流器重试的上游请求次数"
+)
+UPSTREAM_CALLS = REGISTRY.counter(
+    "yixiaoguan_upstream_calls", "上游请求次数，outcome=useful 结果送达用户，wasted 用户已放弃"
+)
+DROPPED_REQUESTS = REGISTRY.counter(
+    "yixiaoguan_dropped_requests", "未请求上游即丢弃的请求数，reason=expired 超过截止时间，cancelled 用户已放弃"
+)
+
+# 当前线程建立连接（含TLS握手）累计耗时，由计时连接类写入
+_connect_timing = threading.local()
+
+
+def _timed_connection(base):
+    """包装urllib3连接类，记录connect()耗时"""
+    class TimedConnection(base):
+        def connect(self):
+            start = time.perf_counter()
+            try:
+                super().connect()
+            finally:
+                elapsed = (time.perf_counter() - start) * 1000
+                _connect_timing.ms = getattr(_connect_timing, "ms", 0.0) + elapsed
+    return TimedConnection
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _timed_connection(HTTPConnection)
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _timed_connection(HTTPSConnection)
+
+
+class _TimedHTTPAdapter(HTTPAdapter):
+    """使用计时连接池的适配器，用于拆分连接建立耗时"""
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+def _parse_retry_after(value):
+    """解析 Retry-After 响应头（秒数或HTTP日期），返回秒数，无法解析时返回None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+# Streamlit 读取 Secrets 的位置
+_SECRETS_PATHS = (
+    os.path.join(os.path.expanduser("~"), ".streamlit", "secrets.toml"),
+    os.path.join(os.getcwd(), ".streamlit", "secrets.toml"),
+)
+
+
+def _streamlit():
+    """延迟导入 streamlit（约0.7秒）：只在读取Secrets和显示错误时才需要，
+    预热任务、压测脚本等不经过页面的调用方不必加载"""
+    import streamlit
+    return streamlit
+
+
+def _get_secret(name, default=None):
+    """读取Streamlit Secrets中的可选配置，未配置secrets文件时返回默认值"""
+    if "streamlit" not in sys.modules and not any(os.path.exists(p) for p in _SECRETS_PATHS):
+        return default
+    try:
+        return _streamlit().secrets.get(name, default)
+    except FileNotFoundError:
+        return default
+
 
 class LLMService:
     _instance = None
     _lock = threading.Lock()
     
-    def __new__(cls):
+    def __new__(cls, *args, **kwargs):
         """单例模式，确保所有用户共享同一个实例"""
         with cls._lock:
             if cls._instance is None:
                 cls._instance = super().__new__(cls)
             return cls._instance
     
-    def __init__(self):
-        """初始化 - 只执行一次"""
+    def __init__(self, api_key=None, base_url=None, credentials=None):
+        """初始化 - 只执行一次
+
+        api_key / base_url 可显式传入（如指向本地模拟服务器），否则读取Secrets
+        credentials: 可显式传入 Credential 列表，否则由 BAIDU_API_KEY 和
+                     QIANFAN_CREDENTIALS 组成凭据池
+        """
         if not hasattr(self, 'initialized'):
             self.initialized = True
             
             try:
-                self.api_key = st.secrets["BAIDU_API_KEY"]
+                if credentials:
+                    api_key = api_key or credentials[0].api_key
+                self.api_key = api_key or _streamlit().secrets["BAIDU_API_KEY"]
                 self.app_id = "3d1faab7-1cbf-4a77-8dd8-4f61947a8b57"  # 你的应用ID
                 
                 if not self.api_key:
-                    st.error("❌ 未找到API Key，请检查Streamlit Secrets配置")
+                    _streamlit().error("❌ 未找到API Key，请检查Streamlit Secrets配置")
                 
-                self.base_url = "https://qianfan.baidubce.com/v2/app/conversation/runs"
+                self.base_url = base_url or _get_secret(
+                    "QIANFAN_BASE_URL",
+                    "https://qianfan.baidubce.com/v2/app/conversation/runs"
+                )
                 
                 # 创建带重试机制的会话
                 self.session = self._create_retry_session()
                 
-                # ===== 限流控制参数 =====
-                self.last_request_time = 0  # 上次请求时间
-                self.request_interval = 1.2  # 强制每秒最多0.8次（1.2秒间隔）
-                self.request_queue = []  # 请求队列
-                self.processing = False  # 是否正在处理
+                # ===== 凭据池与限流 =====
+                # 每个凭据一个令牌桶：默认每1.2秒1次（约0.83 QPS），可在Secrets中调整
+                rate = float(_get_secret("RATE_LIMIT_QPS", 1 / 1.2))
+                burst = int(_get_secret("RATE_LIMIT_BURST", 1))
+                self.credential_pool = CredentialPool(
+                    credentials or self._load_credentials(rate, burst),
+                    eject_seconds=float(_get_secret("KEY_EJECT_SECONDS", 30))
+                )
+                
+                # 启动请求调度器（限流在工作线程取凭据时完成，工作线程数至少为凭据数）
+                # 按会话轮转排队：全局排队上限、每个会话未完成请求上限和并发上限
+                workers = int(_get_secret("LLM_WORKERS", len(self.credential_pool)))
+                self.scheduler = RequestScheduler(
+                    self._process_request, None, workers=workers,
+                    max_queue=int(_get_secret("MAX_QUEUE", 100)),
+                    max_pending_per_key=int(_get_secret("SESSION_MAX_PENDING", 3)),
+                    max_in_flight_per_key=int(_get_secret("SESSION_MAX_IN_FLIGHT", 1))
+                )
+                
+                # ===== 回答缓存 =====
+                self.answer_cache = AnswerCache(
+                    db_path=_get_secret("ANSWER_CACHE_PATH", "answer_cache.db"),
+                    ttl=float(_get_secret("ANSWER_CACHE_TTL", 24 * 3600)),
+                    max_entries=int(_get_secret("ANSWER_CACHE_SIZE", 1000))
+                )
+                # 载入离线预热的常见问题回答（cache_warmer.py 生成）
+                warmed = self.answer_cache.load_warm(_get_secret("WARM_ANSWERS_PATH", "warm_answers.json"))
+                if warmed:
+                    print(f"🔥 已载入 {warmed} 条预热回答")
+                
+                # ===== 相似问题缓存（换个说法的问题复用回答缓存中的回答） =====
+                self.similarity_cache = SimilarityCache(
+                    max_entries=int(_get_secret("SIMILARITY_CACHE_SIZE", 1000)),
+                    threshold=float(_get_secret("SIMILARITY_THRESHOLD", 0.93))
+                )
+                self.similarity_cache.add_many(self.answer_cache.keys())
+                
+                # ===== 相同问题合并（single-flight） =====
+                self._inflight = {}  # 归一化问题 -> (正在进行中的Future, 请求)
+                self._inflight_lock = threading.Lock()
+                self.coalesce_stats = {"upstream": 0, "coalesced": 0}
+                
+                # ===== 本地知识库索引（后台构建，用于补充来源） =====
+                self.kb_index = KnowledgeBaseIndex()
+                self.kb_refresh_interval = 30
+                self._kb_refreshed_at = time.time()
+                threading.Thread(target=self.kb_index.refresh, daemon=True).start()
                 
-                # 启动队列处理线程
-                self._start_queue_processor()
+                # ===== 指标导出（可选） =====
+                metrics_port = _get_secret("METRICS_PORT")
+                if metrics_port:
+                    REGISTRY.serve(int(metrics_port))
+                metrics_file = _get_secret("METRICS_FILE")
+                if metrics_file:
+                    REGISTRY.start_file_dump(metrics_file)
                 
             except Exception as e:
-                st.error(f"❌ 初始化失败: {e}")
+                _streamlit().error(f"❌ 初始化失败: {e}")
                 self.api_key = None
                 self.app_id = None
     
-    def _start_queue_processor(self):
-        """启动队列处理线程"""
-        import threading
-        import time
+    def _load_credentials(self, rate, burst):
+        """主凭据 + Secrets 中 QIANFAN_CREDENTIALS 配置的额外凭据
+
+        QIANFAN_CREDENTIALS 为表数组，每项包含 api_key，可选 app_id、qps、burst、name。
+        默认使用自适应限流（qps 为初始速率），RATE_LIMIT_ADAPTIVE = false 时为固定速率
+        """
+        adaptive = bool(_get_secret("RATE_LIMIT_ADAPTIVE", True))
+        max_rate = _get_secret("RATE_LIMIT_MAX_QPS")
         
-        def process_queue():
-            while True:
-                if self.request_queue and not self.processing:
-                    self.processing = True
-                    # 取出请求
-                    question, conversation_id, callback = self.request_queue.pop(0)
-                    
-                    # 强制等待，确保不超过QPS限制
-                    current_time = time.time()
-                    time_since_last = current_time - self.last_request_time
-                    if time_since_last < self.request_interval:
-                        wait_time = self.request_interval - time_since_last
-                        time.sleep(wait_time)
-                    
-                    # 调用API
-                    try:
-                        result = self._make_request(question, conversation_id)
-                        callback(result)
-                    except Exception as e:
-                        callback((f"错误: {str(e)}", None, []))
-                    
-                    self.last_request_time = time.time()
-                    self.processing = False
-                
-                time.sleep(0.1)  # 避免CPU空转
+        def make_credential(api_key, app_id, qps, burst, name):
+            limiter = None
+            if adaptive:
+                limiter = AdaptiveTokenBucket(qps, burst, max_rate=float(max_rate) if max_rate else None)
+            return Credential(api_key, app_id, rate=qps, burst=burst, name=name, limiter=limiter)
         
-        thread = threading.Thread(target=process_queue, daemon=True)
-        thread.start()
+        credentials = [make_credential(self.api_key, self.app_id, rate, burst, "primary")]
+        for item in _get_secret("QIANFAN_CREDENTIALS", None) or []:
+            credentials.append(make_credential(
+                item["api_key"],
+                item.get("app_id", self.app_id),
+                float(item.get("qps", rate)),
+                int(item.get("burst", burst)),
+                item.get("name")
+            ))
+        return credentials
+    
+    def _process_request(self, payload):
+        """调度器工作线程中执行的请求"""
+        question = payload["question"]
+        conversation_id = payload["conversation_id"]
+        sink = payload.get("sink")
+        timings = payload.get("timings")
+        cancelled = payload["cancelled"]
+        
+        pool = self.credential_pool
+        credential = None
+        result = (TIMEOUT_MESSAGE, None, [])
+        for attempt in range(MAX_ATTEMPTS):
+            # 等待凭据预算：会话追问只能用创建该会话的凭据，新问题选负载最低的凭据
+            # 重试同样经过限流器（含 Retry-After 暂停），不会绕过预算直接重发；
+            # 等待不超过剩余预算，期间调用方放弃或预算用完则不再请求上游
+            remaining = payload["deadline"] - time.monotonic()
+            wait = remaining if attempt == 0 else min(remaining, RETRY_MAX_WAIT)
+            next_credential = None
+            if not cancelled.is_set() and remaining > 0:
+                next_credential = pool.acquire(pool.for_conversation(conversation_id), timeout=wait)
+            if attempt == 0:
+                record_stage(timings, "queue_wait", (time.perf_counter() - payload["enqueued_at"]) * 1000)
+            if next_credential is None or cancelled.is_set():
+                if next_credential is not None:
+                    pool.release(next_credential)
+                if attempt == 0:
+                    DROPPED_REQUESTS.inc(reason="cancelled" if cancelled.is_set() else "expired")
+                break
+            credential = next_credential
+            if attempt:
+                UPSTREAM_RETRIES.inc(status=str(lease.status))
+            with pool.lease(credential) as lease:
+                try:
+                    if sink is not None:
+                        result = self._make_stream_request(question, conversation_id, sink, timings, lease, payload)
+                    else:
+                        result = self._make_request(question, conversation_id, timings, lease, payload)
+                except requests.Timeout:
+                    result = (TIMEOUT_MESSAGE, None, [])
+                except Exception as e:
+                    result = (f"错误: {str(e)}", None, [])
+            UPSTREAM_CALLS.inc(outcome="wasted" if cancelled.is_set() else "useful")
+            if lease.status is None or (lease.status != 429 and lease.status < 500):
+                break
+        
+        if sink is not None:
+            sink.put(("done", result))
+        if credential is not None:
+            pool.bind(result[1], credential)
+        return result
+    
+    def _http_timeout(self, payload):
+        """HTTP超时（连接, 读取）不超过请求剩余的预算"""
+        if payload is None:
+            return CONNECT_TIMEOUT, REQUEST_TIMEOUT
+        remaining = max(0.001, payload["deadline"] - time.monotonic())
+        return min(CONNECT_TIMEOUT, remaining), remaining
     
     def _create_retry_session(self, retries=3, backoff_factor=0.5):
-        """创建带重试机制的requests会话"""
+        """创建带重试机制的requests会话
+
+        这里只重试连接失败；429/5xx 由 _process_request 重新经过限流器重试，
+        避免 urllib3 绕过限流器自行重发、放大限流
+        """
         session = requests.Session()
         retry = Retry(
             total=retries,
-            read=retries,
+            read=0,
             connect=retries,
+            status=0,
             backoff_factor=backoff_factor,
-            status_forcelist=[429, 500, 502, 503, 504],
-            allowed_methods=["POST"]
+            allowed_methods=["POST"],
+            raise_on_status=False
         )
-        adapter = HTTPAdapter(max_retries=retry)
+        adapter = _TimedHTTPAdapter(max_retries=retry)
         session.mount('http://', adapter)
         session.mount('https://', adapter)
         return session
     
     def _clean_answer(self, answer):
         """清理回答中的引用标记"""
-        if not answer:
-            return answer
-        
-        cleaned = re.sub(r'\^\[\d+\]\^', '', answer)
-        cleaned = re.sub(r'\[\d+\]', '', cleaned)
-        cleaned = re.sub(r'\^(\[\d+\])+\^', '', cleaned)
-        cleaned = re.sub(r'\s+', ' ', cleaned)
-        return cleaned.strip()
+        return clean_answer(answer)
     
-    def _make_request(self, question, conversation_id):
-        """实际发起API请求"""
+    def _build_request(self, question, conversation_id, stream=False, credential=None):
+        """构造请求头和请求体（credential 为None时使用主凭据）"""
+        api_key = credential.api_key if credential else self.api_key
+        app_id = credential.app_id if credential else self.app_id
         headers = {
             "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
+            "Authorization": f"Bearer {api_key}"
         }
         
         system_prompt = """你是一个医药管理学院的AI辅导员，名叫"医小管"。你的语气要专业稳重，像一位负责任的辅导员老师。"""
         
         data = {
-            "app_id": self.app_id,
+            "app_id": app_id,
             "query": question,
-            "stream": False,
+            "stream": stream,
             "messages": [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": question}
@@ -138,60 +350,445 @@ class LLMService:
         if conversation_id:
             data["conversation_id"] = conversation_id
         
+        return headers, data
+    
+    def _error_result(self, response):
+        """将非200响应转换为错误结果"""
+        try:
+            error_detail = response.json()
+        except:
+            error_detail = None
+        return self._format_error(response.status_code, error_detail)
+    
+    def _format_error(self, status_code, error_detail=None):
+        """拼接错误信息"""
+        error_msg = f"API调用失败: HTTP {status_code}"
+        if error_detail is not None:
+            error_msg += f"\n{json.dumps(error_detail, ensure_ascii=False)}"
+        return error_msg, None, []
+    
+    def _record_upstream(self, timings, start):
+        """把从发请求到读完响应的耗时拆分为连接建立(connect)和上游处理(upstream)"""
+        elapsed = (time.perf_counter() - start) * 1000
+        connect_ms = getattr(_connect_timing, "ms", 0.0)
+        record_stage(timings, "connect", connect_ms)
+        record_stage(timings, "upstream", elapsed - connect_ms)
+    
+    def _make_request(self, question, conversation_id, timings=None, lease=None, payload=None):
+        """实际发起API请求（lease 为凭据池分配的凭据，响应状态码写回 lease.status；
+        payload 为调度器中的请求，HTTP超时按其剩余预算收紧）"""
+        headers, data = self._build_request(
+            question, conversation_id, credential=lease.credential if lease else None
+        )
+        
         # 发送请求
+        _connect_timing.ms = 0.0
+        start = time.perf_counter()
         response = self.session.post(
             self.base_url,
             headers=headers,
             json=data,
-            timeout=(10, 30)
+            timeout=self._http_timeout(payload)
         )
+        self._fill_lease(lease, response)
         
         if response.status_code == 200:
             result = response.json()
-            answer = result.get("answer", "")
-            new_conversation_id = result.get("conversation_id")
-            cleaned_answer = self._clean_answer(answer)
-            sources = self._extract_sources(result)
-            return cleaned_answer, new_conversation_id, sources
+            self._record_upstream(timings, start)
+            with stage_timer(timings, "postprocess"):
+                return self._parse_result(result, question)
         else:
-            error_msg = f"API调用失败: HTTP {response.status_code}"
-            try:
-                error_detail = response.json()
-                error_msg += f"\n{json.dumps(error_detail, ensure_ascii=False)}"
-            except:
-                pass
-            return error_msg, None, []
+            self._record_upstream(timings, start)
+            return self._error_result(response)
+    
+    def _fill_lease(self, lease, response):
+        """把响应状态码、响应头到达耗时和 Retry-After 写回凭据租约，供限流器调整速率"""
+        if lease is None:
+            return
+        lease.status = response.status_code
+        lease.latency = response.elapsed.total_seconds()
+        lease.retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+    
+    def _parse_result(self, result, question):
+        """将接口返回的JSON转换为 (answer, conversation_id, sources)"""
+        answer = result.get("answer", "")
+        new_conversation_id = result.get("conversation_id")
+        cleaned_answer = self._clean_answer(answer)
+        sources = self._extract_sources(result, question)
+        return cleaned_answer, new_conversation_id, sources
     
-    def ask(self, question, conversation_id=None):
+    def _iter_sse_events(self, response):
+        """解析SSE响应，逐个产出 data 字段解析后的JSON对象"""
+        data_lines = []
+        for raw_line in response.iter_lines():
+            line = raw_line.decode("utf-8") if isinstance(raw_line, bytes) else raw_line
+            if line.startswith("data:"):
+                data_lines.append(line[5:].lstrip())
+            elif not line and data_lines:
+                payload = "\n".join(data_lines)
+                data_lines = []
+                if payload == "[DONE]":
+                    return
+                yield json.loads(payload)
+        if data_lines and data_lines != ["[DONE]"]:
+            yield json.loads("\n".join(data_lines))
+    
+    def _make_stream_request(self, question, conversation_id, sink, timings=None, lease=None, payload=None):
+        """以流式方式请求，增量文本写入 sink 队列（完整结果由调用方写入）；
+        调用方放弃（payload["cancelled"]）后停止读取并关闭连接"""
+        headers, data = self._build_request(
+            question, conversation_id, stream=True, credential=lease.credential if lease else None
+        )
+        
+        _connect_timing.ms = 0.0
+        start = time.perf_counter()
+        response = self.session.post(
+            self.base_url,
+            headers=headers,
+            json=data,
+            timeout=self._http_timeout(payload),
+            stream=True
+        )
+        self._fill_lease(lease, response)
+        
+        with response:
+            if response.status_code != 200:
+                self._record_upstream(timings, start)
+                return self._error_result(response)
+            
+            answer = ""
+            new_conversation_id = None
+            citations = []
+            for event in self._iter_sse_events(response):
+                new_conversation_id = event.get("conversation_id") or new_conversation_id
+                citations.extend(event.get("citations") or [])
+                delta = event.get("answer") or ""
+                if delta:
+                    answer += delta
+                    sink.put(("chunk", delta))
+                if event.get("is_completion"):
+                    break
+                if payload is not None and payload["cancelled"].is_set():
+                    break
+        self._record_upstream(timings, start)
+        
+        with stage_timer(timings, "postprocess"):
+            sources = self._extract_sources({"answer": answer, "citations": citations}, question)
+            return self._clean_answer(answer), new_conversation_id, sources
+    
+    def ask(self, question, conversation_id=None, timings=None, session_id=None, use_cache=True):
         """
         向千帆Agent提问（使用队列排队）
+
+        timings: 可选字典，写入各阶段耗时（queue_wait_ms、connect_ms、upstream_ms、
+                 postprocess_ms、total_ms）
+        session_id: 用户会话标识，用于公平排队；未提供时使用 conversation_id
+        use_cache: 为False时不查回答缓存，总是请求上游（预热任务用）
         """
         if not self.api_key:
             return "API Key未配置", None, []
         
-        # 创建一个事件来等待结果
-        from threading import Event
+        start = time.perf_counter()
+        try:
+            return self._ask(question, conversation_id, timings, session_id, use_cache)
+        except QueueFullError:
+            return QUEUE_FULL_MESSAGE, None, []
+        finally:
+            record_stage(timings, "total", (time.perf_counter() - start) * 1000)
+    
+    def _ask(self, question, conversation_id, timings, session_id=None, use_cache=True):
+        # 新对话的首个问题先查缓存
+        if not conversation_id and use_cache:
+            cached = self._cache_lookup(question)
+            if cached:
+                return cached
         
-        result_event = Event()
-        result_container = []
+        # 将请求交给调度器（新对话的相同问题合并为一次上游请求）
+        payload = self._new_payload(question, conversation_id, session_id, timings)
+        if conversation_id:
+            future, is_leader = self._submit(payload), True
+        else:
+            future, is_leader, payload = self._submit_coalesced(payload)
         
-        def callback(result):
-            result_container.append(result)
-            result_event.set()
+        # 等待结果（最多等待 REQUEST_TIMEOUT 秒），超时后放弃该请求
+        try:
+            result = future.result(timeout=REQUEST_TIMEOUT)
+        except (FutureTimeoutError, DeadlineExceeded, CancelledError):
+            self._abandon(payload, future)
+            return TIMEOUT_MESSAGE, None, []
         
-        # 将请求加入队列
-        self.request_queue.append((question, conversation_id, callback))
+        return result if is_leader else self._follower_result(result)
+    
+    def _new_payload(self, question, conversation_id, session_id, timings, sink=None):
+        """构造调度器中的请求，截止时间为 REQUEST_TIMEOUT 秒后"""
+        payload = {
+            "question": question,
+            "conversation_id": conversation_id,
+            "session_id": session_id,
+            "timings": timings,
+            "enqueued_at": time.perf_counter(),
+            "deadline": time.monotonic() + REQUEST_TIMEOUT,
+            "cancelled": threading.Event(),  # 所有等待者都已放弃
+            "waiters": 1,  # 等待该请求结果的调用方数（含合并的跟随者）
+        }
+        if sink is not None:
+            payload["sink"] = sink
+        return payload
+    
+    def _submit(self, payload):
+        """按会话提交到调度器（同一会话的请求在公平队列中共用一个位置）
+
+        既没有会话ID也没有对话ID的匿名调用方 key 为None，不受单会话的排队和并发上限限制
+        """
+        future = self.scheduler.submit(
+            payload,
+            key=payload.get("session_id") or payload["conversation_id"],
+            deadline=payload["deadline"]
+        )
+        future.add_done_callback(self._count_dropped)
+        return future
+    
+    @staticmethod
+    def _count_dropped(future):
+        """统计在调度器中未派发即丢弃的请求"""
+        if future.cancelled():
+            DROPPED_REQUESTS.inc(reason="cancelled")
+        elif isinstance(future.exception(), DeadlineExceeded):
+            DROPPED_REQUESTS.inc(reason="expired")
+    
+    def _abandon(self, payload, future):
+        """调用方不再等待结果；所有等待者都放弃后取消请求（排队中直接移出，进行中尽早停止）"""
+        with self._inflight_lock:
+            payload["waiters"] -= 1
+            if payload["waiters"] > 0:
+                return
+        payload["cancelled"].set()
+        future.cancel()
+    
+    def estimate_wait(self, session_id=None, future=None):
+        """估算排队情况，返回 (前面的请求数, 预计等待秒数)
+
+        future 为已提交的请求时估算它的剩余等待，否则估算该会话现在提问需要等待多久
+        """
+        ahead = self.scheduler.requests_ahead(session_id, future)
+        # 派发速率取凭据总预算和按近期耗时估算的处理能力中较小者
+        rate = self.credential_pool.total_rate()
+        service_rate = self.scheduler.service_rate()
+        if service_rate:
+            rate = min(rate, service_rate)
+        return ahead, ahead / rate
+    
+    def _submit_coalesced(self, payload):
+        """提交新对话请求；同一问题已在进行中时直接复用
+
+        返回 (future, 是否为发起者, 实际等待的请求)，放弃等待时把后者传给 _abandon
+
+        提交到调度器和注册回调都在 _inflight_lock 之外进行：Future 已结束时回调会在当前线程
+        立即执行，而回调本身要获取该锁。提交后再检查一次，期间已有其他调用方发起同一问题时
+        撤回自己的请求改为跟随，保证同一问题只请求一次上游。
+        """
+        key = normalize_question(payload["question"])
+        with self._inflight_lock:
+            joined = self._join_inflight(key)
+        if joined is not None:
+            return joined
         
-        # 等待结果（最多等待30秒）
-        result_event.wait(timeout=30)
+        future = self._submit(payload)
+        with self._inflight_lock:
+            joined = self._join_inflight(key)
+            if joined is None:
+                self._inflight[key] = (future, payload)
+                self.coalesce_stats["upstream"] += 1
+        if joined is not None:
+            payload["cancelled"].set()
+            future.cancel()
+            return joined
         
-        if result_container:
-            return result_container[0]
-        else:
-            return "请求超时，请稍后再试", None, []
+        def on_done(done_future):
+            # 先写缓存再移出进行中列表，避免中间窗口再次请求上游
+            if not done_future.cancelled() and done_future.exception() is None:
+                self._cache_store(payload["question"], done_future.result())
+            with self._inflight_lock:
+                if self._inflight.get(key, (None,))[0] is done_future:
+                    del self._inflight[key]
+        
+        future.add_done_callback(on_done)
+        return future, True, payload
     
-    def _extract_sources(self, result):
-        """提取知识来源"""
+    def _join_inflight(self, key):
+        """同一问题已在进行中时登记为跟随者，返回 (future, False, 共享的请求)，否则返回None
+        
+        调用方需持有 _inflight_lock
+        """
+        inflight = self._inflight.get(key)
+        if inflight is None or inflight[1]["cancelled"].is_set():
+            return None
+        future, shared = inflight
+        shared["waiters"] += 1
+        self.coalesce_stats["coalesced"] += 1
+        return future, False, shared
+    
+    def _follower_result(self, result):
+        """合并请求的跟随者不复用发起者的conversation_id"""
+        answer, _, sources = result
+        return answer, None, list(sources)
+    
+    def get_coalesce_stats(self):
+        """请求合并统计：upstream为实际上游请求数，coalesced为节省的请求数"""
+        with self._inflight_lock:
+            stats = dict(self.coalesce_stats)
+            stats["inflight"] = len(self._inflight)
+        return stats
+    
+    def _cache_lookup(self, question):
+        """查询回答缓存，精确未命中时找相似的已回答问题；命中时不复用他人的conversation_id"""
+        cached = self.answer_cache.get(question)
+        if not cached:
+            similar = self.similarity_cache.lookup(question)
+            if similar:
+                cached = self.answer_cache.get(similar)
+                if not cached:
+                    # 回答已过期或被淘汰（含知识库更新后整体失效）
+                    self.similarity_cache.discard(similar)
+        if cached:
+            answer, _, sources = cached
+            return answer, None, sources
+        return None
+    
+    def _cache_store(self, question, result):
+        """只缓存成功的回答（拿到了conversation_id）"""
+        answer, new_conversation_id, sources = result
+        if answer and new_conversation_id:
+            self.answer_cache.put(question, answer, new_conversation_id, sources)
+            self.similarity_cache.add(question)
+    
+    def get_cache_stats(self):
+        """回答缓存命中统计（similar_* 为精确未命中后的相似问题查找）"""
+        stats = self.answer_cache.get_stats()
+        similar = self.similarity_cache.get_stats()
+        stats["similar_hits"] = similar["hits"]
+        stats["similar_misses"] = similar["misses"]
+        return stats
+    
+    def ask_stream(self, question, conversation_id=None, timings=None, session_id=None, on_wait=None):
+        """
+        流式提问：逐步产出 (当前回答, conversation_id, sources)，最后一次为完整结果；
+        中间产出的回答只在末尾追加，与最终结果的前缀一致
+
+        timings: 可选字典，写入首字延迟 ttft_ms、总耗时 total_ms 及各阶段耗时
+        session_id: 用户会话标识，用于公平排队；未提供时使用 conversation_id
+        on_wait: 可选回调 on_wait(前面的请求数, 预计等待秒数)，排队期间约每秒调用一次
+        """
+        if not self.api_key:
+            yield "API Key未配置", None, []
+            return
+        
+        start = time.perf_counter()
+        if not conversation_id:
+            cached = self._cache_lookup(question)
+            if cached:
+                elapsed = (time.perf_counter() - start) * 1000
+                record_stage(timings, "ttft", elapsed)
+                record_stage(timings, "total", elapsed)
+                yield cached
+                return
+        
+        sink = queue.Queue()
+        payload = self._new_payload(question, conversation_id, session_id, timings, sink)
+        try:
+            if conversation_id:
+                future, is_leader = self._submit(payload), True
+            else:
+                future, is_leader, payload = self._submit_coalesced(payload)
+        except QueueFullError:
+            elapsed = (time.perf_counter() - start) * 1000
+            record_stage(timings, "ttft", elapsed)
+            record_stage(timings, "total", elapsed)
+            yield QUEUE_FULL_MESSAGE, None, []
+            return
+        
+        # 超时或生成器被提前关闭（如页面重跑）都视为放弃等待，取消该请求
+        completed = False
+        try:
+            if not is_leader:
+                # 相同问题已在请求中，等待其完整结果
+                try:
+                    result = self._follower_result(future.result(timeout=REQUEST_TIMEOUT))
+                    completed = True
+                except (FutureTimeoutError, DeadlineExceeded, CancelledError):
+                    result = (TIMEOUT_MESSAGE, None, [])
+                elapsed = (time.perf_counter() - start) * 1000
+                record_stage(timings, "ttft", elapsed)
+                record_stage(timings, "total", elapsed)
+                yield result
+                return
+            
+            # 请求在调度器中被丢弃（过期）时不会写入 sink，这里补一个结束标记
+            def on_dropped(done_future):
+                if not done_future.cancelled() and done_future.exception() is not None:
+                    sink.put(("dropped", None))
+            
+            future.add_done_callback(on_dropped)
+            if on_wait is not None:
+                on_wait(*self.estimate_wait(session_id, future))
+            
+            # 增量清理引用标记：被拆到两块之间的 ^[12]^ 会先暂存，不会出现在界面上
+            cleaner = StreamingCleaner()
+            received = False
+            answer = ""
+            idle_deadline = time.monotonic() + REQUEST_TIMEOUT
+            while True:
+                try:
+                    # 两次数据之间最多等待 REQUEST_TIMEOUT 秒；收到首字前每秒回报一次排队情况
+                    timeout = max(0.0, idle_deadline - time.monotonic())
+                    if on_wait is not None and not received:
+                        timeout = min(timeout, 1.0)
+                    kind, value = sink.get(timeout=timeout)
+                except queue.Empty:
+                    if time.monotonic() < idle_deadline:
+                        on_wait(*self.estimate_wait(session_id, future))
+                        continue
+                    kind, value = "dropped", None
+                idle_deadline = time.monotonic() + REQUEST_TIMEOUT
+                
+                if kind == "chunk":
+                    if not received:
+                        received = True
+                        record_stage(timings, "ttft", (time.perf_counter() - start) * 1000)
+                    delta = cleaner.feed(value)
+                    if delta:
+                        answer += delta
+                        yield answer, None, []
+                    continue
+                
+                elapsed = (time.perf_counter() - start) * 1000
+                if not received:
+                    record_stage(timings, "ttft", elapsed)
+                record_stage(timings, "total", elapsed)
+                if kind == "dropped":
+                    yield TIMEOUT_MESSAGE, None, []
+                else:
+                    completed = True
+                    yield value
+                return
+        finally:
+            if not completed:
+                self._abandon(payload, future)
+    
+    def _local_sources(self, question):
+        """在本地知识库索引中检索来源"""
+        now = time.time()
+        if now - self._kb_refreshed_at > self.kb_refresh_interval:
+            self._kb_refreshed_at = now
+            self.kb_index.refresh()
+        try:
+            return self.kb_index.lookup_sources(question)
+        except Exception as e:
+            print(f"本地知识库检索失败: {e}")
+            return []
+    
+    def _extract_sources(self, result, question=None):
+        """提取知识来源，接口未返回引用时用本地知识库检索补充"""
         sources = []
         
         if "citations" in result:
@@ -202,6 +799,9 @@ class LLMService:
                     if text and len(text) > 10:
                         sources.append(text)
         
+        if not sources and question and result.get("answer"):
+            sources.extend(self._local_sources(question))
+        
         if not sources and "answer" in result and result["answer"]:
             sources.append("📚 回答基于学校知识库")
         
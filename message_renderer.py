@@ -0,0 +1,113 @@
+"""
+消息渲染 - 强制换行格式化 + 渲染缓存
+Streamlit 每次交互都会重跑整个脚本，历史消息会被反复格式化。
+这里按消息内容缓存最终的 HTML 片段，重跑时历史消息直接命中缓存；
+格式化本身保持 str.replace 链（比合并成一个带回调的正则更快），流式输出时增量格式化。
+"""
+
+import re
+from functools import lru_cache
+
+RENDER_CACHE_SIZE = 4096
+
+# 数字序号、中文序号、括号序号前换行（中文标点用 str.replace，比正则快）
+_NUM_RE = re.compile(r'(\d+\.)')
+_CN_RE = re.compile(r'([一二三四五六七八九十])[、.]')
+_PAREN_RE = re.compile(r'（(\d+)）')
+# 连续换行（中间可夹空白）合并为一个空行
+_BLANK_LINES_RE = re.compile(r'\n\s*\n')
+
+# 流式格式化时结尾可能与后续文本组成一次替换、需要暂存的部分
+_TOKEN_TAIL_RE = re.compile(r'(?:\r|\d+|[一二三四五六七八九十]|（\d*)\Z')
+_NEWLINE_TAIL_RE = re.compile(r'\n\s*\Z')
+
+
+def _break_lines(text):
+    """统一换行符，在中文标点后、各类序号前插入换行"""
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    text = text.replace('。', '。\n')
+    text = text.replace('？', '？\n')
+    text = text.replace('！', '！\n')
+    text = text.replace('；', '；\n')
+    text = text.replace('：', '：\n')
+    text = _NUM_RE.sub(r'\n\1', text)
+    text = _CN_RE.sub(r'\n\1、', text)
+    return _PAREN_RE.sub(r'\n（\1）', text)
+
+
+def _to_html(text):
+    """连续换行合并为一个空行，换行转为 <br>"""
+    return '<br>'.join(_BLANK_LINES_RE.sub('\n\n', text).split('\n'))
+
+
+def format_with_line_breaks(text):
+    """
+    强制处理换行，确保AI回答中的每个句子都能正确换行
+    """
+    if not text:
+        return text
+
+    return _to_html(_break_lines(text))
+
+
+class StreamingFormatter:
+    """format_with_line_breaks 的流式版本：逐块输入，增量输出HTML
+
+    只暂存结尾可能与后续文本组成一次替换的部分（回车符、数字、中文序号、未闭合的
+    （数字、换行后的空白），其余部分立即输出；所有输出拼接后与
+    format_with_line_breaks(完整文本) 一致。
+    """
+
+    def __init__(self):
+        self._token_pending = ""
+        self._newline_pending = ""
+
+    def feed(self, chunk):
+        """输入一块文本，返回可以确定的HTML"""
+        if not chunk:
+            return ""
+        text, self._token_pending = self._split_tail(self._token_pending + chunk, _TOKEN_TAIL_RE)
+        text = _break_lines(text)
+        text, self._newline_pending = self._split_tail(self._newline_pending + text, _NEWLINE_TAIL_RE)
+        return _to_html(text)
+
+    def finish(self):
+        """输入结束，返回剩余的HTML"""
+        text = self._newline_pending + _break_lines(self._token_pending)
+        self._token_pending = self._newline_pending = ""
+        return _to_html(text)
+
+    @staticmethod
+    def _split_tail(text, tail_re):
+        match = tail_re.search(text)
+        if match is None:
+            return text, ""
+        return text[:match.start()], text[match.start():]
+
+
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def render_message(role, content):
+    """渲染一条消息的气泡HTML，按 (角色, 内容) 缓存"""
+    if role == "user":
+        body = content
+    else:
+        body = format_with_line_breaks(content)
+
+    return f"""
+        <div class="message-row {role}">
+            <div class="message-bubble {role}">
+                <div class="message-content">{body}</div>
+            </div>
+        </div>
+        """
+
+
+def render_cache_info():
+    """渲染缓存命中统计"""
+    return render_message.cache_info()
+
+
+@lru_cache(maxsize=256)
+def render_history(items):
+    """把一段较早的历史消息合并为一个HTML片段（不带按钮），items 为 ((角色, 内容), ...)"""
+    return "".join(render_message(role, content) for role, content in items)
@@ -0,0 +1,188 @@
+"""
+进程内指标注册表
+- Histogram / Counter，线程安全
+- stage_timer：记录一次请求各阶段耗时（毫秒），同时写入直方图
+- 导出为 Prometheus 文本格式：render_text() / dump(path) / serve(port)
+"""
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 毫秒级延迟直方图的默认分桶
+DEFAULT_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    inner = ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+    return "{" + inner + "}"
+
+
+class Histogram:
+    """带标签的累计分桶直方图"""
+
+    def __init__(self, name, help_text="", buckets=DEFAULT_BUCKETS_MS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series = {}  # 标签元组 -> [各桶计数..., sum, count]
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {key: list(series) for key, series in self._series.items()}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self.snapshot().items()):
+            labels = dict(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': bound})} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {series[-2]:.3f}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {series[-1]}")
+        return lines
+
+
+class Counter:
+    """带标签的计数器"""
+
+    def __init__(self, name, help_text=""):
+        self.name = name
+        self.help_text = help_text
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(dict(key))} {value}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表，同名指标只创建一次"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def histogram(self, name, help_text="", buckets=DEFAULT_BUCKETS_MS):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, help_text, buckets)
+            return self._metrics[name]
+
+    def counter(self, name, help_text=""):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Counter(name, help_text)
+            return self._metrics[name]
+
+    def render_text(self):
+        """Prometheus 文本格式"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """写入文件（先写临时文件再替换，避免读到半截内容）"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render_text())
+        os.replace(tmp_path, path)
+
+    def start_file_dump(self, path, interval=60):
+        """后台线程每隔 interval 秒写一次文件"""
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.dump(path)
+                except Exception as e:
+                    print(f"指标写入失败: {e}")
+
+        threading.Thread(target=run, name="metrics-dump", daemon=True).start()
+
+    def serve(self, port, host="127.0.0.1"):
+        """在后台线程提供 /metrics 文本接口，返回服务器对象"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = registry.render_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        return server
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_LATENCY = REGISTRY.histogram(
+    "yixiaoguan_stage_latency_ms", "聊天请求各阶段耗时（毫秒）"
+)
+
+
+def record_stage(timings, stage, ms):
+    """记录一个阶段的耗时：累加到 timings[stage_ms] 并写入直方图"""
+    if timings is not None:
+        key = f"{stage}_ms"
+        timings[key] = timings.get(key, 0.0) + ms
+    STAGE_LATENCY.observe(ms, stage=stage)
+
+
+@contextmanager
+def stage_timer(timings, stage):
+    """计时上下文：with stage_timer(timings, "upstream"): ..."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(timings, stage, (time.perf_counter() - start) * 1000)
@@ -0,0 +1,294 @@
+"""
+千帆 Agent 本地模拟服务器
+模拟 /v2/app/conversation/runs 接口，支持普通JSON响应和SSE流式响应，
+可配置延迟分布、按Key限流，以及随机注入429/5xx，
+用于在不调用真实API的情况下测试 LLMService 的吞吐和尾延迟。
+
+用法：
+    with MockQianfanServer(answer="...", chunk_delay=0.05) as server:
+        llm = LLMService(api_key="test", base_url=server.url)
+"""
+
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from scheduler import TokenBucket
+
+DEFAULT_ANSWER = (
+    "同学你好，很高兴为你解答！奖学金申请要点如下^[1]^：\n"
+    "一、国家奖学金（10000元/人）。1. 申请条件：成绩和综合测评排名靠前[2]。"
+    "2. 报送时间：9月25日前提交电子版和纸质版至学工部。"
+)
+
+RUNS_PATH = "/v2/app/conversation/runs"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "MockQianfan/1.0"
+
+    def log_message(self, format, *args):
+        # 静默，避免刷屏
+        pass
+
+    def do_POST(self):
+        mock = self.server.mock
+        if self.path != RUNS_PATH:
+            self._send_json(404, {"code": "NotFound", "message": self.path})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        mock.record(body)
+
+        api_key = self.headers.get("Authorization", "").replace("Bearer ", "", 1)
+        wait = mock.admit(api_key)
+        if wait:
+            headers = {"Retry-After": str(math.ceil(wait))} if mock.retry_after else {}
+            self._send_json(429, {"code": "RateLimitExceeded", "message": f"QPS limit exceeded for {api_key}"},
+                            headers)
+            return
+
+        fault = mock.inject_fault()
+        if fault == 429:
+            headers = {"Retry-After": "1"} if mock.retry_after else {}
+            self._send_json(429, {"code": "RateLimitExceeded", "message": "injected"}, headers)
+            return
+
+        conversation_id = body.get("conversation_id") or str(uuid.uuid4())
+        latency = mock.sample_latency()
+        if latency:
+            time.sleep(latency)
+        if fault is not None:
+            self._send_json(fault, {"code": "InternalError", "message": "injected"})
+            return
+
+        if body.get("stream"):
+            self._send_stream(mock, conversation_id)
+        else:
+            self._send_json(200, {
+                "conversation_id": conversation_id,
+                "answer": mock.answer,
+                "citations": mock.citations,
+            })
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self._write(data)
+
+    def _send_stream(self, mock, conversation_id):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        chunks = mock.split_answer()
+        for i, chunk in enumerate(chunks):
+            event = {
+                "conversation_id": conversation_id,
+                "answer": chunk,
+                "is_completion": False,
+            }
+            if i == len(chunks) - 1:
+                event["citations"] = mock.citations
+            if not self._write_event(event):
+                return
+            if mock.chunk_delay:
+                time.sleep(mock.chunk_delay)
+
+        self._write_event({
+            "conversation_id": conversation_id,
+            "answer": "",
+            "is_completion": True,
+        })
+        self.close_connection = True
+
+    def _write_event(self, event):
+        line = "data: " + json.dumps(event, ensure_ascii=False) + "\n\n"
+        return self._write(line.encode("utf-8"))
+
+    def _write(self, data):
+        """写出响应数据；客户端已断开（如请求超时或被取消）时不再输出堆栈，返回False"""
+        try:
+            self.wfile.write(data)
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+            return False
+        return True
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # 默认的监听队列只有5，几十个客户端同时建连时多出的连接会被重置
+    request_queue_size = 128
+
+
+class MockQianfanServer:
+    """在后台线程中运行的模拟千帆服务器
+
+    answer: 返回的回答文本
+    citations: 返回的引用列表
+    latency: 开始响应前的延迟（秒），可以是数字或无参数、返回秒数的函数（延迟分布，
+             如 lognormal_latency(0.8, 3.0)）
+    chunk_size: 流式响应中每个分片的字符数
+    chunk_delay: 流式响应中分片之间的间隔（秒）
+    key_qps: 每个API Key的QPS上限，超出返回429；可以是数字（所有Key相同）、
+             {api_key: qps} 字典（未列出的Key不限流），或以服务器启动后秒数为参数、
+             返回当前QPS上限的函数（模拟随时间变化的配额），None表示不限流
+    key_burst: 每个API Key允许的瞬时突发请求数
+    retry_after: 429响应是否带 Retry-After 头（距下一个可用配额的秒数，向上取整）
+    throttle_rate: 与配额无关、随机返回429的比例
+    error_rate: 随机返回5xx的比例（在延迟之后返回，模拟上游处理失败）
+    error_status: 注入的5xx状态码
+    seed: 随机数种子（延迟分布和故障注入），便于复现
+    """
+
+    def __init__(self, answer=DEFAULT_ANSWER, citations=None, latency=0.0,
+                 chunk_size=8, chunk_delay=0.0, key_qps=None, key_burst=1,
+                 retry_after=False, throttle_rate=0.0, error_rate=0.0, error_status=503, seed=None,
+                 host="127.0.0.1", port=0):
+        self.answer = answer
+        self.citations = citations if citations is not None else [
+            {"text": "《学生奖助学金管理办法》第三章 国家奖学金评选"}
+        ]
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.key_qps = key_qps
+        self.key_burst = key_burst
+        self.retry_after = retry_after
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rng = random.Random(seed)
+        self.started_at = time.monotonic()
+        self.requests = []
+        self.key_counts = Counter()  # api_key -> 成功受理的请求数
+        self.rejected = Counter()  # api_key -> 被限流拒绝的请求数
+        self.injected = Counter()  # 状态码 -> 注入的故障次数
+        self._key_limiters = {}
+        self._requests_lock = threading.Lock()
+
+        self._httpd = _Server((host, port), _Handler)
+        self._httpd.mock = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}{RUNS_PATH}"
+
+    def record(self, body):
+        with self._requests_lock:
+            self.requests.append(body)
+
+    def current_qps(self, api_key):
+        if callable(self.key_qps):
+            return self.key_qps(time.monotonic() - self.started_at)
+        if isinstance(self.key_qps, dict):
+            return self.key_qps.get(api_key)
+        return self.key_qps
+
+    def admit(self, api_key):
+        """按 API Key 限流：受理返回0，否则返回距下一个可用配额的秒数"""
+        with self._requests_lock:
+            qps = self.current_qps(api_key)
+            if qps:
+                limiter = self._key_limiters.get(api_key)
+                if limiter is None:
+                    limiter = self._key_limiters[api_key] = TokenBucket(qps, self.key_burst)
+                limiter.rate = float(qps)
+                wait = limiter.try_acquire()
+                if wait > 0:
+                    self.rejected[api_key] += 1
+                    return wait
+            self.key_counts[api_key] += 1
+            return 0
+
+    def inject_fault(self):
+        """按比例随机注入故障：返回 429 / error_status，不注入时返回None"""
+        if not self.throttle_rate and not self.error_rate:
+            return None
+        with self._requests_lock:
+            roll = self.rng.random()
+            if roll < self.throttle_rate:
+                status = 429
+            elif roll < self.throttle_rate + self.error_rate:
+                status = self.error_status
+            else:
+                return None
+            self.injected[status] += 1
+            return status
+
+    def sample_latency(self):
+        if callable(self.latency):
+            with self._requests_lock:
+                return self.latency()
+        return self.latency
+
+    def split_answer(self):
+        size = max(1, self.chunk_size)
+        return [self.answer[i:i + size] for i in range(0, len(self.answer), size)] or [""]
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def lognormal_latency(median, p99, rng=None):
+    """对数正态延迟分布：给定中位数和99分位（秒），返回每次调用采样一个延迟的函数"""
+    rng = rng or random.Random()
+    mu = math.log(median)
+    sigma = max(0.0, math.log(p99 / median) / 2.326)  # 标准正态分布的99分位
+    return lambda: rng.lognormvariate(mu, sigma)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="千帆 Agent 本地模拟服务器")
+    parser.add_argument("port", type=int, nargs="?", default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="延迟中位数（秒）")
+    parser.add_argument("--latency-p99", type=float, default=None, help="延迟99分位（秒），指定时按对数正态分布采样")
+    parser.add_argument("--key-qps", type=float, default=None, help="每个API Key的QPS上限")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="随机返回429的比例")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="随机返回5xx的比例")
+    args = parser.parse_args()
+
+    latency = args.latency
+    if args.latency_p99 and args.latency:
+        latency = lognormal_latency(args.latency, args.latency_p99)
+    server = MockQianfanServer(port=args.port, chunk_delay=0.05, latency=latency, key_qps=args.key_qps,
+                               retry_after=True, throttle_rate=args.throttle_rate, error_rate=args.error_rate)
+    print(f"🧪 模拟千帆服务器已启动: {server.url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,198 @@
+"""
+近似重复问题聚类 - 供 EvolutionAnalyzer 使用
+同一个需求有很多问法（“考研有什么要求” / “考研条件”），只统计关键词看不出来，
+两两比较相似度又是平方复杂度。这里：
+1. 先按问题去重，归一化后去掉问句虚词、统一近义说法，再取字符 n-gram 作为特征
+2. 用 NumPy 向量化计算 MinHash 签名（num_perm 个哈希函数，分块计算控制内存）
+3. 签名分成 bands 段做局部敏感哈希，与簇中心至少一段完全相同的才成为候选，
+   只和候选中心比较估计的 Jaccard 相似度，整体近似线性
+"""
+
+import re
+import zlib
+
+import numpy as np
+
+from answer_cache import normalize_question
+
+SHINGLE_SIZE = 2
+NUM_PERM = 64
+BANDS = 16  # 每段 4 行，相似度 0.7 的问题成为候选的概率约 0.99
+THRESHOLD = 0.7
+BLOCK_SHINGLES = 200_000  # 每次计算签名的特征数上限
+BUCKET_CENTERS = 32  # 每个桶最多记录的簇中心数（先处理的高频问法优先），限制热门桶的比较次数
+
+# 不影响需求的问句虚词
+FILLER_WORDS = ['请问', '有什么', '是什么', '有哪些', '怎么样', '怎么', '如何', '什么',
+                '哪些', '一下', '想问', '我想', '我们', '我', '需要', '准备', '吗', '呢', '啊', '呀', '吧', '的']
+# 同一需求的不同说法，统一为第一个词
+SYNONYMS = [
+    ('条件', '要求', '资格', '标准'),
+    ('办理', '申请', '办'),
+    ('流程', '步骤', '程序'),
+    ('时间', '时候', '日期'),
+    ('材料', '资料'),
+]
+_REPLACEMENTS = {word: group[0] for group in SYNONYMS for word in group}
+_REPLACEMENTS.update((word, '') for word in FILLER_WORDS)
+# 一次扫描、长词优先，避免替换结果被再次替换（如“办理”中的“办”）
+_REPLACE_RE = re.compile("|".join(map(re.escape, sorted(_REPLACEMENTS, key=len, reverse=True))))
+
+
+def canonical_question(question):
+    """归一化问题并去掉虚词、统一近义说法；全是虚词时保留归一化结果"""
+    text = normalize_question(question)
+    return _REPLACE_RE.sub(lambda m: _REPLACEMENTS[m.group(0)], text) or text
+
+
+def shingle_hashes(text, size=SHINGLE_SIZE):
+    """字符 n-gram 的32位哈希（crc32，跨进程稳定），短于 size 的问题整体作为一个特征"""
+    grams = {text[i:i + size] for i in range(len(text) - size + 1)} or {text}
+    return [zlib.crc32(g.encode("utf-8")) for g in grams]
+
+
+def minhash_signatures(shingle_sets, num_perm=NUM_PERM, seed=0):
+    """计算 MinHash 签名，返回 (len(shingle_sets), num_perm) 的 uint32 数组
+
+    哈希族为 multiply-shift：h(x) = ((a*x + b) mod 2^64) >> 32，a 为奇数，
+    在 uint64 上按块计算后用 minimum.reduceat 按问题取最小值。
+    shingle_sets 中每个元素都不能为空。
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+
+    lengths = np.fromiter((len(s) for s in shingle_sets), dtype=np.int64, count=len(shingle_sets))
+    flat = np.fromiter((h for s in shingle_sets for h in s), dtype=np.uint64, count=int(lengths.sum()))
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+
+    signatures = np.empty((len(shingle_sets), num_perm), dtype=np.uint32)
+    first = 0
+    while first < len(shingle_sets):
+        # 按问题边界分块，每块的特征数不超过 BLOCK_SHINGLES（单个问题过长时至少取一个）
+        last = max(first + 1, int(np.searchsorted(ends, starts[first] + BLOCK_SHINGLES, side="right")))
+        lo, hi = starts[first], ends[last - 1]
+        with np.errstate(over="ignore"):
+            hashed = (flat[lo:hi][:, None] * a + b) >> np.uint64(32)
+        signatures[first:last] = np.minimum.reduceat(hashed, starts[first:last] - lo, axis=0)
+        first = last
+    return signatures
+
+
+def _band_keys(signatures, bands):
+    """每段签名的桶编号，返回 (bands, n) 的数组，同一段桶编号相同即签名段完全相同"""
+    n, num_perm = signatures.shape
+    rows = num_perm // bands
+    keys = np.empty((bands, n), dtype=np.int64)
+    for band in range(bands):
+        block = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        _, keys[band] = np.unique(block.view(np.dtype((np.void, block.dtype.itemsize * rows))).ravel(),
+                                  return_inverse=True)
+    return keys
+
+
+def lsh_clusters(signatures, bands=BANDS, threshold=THRESHOLD, order=None, bucket_centers=BUCKET_CENTERS):
+    """局部敏感哈希聚类，返回每行签名所属簇的中心行号
+
+    按 order（默认按行号）依次处理：与已有中心至少有一段签名相同的为候选，
+    取估计 Jaccard 相似度最高且不低于阈值的中心加入，否则自己成为新的中心。
+    每个问题只和簇中心比较，不会像连通分量那样经由中间问题把不相关的需求串成一簇。
+    """
+    n, num_perm = signatures.shape
+    min_equal = threshold * num_perm
+    keys = _band_keys(signatures, bands).T.tolist()
+    buckets = [{} for _ in range(bands)]  # 每段：桶编号 -> 该桶中的中心
+    labels = np.empty(n, dtype=np.int64)
+    for i in (range(n) if order is None else order):
+        row_keys = keys[i]
+        candidates = {c for band, key in enumerate(row_keys) for c in buckets[band].get(key, ())}
+        if candidates:
+            centers = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            equal = np.count_nonzero(signatures[centers] == signatures[i], axis=1)
+            best = int(np.argmax(equal))
+            if equal[best] >= min_equal:
+                labels[i] = centers[best]
+                continue
+        labels[i] = i
+        for band, key in enumerate(row_keys):
+            bucket = buckets[band].setdefault(key, [])
+            if len(bucket) < bucket_centers:
+                bucket.append(i)
+    return labels
+
+
+def cluster_questions(questions, threshold=THRESHOLD, num_perm=NUM_PERM, bands=BANDS, seed=0, counts=None):
+    """对问题聚类，返回与 questions 等长的簇标签数组（int64），空问题为 -1
+
+    先按原文、再按归一化结果去重，只对不同的问题计算签名；
+    出现次数多的问法先处理，优先成为簇中心。
+    counts: 每个问题的出现次数（questions 已按原文分组计数时传入），默认每个1次
+    """
+    codes, uniques = _factorize(questions)
+    canon = [canonical_question(q) for q in uniques]
+    canon_codes, canon_uniques = _factorize(canon)
+    frequency = np.bincount(canon_codes[codes], weights=counts, minlength=len(canon_uniques))
+
+    labels = np.full(len(canon_uniques), -1, dtype=np.int64)
+    valid = np.array([bool(text) for text in canon_uniques], dtype=bool)
+    index = np.flatnonzero(valid)
+    if len(index):
+        signatures = minhash_signatures([shingle_hashes(canon_uniques[i]) for i in index], num_perm, seed)
+        order = np.argsort(-frequency[index], kind="stable").tolist()
+        labels[index] = index[lsh_clusters(signatures, bands, threshold, order)]
+    return labels[canon_codes][codes]
+
+
+def _factorize(values):
+    """返回 (每个值的编号数组, 按首次出现顺序的不同值列表)"""
+    ids = {}
+    codes = np.fromiter((ids.setdefault(v, len(ids)) for v in values), dtype=np.int64, count=len(values))
+    return codes, list(ids)
+
+
+def cluster_report(questions, labels, masks=None, top_n=10, min_size=2, examples=3, counts=None):
+    """按簇汇总，返回按问题数从多到少的前 top_n 个簇（questions 需支持下标访问）
+
+    每个簇：{"size", "variants", "representative", "examples", "dislike_rate", "no_source_rate"}
+    representative 为簇内出现次数最多的问法；masks 为与 questions 等长的布尔数组字典
+    （dislike / no_source），缺少时对应比例为 None。
+    counts: 每个问题的出现次数，此时 masks 中为对应的点踩 / 无来源次数
+    """
+    masks = masks or {}
+    labels = np.asarray(labels)
+    valid = labels >= 0
+    if not valid.any():
+        return []
+    weights = np.ones(len(labels)) if counts is None else np.asarray(counts, dtype=np.float64)
+    cluster_ids, compact = np.unique(labels[valid], return_inverse=True)
+    sizes = np.bincount(compact, weights=weights[valid])
+    rates = {
+        name: np.bincount(compact, weights=np.asarray(masks[name])[valid], minlength=len(cluster_ids)) / sizes
+        for name in ("dislike", "no_source") if name in masks
+    }
+
+    ranked = [c for c in np.argsort(-sizes, kind="stable") if sizes[c] >= min_size][:top_n]
+    if not ranked:
+        return []
+    # 只统计入选簇的问法次数
+    selected = np.flatnonzero(np.isin(labels, cluster_ids[ranked]))
+    codes, uniques = _factorize([questions[i] for i in selected])
+    pairs, inverse = np.unique(np.stack([labels[selected], codes]), axis=1, return_inverse=True)
+    pair_counts = np.bincount(inverse.ravel(), weights=weights[selected])
+    counts = {}
+    for label, code, count in zip(pairs[0], pairs[1], pair_counts):
+        counts.setdefault(int(label), []).append((uniques[code], int(count)))
+
+    report = []
+    for c in ranked:
+        variants = sorted(counts[int(cluster_ids[c])], key=lambda item: -item[1])
+        report.append({
+            "size": int(sizes[c]),
+            "variants": len(variants),
+            "representative": str(variants[0][0]),
+            "examples": [str(q) for q, _ in variants[1:examples + 1]],
+            "dislike_rate": float(rates["dislike"][c]) if "dislike" in rates else None,
+            "no_source_rate": float(rates["no_source"][c]) if "no_source" in rates else None,
+        })
+    return report
@@ -0,0 +1,120 @@
+"""
+问题分词阶段 - 供 EvolutionAnalyzer 使用
+日志里大部分问题是重复的，因此：
+1. 先按问题去重并计数，只对不同的问题分词
+2. 分词结果按问题哈希持久化到 SQLite，下次运行直接复用
+3. 未缓存的问题较多时分发到 ProcessPoolExecutor，每个进程只初始化一次 jieba
+   （载入预构建词典 jieba_dict.cache，全部命中缓存时不导入 jieba）
+4. 词典含知识库关键词，缓存键带上词典版本，关键词变化后旧的分词结果不再命中
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from jieba_dict import dictionary_version, get_jieba
+
+PARALLEL_THRESHOLD = 20000  # 未缓存问题数超过该值才启用多进程
+CHUNK_SIZE = 2000  # 每个任务分发的问题数
+
+
+def question_key(question, dictionary=""):
+    return hashlib.sha1(f"{dictionary}{question}".encode("utf-8")).hexdigest()
+
+
+def _init_worker():
+    """进程池初始化：每个工作进程加载一次jieba词典"""
+    get_jieba()
+
+
+def _tokenize_chunk(questions):
+    lcut = get_jieba().lcut
+    return [lcut(q) for q in questions]
+
+
+class TokenCache:
+    """问题哈希 -> 分词结果 的持久化缓存"""
+
+    def __init__(self, db_path="token_cache.db", dictionary=None):
+        self.db_path = db_path
+        self.dictionary = dictionary_version() if dictionary is None else dictionary
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS tokens (key TEXT PRIMARY KEY, tokens TEXT)")
+        self._conn.commit()
+
+    def get_many(self, questions):
+        """批量查询，返回 {question: tokens}（只包含命中的）"""
+        keys = {question_key(q, self.dictionary): q for q in questions}
+        found = {}
+        key_list = list(keys)
+        for i in range(0, len(key_list), 900):  # SQLite 参数个数上限
+            batch = key_list[i:i + 900]
+            rows = self._conn.execute(
+                f"SELECT key, tokens FROM tokens WHERE key IN ({','.join('?' * len(batch))})",
+                batch
+            ).fetchall()
+            for key, tokens in rows:
+                found[keys[key]] = json.loads(tokens)
+        return found
+
+    def put_many(self, items):
+        """批量写入 {question: tokens}"""
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO tokens (key, tokens) VALUES (?, ?)",
+            [(question_key(q, self.dictionary), json.dumps(tokens, ensure_ascii=False)) for q, tokens in items.items()]
+        )
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+def tokenize_unique(questions, cache=None, workers=None, parallel_threshold=PARALLEL_THRESHOLD):
+    """对去重后的问题分词，返回 {question: tokens}
+
+    questions: 不重复的问题列表
+    cache: TokenCache，为None时不使用持久化缓存
+    workers: 进程数，None为CPU核数，1表示不启用多进程
+    """
+    result = cache.get_many(questions) if cache else {}
+    missing = [q for q in questions if q not in result]
+
+    if missing:
+        workers = workers or os.cpu_count() or 1
+        if workers > 1 and len(missing) >= parallel_threshold:
+            chunks = [missing[i:i + CHUNK_SIZE] for i in range(0, len(missing), CHUNK_SIZE)]
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                for chunk, tokens in zip(chunks, pool.map(_tokenize_chunk, chunks)):
+                    result.update(zip(chunk, tokens))
+        else:
+            result.update(zip(missing, _tokenize_chunk(missing)))
+
+        if cache:
+            cache.put_many({q: result[q] for q in missing})
+
+    return result
+
+
+def count_keywords(questions, stop_words=(), min_length=2, cache=None, workers=None, counts=None):
+    """统计问题中的关键词次数（与用同一词典逐行 jieba.lcut 的结果一致）
+
+    counts: 每个问题的出现次数（questions 已按问题分组计数时传入，如对话记录库的 GROUP BY 结果）
+    """
+    if counts is None:
+        question_counts = Counter(str(q) for q in questions)
+    else:
+        question_counts = Counter()
+        for question, count in zip(questions, counts):
+            question_counts[str(question)] += count
+    tokens = tokenize_unique(list(question_counts), cache=cache, workers=workers)
+
+    stop_words = set(stop_words)
+    word_counts = Counter()
+    for question, count in question_counts.items():
+        for word in tokens[question]:
+            if len(word) >= min_length and word not in stop_words:
+                word_counts[word] += count
+    return word_counts
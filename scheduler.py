@@ -0,0 +1,354 @@
+"""
+请求调度器 - 令牌桶限流 + 事件驱动的工作线程
+替代原先每100ms轮询一次列表的队列线程：
+空闲时工作线程阻塞在条件变量上，不产生任何唤醒；有预算时立即派发。
+排队按会话轮转（公平队列），并支持全局排队上限和每个会话的并发上限。
+请求可带截止时间：派发前已过期或已被调用方取消的请求直接丢弃，不占用限流预算。
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+
+class TokenBucket:
+    """线程安全的令牌桶限流器
+
+    rate: 每秒补充的令牌数（即平均QPS）
+    burst: 桶容量（允许的瞬时突发请求数）
+    """
+
+    def __init__(self, rate, burst=1, clock=time.monotonic):
+        if rate <= 0:
+            raise ValueError("rate 必须大于0")
+        if burst < 1:
+            raise ValueError("burst 至少为1")
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def try_acquire(self):
+        """尝试取一个令牌；成功返回0，否则返回还需等待的秒数"""
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        """阻塞直到取得一个令牌，返回实际等待的秒数"""
+        waited = 0.0
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+
+class QueueFullError(RuntimeError):
+    """排队请求已达上限，新请求被立即拒绝"""
+
+
+class DeadlineExceeded(TimeoutError):
+    """请求在派发前已超过截止时间，未执行即被丢弃"""
+
+
+class RequestScheduler:
+    """共享同一个限流预算的多工作线程调度器，按会话公平排队
+
+    handler: 实际执行请求的函数，参数为提交的 payload，返回值写入 Future
+    limiter: 限流器，需提供 acquire() 方法（通常是 TokenBucket）；
+             为None时调度器不限流，由 handler 自行等待预算（如按凭据限流）
+    workers: 工作线程数，所有线程共用同一个 limiter
+    max_queue: 全局排队上限，超出时 submit 抛出 QueueFullError；None表示不限
+    max_pending_per_key: 同一个 key 排队中+执行中的请求上限，超出同样拒绝
+    max_in_flight_per_key: 同一个 key 同时执行的请求上限，达到后该 key 暂不派发
+    （两项上限只针对指定了 key 的请求）
+
+    提交时可指定 key（如会话ID），不同 key 之间轮转派发，
+    一个会话连续提交多次也不会排在其他会话前面；不指定 key 的请求（匿名调用方）
+    共用一个普通FIFO队列，参与轮转，但不受按 key 的上限限制，只受全局排队上限约束。
+    提交时还可指定 deadline（time.monotonic() 时刻）：派发前（含等待限流预算后）
+    已过期的请求以 DeadlineExceeded 结束；调用方 cancel() 的请求立即移出队列。
+    过期请求总是由工作线程结束，Future 的回调不会在 submit 的调用线程中执行
+    （调用方可能持有自己的锁）。
+    """
+
+    def __init__(self, handler, limiter, workers=1, name="llm-worker",
+                 max_queue=None, max_pending_per_key=None, max_in_flight_per_key=None):
+        self.handler = handler
+        self.limiter = limiter
+        self.workers = max(1, int(workers))
+        self.max_queue = max_queue
+        self.max_pending_per_key = max_pending_per_key
+        self.max_in_flight_per_key = max_in_flight_per_key
+        self._queues = {}  # key -> deque[(payload, future, deadline)]
+        self._ready = deque()  # 有排队请求的 key，按轮转顺序
+        self._in_flight = {}  # key -> 执行中的请求数
+        self._expired = []  # submit 时清出的过期请求，交给工作线程结束
+        self._size = 0
+        self._service_time = None  # 单个请求执行耗时的指数滑动平均（秒）
+        self._cond = threading.Condition()
+        self._closed = False
+        self._threads = []
+
+        # ===== 统计信息 =====
+        self.stats = {
+            "submitted": 0,
+            "dispatched": 0,
+            "rejected": 0,
+            "expired": 0,  # 派发前已过截止时间而丢弃的请求数
+            "cancelled": 0,  # 派发前被调用方取消的请求数
+            "wakeups": 0,  # 工作线程从条件变量上被唤醒的次数
+        }
+
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._worker, name=f"{name}-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, payload, key=None, deadline=None):
+        """提交请求，返回 concurrent.futures.Future；超出排队上限时抛出 QueueFullError
+
+        deadline: 截止时间（time.monotonic() 时刻），为None表示不限
+        """
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("调度器已关闭")
+            reason = self._reject_reason(key)
+            if reason is not None:
+                # 先清掉已过期的请求再判断一次，避免死请求占住排队名额；
+                # 清出的请求由工作线程结束，不在调用方线程中触发它们的回调
+                if self._purge_expired(self._expired):
+                    self._cond.notify()
+                reason = self._reject_reason(key)
+            if reason is not None:
+                self.stats["rejected"] += 1
+                raise QueueFullError(reason)
+
+            queue = self._queues.get(key)
+            if queue is None:
+                queue = self._queues[key] = deque()
+                self._ready.append(key)
+            queue.append((payload, future, deadline))
+            self._size += 1
+            self.stats["submitted"] += 1
+            self._cond.notify()
+        future.add_done_callback(lambda f: self._discard(key, f))
+        return future
+
+    def _reject_reason(self, key):
+        """超出排队上限时返回拒绝原因，否则返回None，调用方需持有锁"""
+        if self.max_queue is not None and self._size >= self.max_queue:
+            return f"排队请求已达上限 {self.max_queue}"
+        queue = self._queues.get(key)
+        pending = (len(queue) if queue else 0) + self._in_flight.get(key, 0)
+        if key is not None and self.max_pending_per_key is not None and pending >= self.max_pending_per_key:
+            return f"{key} 的未完成请求已达上限 {self.max_pending_per_key}"
+        return None
+
+    def qsize(self):
+        """当前排队中的请求数"""
+        with self._cond:
+            return self._size
+
+    def requests_ahead(self, key=None, future=None):
+        """估算排在前面的请求数
+
+        future 为已提交的请求时计算它前面的请求数，否则估算 key 现在提交一个新请求时的位置。
+        按轮转规则：自己队列中排在前面的 p 个，加上其他每个 key 最多 p+1 个。
+        """
+        with self._cond:
+            queue = self._queues.get(key, ())
+            position = len(queue)
+            if future is not None:
+                position = next((i for i, (_, f, _) in enumerate(queue) if f is future), None)
+                if position is None:
+                    return 0  # 已派发或已取消
+            others = sum(min(len(q), position + 1) for k, q in self._queues.items() if k != key)
+            return position + others
+
+    def service_rate(self):
+        """按最近的执行耗时估算的最大派发速率（次/秒），尚无数据时返回None"""
+        with self._cond:
+            if not self._service_time:
+                return None
+            return self.workers / self._service_time
+
+    def shutdown(self, wait=True):
+        """关闭调度器，未派发的请求会被取消"""
+        with self._cond:
+            self._closed = True
+            pending = [item for queue in self._queues.values() for item in queue]
+            expired, self._expired = self._expired, []
+            self._queues.clear()
+            self._ready.clear()
+            self._size = 0
+            self._cond.notify_all()
+        self._expire(expired)
+        for _, future, _ in pending:
+            future.cancel()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _pop_next(self, expired):
+        """按轮转顺序取下一个可派发的请求（跳过执行中请求已达上限的 key），调用方需持有锁
+
+        途中遇到的已过期请求移出队列放入 expired，由调用方在锁外结束
+        """
+        now = time.monotonic()
+        skipped = 0
+        while skipped < len(self._ready):
+            key = self._ready.popleft()
+            if (key is not None and self.max_in_flight_per_key is not None
+                    and self._in_flight.get(key, 0) >= self.max_in_flight_per_key):
+                self._ready.append(key)
+                skipped += 1
+                continue
+            queue = self._queues[key]
+            payload, future, deadline = queue.popleft()
+            self._size -= 1
+            if deadline is not None and deadline <= now:
+                expired.append(future)
+                # 该 key 仍排在队首，继续看它的下一个请求
+                if queue:
+                    self._ready.appendleft(key)
+                else:
+                    del self._queues[key]
+                continue
+            if queue:
+                self._ready.append(key)
+            else:
+                del self._queues[key]
+            self._in_flight[key] = self._in_flight.get(key, 0) + 1
+            return key, payload, future, deadline
+        return None
+
+    def _purge_expired(self, expired):
+        """把所有已过期的排队请求移出队列放入 expired，返回移出的个数，调用方需持有锁"""
+        now = time.monotonic()
+        purged = 0
+        for key in list(self._queues):
+            queue = self._queues[key]
+            alive = deque(item for item in queue if item[2] is None or item[2] > now)
+            if len(alive) == len(queue):
+                continue
+            expired.extend(future for _, future, deadline in queue if deadline is not None and deadline <= now)
+            self._size -= len(queue) - len(alive)
+            purged += len(queue) - len(alive)
+            if alive:
+                self._queues[key] = alive
+            else:
+                del self._queues[key]
+                self._ready.remove(key)
+        return purged
+
+    def _expire(self, expired):
+        """在锁外结束已过期的请求（回调可能再次调用调度器）"""
+        if not expired:
+            return
+        with self._cond:
+            self.stats["expired"] += len(expired)
+        for future in expired:
+            if future.set_running_or_notify_cancel():
+                future.set_exception(DeadlineExceeded("请求在派发前已超过截止时间"))
+
+    def _discard(self, key, future):
+        """调用方取消了排队中的请求：立即移出队列，释放排队名额"""
+        if not future.cancelled():
+            return
+        with self._cond:
+            queue = self._queues.get(key)
+            if not queue:
+                return
+            for i, item in enumerate(queue):
+                if item[1] is future:
+                    del queue[i]
+                    break
+            else:
+                return
+            self._size -= 1
+            self.stats["cancelled"] += 1
+            if not queue:
+                del self._queues[key]
+                self._ready.remove(key)
+
+    def _finish(self, key, elapsed=None):
+        with self._cond:
+            count = self._in_flight[key] - 1
+            if count:
+                self._in_flight[key] = count
+            else:
+                del self._in_flight[key]
+            if elapsed is not None:
+                if self._service_time is None:
+                    self._service_time = elapsed
+                else:
+                    self._service_time += 0.2 * (elapsed - self._service_time)
+            if self.max_in_flight_per_key is not None and key in self._queues:
+                self._cond.notify()
+
+    def _worker(self):
+        while True:
+            expired = []
+            item = None
+            with self._cond:
+                while not self._closed:
+                    expired.extend(self._expired)
+                    self._expired.clear()
+                    item = self._pop_next(expired)
+                    if item is not None or expired:
+                        break
+                    self._cond.wait()
+                    self.stats["wakeups"] += 1
+                closed = self._closed and item is None
+            self._expire(expired)
+            if closed:
+                return
+            if item is None:
+                continue
+            key, payload, future, deadline = item
+
+            if not future.set_running_or_notify_cancel():
+                self._finish(key)
+                continue
+
+            # 等待限流预算（有令牌时立即返回），等完后已过期的请求不再执行
+            if self.limiter is not None:
+                self.limiter.acquire()
+                if deadline is not None and deadline <= time.monotonic():
+                    self._finish(key)
+                    with self._cond:
+                        self.stats["expired"] += 1
+                    future.set_exception(DeadlineExceeded("请求在等待限流预算时已超过截止时间"))
+                    continue
+            with self._cond:
+                self.stats["dispatched"] += 1
+
+            # 先归还该 key 的并发名额再写结果，调用方拿到结果后立即提交下一个请求不会被误拒
+            start = time.monotonic()
+            try:
+                result = self.handler(payload)
+            except Exception as e:
+                self._finish(key, time.monotonic() - start)
+                future.set_exception(e)
+            else:
+                self._finish(key, time.monotonic() - start)
+                future.set_result(result)
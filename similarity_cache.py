@@ -0,0 +1,274 @@
+"""
+相似问题缓存 - 回答缓存的近似匹配层
+回答缓存按归一化问题精确匹配，“考研有什么要求”和“考研条件”这样换个说法就不命中。
+这里为已回答的问题建立字符 n-gram（1-2字）TF-IDF 向量，新问题精确未命中时找余弦相似度最高的
+已缓存问题，超过阈值就复用它的回答。
+
+- 向量是稀疏的：每个问题最多 MAX_FEATURES 个特征，特征编号和权重按行存放在两个定长的
+  连续 NumPy 矩阵里，槽位复用，容量满时淘汰最久未命中的问题
+- 候选来自特征倒排表，并按余弦阈值做前缀过滤：只查询权重最高、剩余部分范数仍不低于阈值的
+  那些特征，不可能超过阈值的问题不进入候选；候选的余弦相似度一次向量化算出
+- 问题中的数字（年份、金额等）不参与向量，不同时不视为相同问题（超过阈值的候选逐个检查，
+  取数字相同的最相似者）
+- IDF 随缓存增删而变化：增删的问题数超过索引规模的 REWEIGHT_FRACTION 时按当前文档频率重算全部
+  已索引问题的权重，已存向量与查询向量使用同一套文档频率，相似度不随缓存增长漂移
+只依赖 NumPy（CPU），10 万条缓存时单次查询在 1 毫秒以内。
+"""
+
+import itertools
+import math
+import re
+import threading
+import time
+import zlib
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from answer_cache import normalize_question
+from question_clusters import canonical_question
+
+MAX_FEATURES = 32  # 每个问题最多保留的特征数（按权重取前若干个）
+REWEIGHT_FRACTION = 0.1  # 自上次重算权重以来增删的问题数达到索引规模的该比例时重算
+MAX_CANDIDATES = 1024  # 候选数上限：倒排表从短到长合并，超过后不再合并更长的（只在大量近似问题共享特征时触发）
+NGRAM_SIZES = (1, 2)
+_NUMBER_RE = re.compile(r'\d+')
+
+
+def _ngrams(text):
+    return [text[i:i + n] for n in NGRAM_SIZES for i in range(len(text) - n + 1)]
+
+
+class SimilarityCache:
+    """已回答问题的近似匹配索引，lookup 返回最相似的已缓存问题（归一化形式）
+
+    max_entries: 最多索引的问题数，超出后淘汰最久未命中的
+    threshold: 余弦相似度阈值，低于该值视为未命中
+    """
+
+    def __init__(self, max_entries=1000, threshold=0.93, initial_capacity=1024):
+        self.max_entries = max_entries
+        self.threshold = threshold
+
+        self._lock = threading.Lock()
+        capacity = max(1, min(initial_capacity, max_entries))
+        self._features = np.full((capacity, MAX_FEATURES), -1, dtype=np.int64)
+        self._weights = np.zeros((capacity, MAX_FEATURES), dtype=np.float32)
+        self._tf = np.zeros((capacity, MAX_FEATURES), dtype=np.float32)  # 词频，重算权重用
+        self._last_used = np.full(capacity, np.inf)
+        self._keys = [None] * capacity  # 槽位 -> 归一化问题
+        self._numbers = [None] * capacity  # 槽位 -> 问题中的数字
+        self._number_hash = np.zeros(capacity, dtype=np.int64)  # 数字的哈希，批量比对候选用
+        self._slots = {}  # 归一化问题 -> 槽位
+        self._free = list(range(capacity - 1, -1, -1))
+        self._postings = defaultdict(set)  # 特征 -> 含该特征的槽位
+        self._df = Counter()  # 特征 -> 含该特征的问题数
+        self._changes = 0  # 自上次重算权重以来增删的问题数
+
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    # ===== 向量化 =====
+    def _vectorize(self, key):
+        """返回 (特征数组, L2归一化的权重数组, 词频数组)，按权重从高到低，最多 MAX_FEATURES 个"""
+        # 数字单独精确比较，不参与向量
+        text = _NUMBER_RE.sub("", canonical_question(key) or key) or key
+        counts = Counter(zlib.crc32(g.encode("utf-8")) for g in _ngrams(text))
+        if not counts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), np.empty(0, dtype=np.float32)
+        weighted = sorted(
+            ((feature, tf * self._idf(feature), tf) for feature, tf in counts.items()),
+            key=lambda item: -item[1]
+        )[:MAX_FEATURES]
+        features = np.fromiter((f for f, _, _ in weighted), dtype=np.int64, count=len(weighted))
+        weights = np.fromiter((w for _, w, _ in weighted), dtype=np.float32, count=len(weighted))
+        tfs = np.fromiter((tf for _, _, tf in weighted), dtype=np.float32, count=len(weighted))
+        return features, weights / np.linalg.norm(weights), tfs
+
+    def _idf(self, feature):
+        return math.log((1 + len(self._slots)) / (1 + self._df[feature])) + 1
+
+    def _maybe_reweight_locked(self):
+        """增删的问题够多时按当前文档频率重算全部已索引问题的权重"""
+        if self._changes < REWEIGHT_FRACTION * len(self._slots):
+            return
+        self._changes = 0
+        if not self._slots:
+            return
+        slots = np.fromiter(self._slots.values(), dtype=np.int64, count=len(self._slots))
+        features = self._features[slots]
+        valid = features >= 0
+        unique, inverse = np.unique(features[valid], return_inverse=True)
+        idf = np.fromiter((self._idf(f) for f in unique.tolist()), dtype=np.float32, count=len(unique))
+        weights = np.zeros(features.shape, dtype=np.float32)
+        weights[valid] = self._tf[slots][valid] * idf[inverse]
+        self._weights[slots] = weights / np.linalg.norm(weights, axis=1, keepdims=True)
+
+    # ===== 写入与淘汰 =====
+    def add(self, question):
+        """索引一个已回答的问题（已存在时只刷新访问时间）"""
+        key = normalize_question(question)
+        if not key:
+            return
+        with self._lock:
+            self._add_locked(key, time.time())
+
+    def add_many(self, questions):
+        """批量索引（启动时载入回答缓存中已有的问题），按先后顺序视为从旧到新"""
+        now = time.time()
+        with self._lock:
+            for question in questions:
+                key = normalize_question(question)
+                if key:
+                    self._add_locked(key, now)
+
+    def _add_locked(self, key, now):
+        slot = self._slots.get(key)
+        if slot is not None:
+            self._last_used[slot] = now
+            return
+        features, weights, tfs = self._vectorize(key)
+        if not len(features):
+            return
+        if not self._free:
+            if len(self._slots) >= self.max_entries:
+                self._remove_locked(int(np.argmin(self._last_used)))
+                self.stats["evictions"] += 1
+            else:
+                self._grow_locked()
+        slot = self._free.pop()
+        self._features[slot] = -1
+        self._features[slot, :len(features)] = features
+        self._weights[slot] = 0
+        self._weights[slot, :len(weights)] = weights
+        self._tf[slot] = 0
+        self._tf[slot, :len(tfs)] = tfs
+        self._last_used[slot] = now
+        self._keys[slot] = key
+        self._numbers[slot] = _NUMBER_RE.findall(key)
+        self._number_hash[slot] = hash(tuple(self._numbers[slot]))
+        self._slots[key] = slot
+        for feature in features.tolist():
+            self._postings[feature].add(slot)
+            self._df[feature] += 1
+        self._changes += 1
+        self._maybe_reweight_locked()
+
+    def _grow_locked(self):
+        old = len(self._keys)
+        new = min(old * 2, self.max_entries)
+        self._features = np.concatenate([self._features, np.full((new - old, MAX_FEATURES), -1, dtype=np.int64)])
+        self._weights = np.concatenate([self._weights, np.zeros((new - old, MAX_FEATURES), dtype=np.float32)])
+        self._tf = np.concatenate([self._tf, np.zeros((new - old, MAX_FEATURES), dtype=np.float32)])
+        # 空槽位的访问时间为无穷大，不会被当作最久未用的淘汰
+        self._last_used = np.concatenate([self._last_used, np.full(new - old, np.inf)])
+        self._keys.extend([None] * (new - old))
+        self._numbers.extend([None] * (new - old))
+        self._number_hash = np.concatenate([self._number_hash, np.zeros(new - old, dtype=np.int64)])
+        self._free.extend(range(new - 1, old - 1, -1))
+
+    def _remove_locked(self, slot):
+        key = self._keys[slot]
+        del self._slots[key]
+        for feature in self._features[slot].tolist():
+            if feature < 0:
+                break
+            postings = self._postings[feature]
+            postings.discard(slot)
+            if not postings:
+                del self._postings[feature]
+            self._df[feature] -= 1
+            if not self._df[feature]:
+                del self._df[feature]
+        self._keys[slot] = None
+        self._numbers[slot] = None
+        self._last_used[slot] = np.inf
+        self._free.append(slot)
+        self._changes += 1
+
+    def discard(self, question):
+        """移除一个问题（回答缓存中已不存在时调用）"""
+        key = normalize_question(question)
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is not None:
+                self._remove_locked(slot)
+                self._maybe_reweight_locked()
+
+    def clear(self):
+        with self._lock:
+            for slot in list(self._slots.values()):
+                self._remove_locked(slot)
+
+    # ===== 查询 =====
+    def lookup(self, question):
+        """返回与 question 余弦相似度最高且不低于阈值的已缓存问题（归一化形式），否则返回None"""
+        key = normalize_question(question)
+        if not key:
+            return None
+        with self._lock:
+            match = self._lookup_locked(key)
+            if match is None:
+                self.stats["misses"] += 1
+                return None
+            slot, _ = match
+            self._last_used[slot] = time.time()
+            self.stats["hits"] += 1
+            return self._keys[slot]
+
+    def similar(self, question):
+        """返回 (最相似的已缓存问题, 余弦相似度)，不计入命中统计，未找到时返回 (None, 0.0)"""
+        key = normalize_question(question)
+        with self._lock:
+            match = self._lookup_locked(key, threshold=0.0) if key else None
+            return (self._keys[match[0]], match[1]) if match else (None, 0.0)
+
+    def _lookup_locked(self, key, threshold=None):
+        threshold = self.threshold if threshold is None else threshold
+        slot = self._slots.get(key)
+        if slot is not None:
+            return slot, 1.0
+        features, weights, _ = self._vectorize(key)
+        if not len(features):
+            return None
+
+        # 前缀过滤：与前缀特征都不相交的问题，余弦不超过剩余特征权重的范数
+        suffix_norms = np.sqrt(np.cumsum((weights ** 2)[::-1])[::-1])
+        prefix = int(np.count_nonzero(suffix_norms >= threshold)) or 1
+        postings = sorted((self._postings.get(f, ()) for f in features[:prefix].tolist()), key=len)
+        candidates = set()
+        for posting in postings:
+            if len(candidates) + len(posting) > MAX_CANDIDATES:
+                candidates.update(itertools.islice(posting, MAX_CANDIDATES - len(candidates)))
+                break
+            candidates.update(posting)
+        if not candidates:
+            return None
+
+        rows = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        order = np.argsort(features)
+        sorted_features, sorted_weights = features[order], weights[order]
+        row_features = self._features[rows]
+        index = np.minimum(np.searchsorted(sorted_features, row_features), len(sorted_features) - 1)
+        matched = sorted_features[index] == row_features
+        scores = (self._weights[rows] * np.where(matched, sorted_weights[index], 0)).sum(axis=1)
+
+        # 超过阈值且数字相同的候选里取最相似的（哈希先批量筛，再逐个确认）
+        numbers = _NUMBER_RE.findall(key)
+        above = np.flatnonzero((scores >= threshold) & (self._number_hash[rows] == hash(tuple(numbers))))
+        for i in above[np.argsort(-scores[above], kind="stable")].tolist():
+            slot = int(rows[i])
+            if self._numbers[slot] == numbers:
+                return slot, float(scores[i])
+        return None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._slots)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["size"] = len(self._slots)
+        total = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / total * 100 if total else 0
+        return stats
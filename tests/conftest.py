@@ -0,0 +1,44 @@
+import pytest
+
+from answer_cache import AnswerCache
+from credential_pool import Credential
+from llm_service import LLMService
+from mock_qianfan import MockQianfanServer
+
+
+@pytest.fixture(scope="session")
+def llm_service():
+    """进程内单例；不请求上游的测试各自替换调度器"""
+    return LLMService(base_url="http://127.0.0.1:9", credentials=[
+        Credential("test", "test-app", rate=1e6, burst=1e6, name="test")
+    ])
+
+
+@pytest.fixture
+def llm(llm_service, tmp_path):
+    """每个测试使用独立的回答缓存，结束时关闭替换进来的调度器、恢复凭据池"""
+    scheduler, credential_pool = llm_service.scheduler, llm_service.credential_pool
+    llm_service.answer_cache = AnswerCache(str(tmp_path / "answer_cache.db"))
+    yield llm_service
+    llm_service.credential_pool = credential_pool
+    if llm_service.scheduler is not scheduler:
+        llm_service.scheduler.shutdown(wait=False)
+        llm_service.scheduler = scheduler
+
+
+@pytest.fixture
+def upstream(llm):
+    """启动模拟千帆服务器并让 llm 指向它：upstream(chunk_size=3) 返回服务器"""
+    base_url, servers = llm.base_url, []
+
+    def start(**kwargs):
+        server = MockQianfanServer(**kwargs)
+        server.start()
+        servers.append(server)
+        llm.base_url = server.url
+        return server
+
+    yield start
+    llm.base_url = base_url
+    for server in servers:
+        server.stop()
@@ -0,0 +1,104 @@
+import threading
+import time
+
+import pytest
+
+from adaptive_limiter import AdaptiveTokenBucket
+from credential_pool import Credential, CredentialPool
+from llm_service import QUEUE_FULL_MESSAGE
+from scheduler import RequestScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_slow_start_doubles_rate_until_first_cut():
+    clock = FakeClock()
+    bucket = AdaptiveTokenBucket(2.0, max_rate=100, clock=clock)
+    for _ in range(2):
+        bucket.record_success()
+    # 约一秒的成功（rate 次）后速率约翻倍
+    assert 3.5 < bucket.rate < 4.5
+    for _ in range(1000):
+        bucket.record_success()
+    assert bucket.rate == 100
+
+
+def test_throttle_cuts_rate_once_per_interval_and_honours_retry_after():
+    clock = FakeClock()
+    bucket = AdaptiveTokenBucket(4.0, clock=clock)
+    bucket.record_throttle(retry_after=2)
+    bucket.record_throttle(retry_after=2)  # 同一发放间隔内的并发429只降速一次
+    assert bucket.rate == pytest.approx(4.0 * 0.7)
+    assert bucket.try_acquire() == pytest.approx(2.0)
+    clock.now += 2.0
+    assert bucket.try_acquire() == 0.0
+
+    clock.now += 1.0
+    bucket.record_throttle()
+    assert bucket.rate == pytest.approx(4.0 * 0.7 * 0.7)
+
+
+def test_additive_increase_after_first_cut():
+    clock = FakeClock()
+    bucket = AdaptiveTokenBucket(4.0, increase=0.5, clock=clock)
+    bucket.record_throttle()
+    rate = bucket.rate
+    for _ in range(round(rate)):
+        bucket.record_success()
+    # 每秒约 rate 次成功，合计约增加 increase
+    assert bucket.rate - rate == pytest.approx(0.5, abs=0.1)
+
+
+def test_latency_spike_cuts_rate():
+    clock = FakeClock()
+    bucket = AdaptiveTokenBucket(4.0, clock=clock)
+    for _ in range(5):
+        bucket.record_success(latency=0.1)
+    rate = bucket.rate
+    bucket.record_success(latency=1.0)
+    assert bucket.rate == pytest.approx(rate * 0.8)
+
+
+def test_adaptive_rate_uses_quota_without_exceeding_it(llm, upstream):
+    """服务端配额 4 QPS、带 Retry-After：从 0.83 QPS 起步，受理量远高于固定速率，不超出配额，失败很少"""
+    quota, seconds = 4.0, 4.0
+    server = upstream(latency=0.02, key_qps=quota, key_burst=2, retry_after=True)
+    limiter = AdaptiveTokenBucket(1 / 1.2, max_rate=10)
+    llm.credential_pool = CredentialPool([Credential("sim", "test-app", name="sim", limiter=limiter)],
+                                         eject_seconds=0)
+    llm.scheduler = RequestScheduler(llm._process_request, None, workers=8, max_pending_per_key=1)
+    stop = threading.Event()
+    failures = []
+
+    def client(i):
+        n = 0
+        while not stop.is_set():
+            n += 1
+            try:
+                answer, cid, _ = llm.ask(f"问题{i}-{n}", f"sim-{i}-{n}", session_id=f"s{i}")
+            except Exception:
+                return  # 调度器已关闭
+            if answer == QUEUE_FULL_MESSAGE:
+                time.sleep(0.2)
+            elif not cid and not stop.is_set():
+                failures.append(answer)
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(8)]
+    server.started_at = time.monotonic()
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    accepted = server.key_counts["sim"]
+    llm.scheduler.shutdown(wait=False)
+
+    assert accepted >= 2 * seconds / 1.2
+    # 服务端允许 key_burst 个突发，留10%
+    assert accepted <= quota * seconds * 1.1 + 2
+    assert len(failures) <= 0.1 * accepted
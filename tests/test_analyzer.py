@@ -0,0 +1,72 @@
+import contextlib
+import csv
+import io
+import random
+
+import pytest
+
+from conversation_logger import LOG_HEADER
+from evolution_analyzer import EvolutionAnalyzer
+
+QUESTIONS = ["奖学金怎么申请", "考研有什么要求", "宿舍怎么调换", "医保报销比例", "选课系统怎么进"]
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    """按日志表结构随机生成的 CSV 日志"""
+    rng = random.Random(0)
+    path = tmp_path / "logs.csv"
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(LOG_HEADER[:9])
+        for i in range(3000):
+            length = rng.randint(5, 1100)
+            writer.writerow([f"2026-02-{1 + i % 28:02d} 12:00:00", f"s{i}", f"{rng.choice(QUESTIONS)}{i % 97}",
+                             "同学你好" * (length // 4), length, rng.choice([0, 1, 2, 3]),
+                             rng.choice(["", "", "", "like", "dislike"]), rng.randint(200, 9000), length > 20])
+    return str(path)
+
+
+def reference(path):
+    """逐行遍历（原 iterrows 实现的逻辑）得到点赞数、点踩问题和无来源问题"""
+    like = 0
+    bad, no_source = [], []
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            if row['用户反馈'] == 'like':
+                like += 1
+            elif row['用户反馈'] == 'dislike':
+                bad.append(row['问题'])
+            if row['来源数量'] == '0':
+                no_source.append(row['问题'])
+    return like, bad, no_source
+
+
+def analyze(analyzer, methods=("analyze_response_quality", "analyze_bad_responses", "analyze_no_source_responses")):
+    with contextlib.redirect_stdout(io.StringIO()):
+        analyzer.load_data()
+        return tuple(getattr(analyzer, name)() for name in methods)
+
+
+def test_vectorized_analysis_matches_rowwise_reference(log_file, tmp_path):
+    analyzer = EvolutionAnalyzer(log_file, token_cache_file=str(tmp_path / "tokens.db"), db_file=None)
+    quality, bad, no_source = analyze(analyzer)
+    like, expected_bad, expected_no_source = reference(log_file)
+    assert (quality['like_count'], quality['dislike_count']) == (like, len(expected_bad))
+    assert bad == expected_bad
+    assert no_source == expected_no_source[:10]
+
+
+def test_store_backed_analysis_matches_csv(log_file, tmp_path):
+    """导入对话记录库后用 SQL 聚合，结果与读入 CSV 的向量化分析一致"""
+    methods = ("analyze_response_quality", "analyze_bad_responses", "analyze_no_source_responses",
+               "analyze_high_frequency_questions", "analyze_performance")
+    from_csv = analyze(EvolutionAnalyzer(log_file, token_cache_file=str(tmp_path / "tokens.db"), db_file=None),
+                       methods)
+    from_store = analyze(EvolutionAnalyzer(log_file, token_cache_file=str(tmp_path / "tokens.db"),
+                                           db_file=str(tmp_path / "conversations.db")), methods)
+    *same, csv_words, csv_performance = from_csv
+    *store_same, store_words, store_performance = from_store
+    assert store_same == same
+    assert dict(store_words) == dict(csv_words)
+    assert store_performance == pytest.approx(csv_performance)
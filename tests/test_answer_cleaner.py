@@ -0,0 +1,46 @@
+import random
+
+import pandas as pd
+
+from answer_cleaner import StreamingCleaner, clean_answer
+from message_renderer import StreamingFormatter, format_with_line_breaks
+from mock_qianfan import DEFAULT_ANSWER
+
+ALPHABET = list("^[]0123456789 \n\t\r。？！；：.、（）一二三十ab中文") + [
+    "^[1]^", "[12]", "^[3][4]^", "\r\n", "（2）", "^[", "]^",
+]
+
+
+def random_chunks(rng, text):
+    chunks, i = [], 0
+    while i < len(text):
+        j = i + rng.randint(0, 6)  # 允许空块
+        chunks.append(text[i:j])
+        i = j
+    return chunks
+
+
+def run_stream(transducer, chunks):
+    return "".join(transducer.feed(chunk) for chunk in chunks) + transducer.finish()
+
+
+def test_streaming_matches_batch_for_any_chunking():
+    """随机文本（富含 ^ [ ] 数字 空白 序号）和日志中的真实回答随机分块，流式输出与批量版完全一致"""
+    rng = random.Random(0)
+    answers = pd.read_csv("evolution_logs.csv")['回答'].astype(str).tolist()
+    for n in range(5000):
+        text = "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 60))) if n % 10 else rng.choice(answers)
+        chunks = random_chunks(rng, text)
+        assert run_stream(StreamingCleaner(), chunks) == (clean_answer(text) or ""), repr(text)
+        assert run_stream(StreamingFormatter(), chunks) == (format_with_line_breaks(text) or ""), repr(text)
+
+
+def test_stream_partials_are_prefixes_without_broken_citations(llm, upstream):
+    """模拟服务器按 3 字一块推送（引用标记必然被拆开），中间结果都是最终回答的前缀"""
+    upstream(chunk_size=3)
+    partials = [answer for answer, _, _ in llm.ask_stream("奖学金怎么申请？", "test-stream")]
+    final = partials[-1]
+    assert final == clean_answer(DEFAULT_ANSWER)
+    assert len(partials) > 2
+    for partial in partials[:-1]:
+        assert final.startswith(partial) and "^" not in partial and "[" not in partial
@@ -0,0 +1,62 @@
+import asyncio
+import threading
+import time
+
+from async_llm_service import AsyncLLMService
+from llm_service import DROPPED_REQUESTS, TIMEOUT_MESSAGE
+from scheduler import RequestScheduler
+
+
+def test_waiting_async_callers_do_not_hold_threads(llm, upstream):
+    upstream(latency=0.1)
+    llm.scheduler = RequestScheduler(llm._process_request, None, workers=4)
+    n = 50
+    peak_threads = []
+
+    async def main():
+        async with AsyncLLMService(llm) as client:
+            tasks = [asyncio.ensure_future(client.ask_async(f"问题{i}", f"async-{i}")) for i in range(n)]
+            await asyncio.sleep(0.05)
+            peak_threads.append(threading.active_count())
+            return await asyncio.gather(*tasks)
+
+    results = asyncio.run(main())
+    assert all(cid for _, cid, _ in results)
+    assert peak_threads[0] < n
+
+
+def test_sync_and_async_callers_share_one_upstream_request(llm, upstream):
+    """同步和异步调用方同时问同一个新问题，上游只收到一次请求"""
+    server = upstream(latency=0.2)
+    llm.scheduler = RequestScheduler(llm._process_request, None, workers=2)
+    results = []
+    thread = threading.Thread(target=lambda: results.append(llm.ask("同步异步同时问的问题")))
+    thread.start()
+
+    async def main():
+        return await AsyncLLMService(llm).ask_async("同步异步同时问的问题")
+
+    results.append(asyncio.run(main()))
+    thread.join(5)
+    assert server.key_counts["test"] == 1
+    assert len(results) == 2 and all(answer and answer != TIMEOUT_MESSAGE for answer, _, _ in results)
+
+
+def test_abandoned_async_request_is_dropped_before_upstream(llm, upstream):
+    """唯一的工作线程被占用时，异步调用方超时放弃，排队中的请求被丢弃而不请求上游"""
+    server = upstream(latency=0.2)
+    llm.scheduler = RequestScheduler(llm._process_request, None, workers=1)
+    dropped = DROPPED_REQUESTS.value(reason="cancelled")
+    busy = threading.Thread(target=lambda: llm.ask("占用工作线程", "busy"))
+    busy.start()
+    time.sleep(0.05)
+
+    async def main():
+        return await AsyncLLMService(llm, timeout=0.05).ask_async("等不及的问题", "impatient")
+
+    answer, _, _ = asyncio.run(main())
+    busy.join(5)
+    llm.scheduler.shutdown()
+    assert answer == TIMEOUT_MESSAGE
+    assert DROPPED_REQUESTS.value(reason="cancelled") - dropped == 1
+    assert server.key_counts["test"] == 1
@@ -0,0 +1,46 @@
+import csv
+import time
+
+import cache_warmer
+from answer_cache import AnswerCache
+
+
+def write_log(path, questions):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["时间", "会话ID", "问题"])
+        for question in questions:
+            writer.writerow(["2026-01-01 12:00:00", "s", question])
+
+
+def test_warm_questions_put_suggested_first_and_merge_variants(tmp_path):
+    log = tmp_path / "logs.csv"
+    write_log(log, ["宿舍怎么调换？"] * 3 + ["宿舍怎么调换"] + ["奖学金怎么申请"] * 5 + ["一个很长的问题被截断了..."] * 9)
+    questions = cache_warmer.warm_questions(str(log), 10)
+    assert questions == list(cache_warmer.SUGGESTED_QUESTIONS) + ["宿舍怎么调换？"]
+
+
+def test_warmed_answers_are_served_from_cache_and_reused(llm, upstream, tmp_path):
+    server = upstream()
+    warm_file = str(tmp_path / cache_warmer.WARM_FILE)
+    questions = list(cache_warmer.SUGGESTED_QUESTIONS)
+    now = [time.time()]
+
+    stats = cache_warmer.run(llm, questions, warm_file, qps=100, clock=lambda: now[0])
+    assert stats["generated"] == len(questions) and stats["failed"] == 0
+
+    # 应用重启：新缓存载入预热文件，推荐问题首次点击不请求上游
+    llm.answer_cache = AnswerCache(str(tmp_path / "app.db"))
+    assert llm.answer_cache.load_warm(warm_file) == len(questions)
+    before = server.key_counts["test"]
+    for question in questions:
+        answer, _, _ = llm.ask(question, session_id="warm")
+        assert answer
+    assert server.key_counts["test"] == before
+
+    # 再次运行：未过期的回答直接沿用，过期的重新生成
+    stats = cache_warmer.run(llm, questions, warm_file, qps=100, clock=lambda: now[0])
+    assert stats["reused"] == len(questions) and stats["generated"] == 0
+    now[0] += 13 * 3600
+    stats = cache_warmer.run(llm, questions, warm_file, qps=100, clock=lambda: now[0])
+    assert stats["generated"] == len(questions)
@@ -0,0 +1,71 @@
+import threading
+import time
+
+from scheduler import RequestScheduler
+
+
+def blocking_handler(release):
+    def handler(payload):
+        release.wait(5)
+        return f"回答：{payload['question']}", "conv", []
+    return handler
+
+
+def test_full_queue_with_expired_coalesced_leader_does_not_deadlock(llm):
+    """队列已满时提交新问题会清掉过期请求；过期的合并发起者的回调不能在持锁的提交线程中死锁"""
+    release = threading.Event()
+    llm.scheduler = RequestScheduler(blocking_handler(release), None, workers=1, max_queue=2)
+
+    busy = threading.Thread(target=llm.ask, args=("占用工作线程", "conv-busy"), daemon=True)
+    busy.start()
+    time.sleep(0.05)
+
+    leader = llm._new_payload("很快过期的问题", None, None, None)
+    leader["deadline"] = time.monotonic() + 0.05
+    leader_future, is_leader, _ = llm._submit_coalesced(leader)
+    assert is_leader
+    llm._submit(llm._new_payload("占满队列", None, None, None))
+    time.sleep(0.1)
+
+    results = []
+    asker = threading.Thread(target=lambda: results.append(llm.ask("队列满时的新问题")), daemon=True)
+    asker.start()
+    time.sleep(0.2)
+    release.set()
+    asker.join(5)
+    assert not asker.is_alive(), "提交线程死锁"
+    busy.join(5)
+    assert results and results[0][0] == "回答：队列满时的新问题"
+    assert leader_future.done()
+    # 过期的发起者已移出进行中列表（回调在写入结果之后执行，稍等片刻），同一问题可以重新提问
+    deadline = time.monotonic() + 1
+    while llm.get_coalesce_stats()["inflight"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert llm.get_coalesce_stats()["inflight"] == 0
+    assert llm.ask("很快过期的问题")[0] == "回答：很快过期的问题"
+
+
+def test_concurrent_same_question_requests_upstream_once(llm):
+    """同时提问同一个新问题：只执行一次，所有调用方都拿到回答"""
+    calls = []
+
+    def handler(payload):
+        calls.append(payload["question"])
+        time.sleep(0.1)
+        return f"回答：{payload['question']}", "conv", []
+
+    llm.scheduler = RequestScheduler(handler, None, workers=4)
+    barrier = threading.Barrier(16)
+    results = []
+
+    def ask():
+        barrier.wait()
+        results.append(llm.ask("同时问的问题"))
+
+    threads = [threading.Thread(target=ask) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert calls == ["同时问的问题"]
+    assert len(results) == 16 and all(answer == "回答：同时问的问题" for answer, _, _ in results)
@@ -0,0 +1,102 @@
+import csv
+import threading
+
+from conversation_logger import LOG_HEADER, StoreLogger
+from conversation_store import ConversationStore
+
+OLD_HEADER = LOG_HEADER[:9]
+
+
+def write_csv(path, header, rows, mode="w"):
+    with open(path, mode, encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        if mode == "w":
+            writer.writerow(header)
+        writer.writerows(rows)
+
+
+def rows(start, n, width=9):
+    return [([f"2026-03-{1 + i % 5:02d} 10:00:00", f"s{i}", f"问题{i}", "回答", 2, 1, "", 100, True] + [""] * 3)[:width]
+            for i in range(start, start + n)]
+
+
+def test_import_resumes_after_appended_rows(tmp_path):
+    path = tmp_path / "logs.csv"
+    store = ConversationStore(str(tmp_path / "c.db"))
+    write_csv(path, OLD_HEADER, rows(0, 5))
+    assert store.import_csv(str(path))["imported"] == 5
+    assert store.import_csv(str(path))["imported"] == 0
+    write_csv(path, OLD_HEADER, rows(5, 3), mode="a")
+    assert store.import_csv(str(path))["imported"] == 3
+    assert store.count() == 8
+
+
+def test_rotated_csv_is_imported_from_the_start(tmp_path):
+    """同一路径换成了另一个文件（轮转后新文件），即使行数更多也从头导入，不跳过"""
+    path = tmp_path / "logs.csv"
+    store = ConversationStore(str(tmp_path / "c.db"))
+    write_csv(path, OLD_HEADER, rows(0, 5))
+    store.import_csv(str(path))
+    write_csv(path, OLD_HEADER, rows(100, 7))
+    assert store.import_csv(str(path))["imported"] == 7
+    assert store.count() == 12
+
+
+def test_header_upgrade_is_not_treated_as_new_file(tmp_path):
+    """表头新增列后旧行补空（ConversationLogger 升级表头）不重复导入"""
+    path = tmp_path / "logs.csv"
+    store = ConversationStore(str(tmp_path / "c.db"))
+    write_csv(path, OLD_HEADER, rows(0, 5))
+    store.import_csv(str(path))
+    write_csv(path, LOG_HEADER, rows(0, 6, width=12))
+    assert store.import_csv(str(path))["imported"] == 1
+    assert store.count() == 6
+
+
+def test_daily_counts(tmp_path):
+    store = ConversationStore(str(tmp_path / "c.db"))
+    store.insert_many(rows(0, 12))
+    assert store.daily_counts() == {"2026-03-01": 3, "2026-03-02": 3, "2026-03-03": 2,
+                                    "2026-03-04": 2, "2026-03-05": 2}
+    assert store.daily_counts("2026-03-04") == {"2026-03-04": 2, "2026-03-05": 2}
+
+
+def test_concurrent_writers_lose_nothing_while_reading(tmp_path):
+    """多个线程同时提交日志，写入期间另一个连接持续查询（WAL 下读不阻塞写）"""
+    path = str(tmp_path / "c.db")
+    logger = StoreLogger(path, max_queue=10000, block_timeout=5.0)
+    row = ["2026-03-01 12:00:00", "session", "奖学金怎么申请", "同学你好，" * 50, 250, 1, "", 800, True, 5, 300, 2]
+    done = threading.Event()
+    queries = []
+
+    def query():
+        reader = ConversationStore(path)
+        while not done.is_set():
+            queries.append(reader.quality_stats())
+        reader.close()
+
+    watcher = threading.Thread(target=query)
+    watcher.start()
+    writers = [threading.Thread(target=lambda: [logger.log(row) for _ in range(2500)]) for _ in range(4)]
+    for t in writers:
+        t.start()
+    for t in writers:
+        t.join()
+    logger.flush(timeout=30)
+    done.set()
+    watcher.join()
+    stats = logger.get_stats()
+    logger.close()
+    assert stats["errors"] == 0
+    assert stats["written"] + stats["dropped"] == 10000
+    assert queries
+
+
+def test_export_then_import_round_trips(tmp_path):
+    store = ConversationStore(str(tmp_path / "c.db"))
+    store.insert_many(rows(0, 20, width=12))
+    assert store.export_csv(str(tmp_path / "export.csv")) == 20
+    copy = ConversationStore(str(tmp_path / "copy.db"))
+    assert copy.import_csv(str(tmp_path / "export.csv"))["imported"] == 20
+    assert len(store.session("s3")) == 1
+    assert copy.session("s3") == store.session("s3")
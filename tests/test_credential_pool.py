@@ -0,0 +1,43 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from credential_pool import Credential, CredentialPool
+from scheduler import RequestScheduler
+
+KEY_QPS = 20.0
+
+
+def run_round(llm, credentials, n, tag, eject_seconds=30.0):
+    """返回 (耗时, 成功数)"""
+    llm.credential_pool = CredentialPool(credentials, eject_seconds=eject_seconds)
+    llm.scheduler = RequestScheduler(llm._process_request, None, workers=len(credentials) * 2)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        # 每个请求带 conversation_id，绕过缓存和请求合并
+        results = list(pool.map(lambda i: llm.ask(f"问题{i}", f"{tag}-{i}"), range(n)))
+    return time.perf_counter() - start, sum(1 for _, cid, _ in results if cid)
+
+
+@pytest.mark.parametrize("keys", [1, 2])
+def test_throughput_scales_with_keys_without_429(llm, upstream, keys):
+    """每个Key客户端预算与服务端上限相同：总QPS随Key数增长且没有429"""
+    server = upstream(latency=0.02, key_qps=KEY_QPS, key_burst=2)
+    n = 30
+    credentials = [Credential(f"scale-{i}", "test-app", rate=KEY_QPS, name=f"scale-{i}") for i in range(keys)]
+    elapsed, ok = run_round(llm, credentials, n, f"scale{keys}")
+    assert ok == n
+    assert sum(server.rejected.values()) == 0
+    assert n / elapsed >= 0.8 * keys * KEY_QPS
+
+
+def test_throttled_key_is_ejected(llm, upstream):
+    """其中一个Key在服务端的上限远低于客户端预算，返回429后被摘除，流量转到其他Key"""
+    server = upstream(latency=0.02, key_qps={"eject-0": KEY_QPS, "eject-1": 1.0, "eject-2": KEY_QPS}, key_burst=2)
+    n = 30
+    credentials = [Credential(f"eject-{i}", "test-app", rate=KEY_QPS, name=f"eject-{i}") for i in range(3)]
+    _, ok = run_round(llm, credentials, n, "eject", eject_seconds=5.0)
+    assert ok == n
+    assert llm.credential_pool.get_stats()["eject-1"]["ejections"] >= 1
+    assert server.key_counts.get("eject-1", 0) < n / 6
@@ -0,0 +1,72 @@
+import threading
+import time
+
+import llm_service
+from credential_pool import Credential, CredentialPool
+from llm_service import DROPPED_REQUESTS, UPSTREAM_CALLS
+from scheduler import RequestScheduler
+
+RATE = 3.0
+
+
+def counter_values():
+    return {
+        "useful": UPSTREAM_CALLS.value(outcome="useful"),
+        "wasted": UPSTREAM_CALLS.value(outcome="wasted"),
+        "dropped": DROPPED_REQUESTS.value(reason="expired") + DROPPED_REQUESTS.value(reason="cancelled"),
+    }
+
+
+def wait_idle(llm, timeout=5):
+    deadline = time.monotonic() + timeout
+    while (llm.scheduler.qsize() or any(c.in_flight for c in llm.credential_pool.credentials)) \
+            and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_requests_past_deadline_do_not_reach_upstream(llm, upstream, monkeypatch):
+    """预算 3 QPS、12 人同时提问、每人最多等 1 秒：等不到的请求过期丢弃，不再请求上游"""
+    monkeypatch.setattr(llm_service, "REQUEST_TIMEOUT", 1.0)
+    server = upstream(latency=0.1)
+    llm.credential_pool = CredentialPool([Credential("test", "test-app", rate=RATE, burst=1, name="test")])
+    llm.scheduler = RequestScheduler(llm._process_request, None, workers=4)
+    before = counter_values()
+    answered = []
+
+    def client(i):
+        _, cid, _ = llm.ask(f"问题{i}", f"conv-{i}", session_id=f"s{i}")
+        if cid:
+            answered.append(i)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(12)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    wait_idle(llm)
+    delta = {k: v - before[k] for k, v in counter_values().items()}
+
+    assert 0 < len(answered) < 12
+    assert delta["dropped"] > 0
+    # 上游只处理来得及回答的请求，最多有一两个在途中超时
+    assert server.key_counts["test"] - len(answered) <= 2
+    assert delta["useful"] == len(answered)
+
+
+def test_closing_stream_releases_upstream_connection(llm, upstream):
+    """流式回答收到首块后关闭生成器，上游连接在回答结束前释放"""
+    server = upstream(chunk_delay=0.1)
+    llm.credential_pool = CredentialPool([Credential("test", "test-app", rate=1e6, burst=1e6, name="test")])
+    llm.scheduler = RequestScheduler(llm._process_request, None, workers=1)
+    llm._local_sources("预热")  # 首次检索会建本地知识库索引，不计入释放耗时
+    before = counter_values()
+
+    stream = llm.ask_stream("流式取消测试", "conv-stream", session_id="stream")
+    next(stream)
+    start = time.monotonic()
+    stream.close()
+    wait_idle(llm)
+    released = time.monotonic() - start
+
+    assert released < server.chunk_delay * len(server.split_answer()) * 0.75
+    assert counter_values()["wasted"] - before["wasted"] == 1
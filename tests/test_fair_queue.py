@@ -0,0 +1,74 @@
+import threading
+import time
+
+from llm_service import QUEUE_FULL_MESSAGE
+from scheduler import QueueFullError, RequestScheduler, TokenBucket
+
+RATE = 50.0
+
+
+def dispatch_order(fair):
+    """spammer 先提交20个、5位同学各提交1个，返回同学们的派发名次"""
+    order = []
+    scheduler = RequestScheduler(order.append, TokenBucket(rate=RATE), workers=1,
+                                 max_in_flight_per_key=1 if fair else None)
+    futures = [scheduler.submit(f"spam-{i}", key="spammer" if fair else None) for i in range(20)]
+    futures += [scheduler.submit(f"student-{i}", key=f"student-{i}" if fair else None) for i in range(5)]
+    for future in futures:
+        future.result(5)
+    scheduler.shutdown()
+    return [i + 1 for i, item in enumerate(order) if item.startswith("student")]
+
+
+def test_sessions_are_served_round_robin():
+    # 轮转下每位同学最多排在 spammer 的一个请求之后
+    assert dispatch_order(fair=True) == [2, 3, 4, 5, 6]
+
+
+def test_full_queue_rejects_immediately():
+    scheduler = RequestScheduler(lambda payload: payload, TokenBucket(rate=1), max_queue=10)
+    rejected = 0
+    for i in range(20):
+        try:
+            scheduler.submit(i, key=f"s{i}")
+        except QueueFullError:
+            rejected += 1
+    scheduler.shutdown(wait=False)
+    assert rejected == 10
+
+
+def test_wait_estimate_matches_actual_wait():
+    submitted, actual, estimates = {}, {}, {}
+
+    def handler(name):
+        actual[name] = time.perf_counter() - submitted[name]
+
+    scheduler = RequestScheduler(handler, TokenBucket(rate=RATE), max_in_flight_per_key=1)
+    futures = []
+    for round_ in range(3):
+        for s in range(8):
+            name = f"s{s}-{round_}"
+            estimates[name] = scheduler.requests_ahead(key=f"s{s}") / RATE
+            submitted[name] = time.perf_counter()
+            futures.append(scheduler.submit(name, key=f"s{s}"))
+    for future in futures:
+        future.result(5)
+    scheduler.shutdown()
+    assert max(abs(estimates[name] - actual[name]) for name in estimates) < 0.1
+
+
+def test_anonymous_callers_are_not_capped_as_one_session(llm, upstream):
+    """与线上相同的单会话上限（未完成3个、并发1个），不带会话ID的并发提问全部得到回答"""
+    upstream(latency=0.05)
+    llm.scheduler = RequestScheduler(llm._process_request, None, workers=4, max_queue=100,
+                                     max_pending_per_key=3, max_in_flight_per_key=1)
+    results = []
+    threads = [threading.Thread(target=lambda i=i: results.append(llm.ask(f"匿名问题{i}", use_cache=False)))
+               for i in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert len(results) == 6
+    assert not any(answer == QUEUE_FULL_MESSAGE for answer, _, _ in results)
+    assert all(cid for _, cid, _ in results)
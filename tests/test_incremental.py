@@ -0,0 +1,64 @@
+import pytest
+
+from conversation_store import ConversationStore
+from evolution_analyzer import EvolutionAnalyzer
+
+
+def rows(start, n):
+    return [[f"2026-03-{1 + i % 28:02d} 12:00:00", f"s{i}", ["奖学金怎么申请", "考研有什么要求", "宿舍怎么调换"][i % 3],
+             "同学你好" * 10, 40, i % 3, ["", "like", "dislike"][i % 3], 100 + i, i % 3 > 0]
+            for i in range(start, start + n)]
+
+
+@pytest.fixture
+def analyzer(tmp_path):
+    def make():
+        return EvolutionAnalyzer(log_file=str(tmp_path / "missing.csv"),
+                                 checkpoint_file=str(tmp_path / "checkpoint.json"),
+                                 token_cache_file=str(tmp_path / "tokens.db"),
+                                 db_file=str(tmp_path / "conversations.db"))
+    return make
+
+
+def insert(tmp_path, batch):
+    store = ConversationStore(str(tmp_path / "conversations.db"))
+    store.insert_many(batch)
+    store.close()
+
+
+def full_stats(make):
+    full = make()
+    full.load_data()
+    return full.analyze_response_quality(), dict(full.analyze_high_frequency_questions())
+
+
+def test_store_incremental_matches_full_analysis(analyzer, tmp_path):
+    """对话记录库的增量分析只读取新增记录，累计结果与全量分析一致"""
+    insert(tmp_path, rows(0, 30))
+    first = analyzer()
+    assert first.load_incremental()
+    assert first.checkpoint.total_rows == 30
+
+    insert(tmp_path, rows(30, 12))
+    second = analyzer()
+    second.load_incremental()
+    state = second.checkpoint
+    assert state.total_rows == 42
+    assert state.last_id == 42
+
+    quality, words = full_stats(analyzer)
+    incremental = state.quality_stats()
+    for key in ("like_count", "dislike_count", "satisfaction_rate", "avg_sources", "no_source_pct"):
+        assert incremental[key] == pytest.approx(quality[key])
+    assert dict(state.word_counts) == words
+
+
+def test_replaced_store_rebuilds(analyzer, tmp_path):
+    """对话记录库被更换（高水位所在的行内容不同）时全量重建"""
+    insert(tmp_path, rows(0, 10))
+    analyzer().load_incremental()
+    (tmp_path / "conversations.db").unlink()
+    insert(tmp_path, rows(100, 15))
+    rebuilt = analyzer()
+    rebuilt.load_incremental()
+    assert rebuilt.checkpoint.total_rows == 15
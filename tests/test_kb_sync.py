@@ -0,0 +1,53 @@
+import os
+import shutil
+
+import pytest
+
+import kb_sync
+
+
+def edit(path, transform):
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(transform(text))
+
+
+@pytest.fixture
+def kb(tmp_path):
+    """复制到临时目录并完成首次全量同步的知识库，返回 (知识库目录, 上传器, 同步函数)"""
+    kb_dir = str(tmp_path / "zhishiku")
+    shutil.copytree("zhishiku", kb_dir)
+    uploader = kb_sync.LocalUploader(str(tmp_path / "remote"))
+    manifest = str(tmp_path / kb_sync.MANIFEST_FILE)
+    first = kb_sync.sync(uploader, kb_dir, manifest)
+    assert first["added"] == first["chunks"] > 0
+    return kb_dir, uploader, lambda: kb_sync.sync(uploader, kb_dir, manifest)
+
+
+def test_unchanged_and_whitespace_only_edits_push_nothing(kb):
+    kb_dir, _, sync = kb
+    stats = sync()
+    assert stats["added"] == stats["changed"] == stats["deleted"] == 0
+    # OCR重排、汉字间加空格
+    edit(os.path.join(kb_dir, "04_学工流程.md"),
+         lambda t: t.replace("录取通知书", "录取 通知 书").replace("《报到须知》的要\n求", "《报到须知》\n的要求")
+                    .replace("\n", "  \n"))
+    assert sync()["changed"] == 0
+
+
+def test_only_edited_sections_are_pushed(kb):
+    kb_dir, uploader, sync = kb
+    edit(os.path.join(kb_dir, "04_学工流程.md"), lambda t: t.replace("办理人学手续", "办理入学手续", 1))
+    stats = sync()
+    assert (stats["added"], stats["changed"], stats["deleted"]) == (0, 1, 0)
+
+    other = os.path.join(kb_dir, "05_职能部门.md")
+    edit(other, lambda t: t + "\n###10.9.9 新增事项\n新增事项的办理说明。\n")
+    stats = sync()
+    assert (stats["added"], stats["changed"], stats["deleted"]) == (1, 0, 0)
+
+    os.remove(other)
+    stats = sync()
+    assert stats["deleted"] > 0 and not stats["added"] and not stats["changed"]
+    assert len(os.listdir(uploader.target)) == stats["chunks"]
@@ -0,0 +1,26 @@
+import random
+
+import pandas as pd
+
+from benchmarks.bench_render import legacy_format_with_line_breaks
+from message_renderer import format_with_line_breaks, render_history, render_message
+
+ALPHABET = list("。？！；：1234567890.、（）一二三十\r\n \t中文ab") + ["\r\n", "（12）", "3.", "十、"]
+
+
+def test_formatter_matches_legacy_implementation():
+    rng = random.Random(0)
+    texts = pd.read_csv("evolution_logs.csv")['回答'].astype(str).tolist()
+    texts += ["".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 80))) for _ in range(3000)]
+    for text in texts + ["", None]:
+        assert format_with_line_breaks(text) == legacy_format_with_line_breaks(text), repr(text)
+
+
+def test_history_is_rendered_from_cached_messages():
+    items = (("user", "奖学金怎么申请？"), ("assistant", "同学你好。请登录系统：1.填写申请"))
+    html = render_history(items)
+    assert html == "".join(render_message(role, content) for role, content in items)
+    assert "同学你好。<br>请登录系统：<br><br>1.填写申请" in html
+    hits = render_message.cache_info().hits
+    render_message(*items[1])
+    assert render_message.cache_info().hits == hits + 1
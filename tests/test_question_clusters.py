@@ -0,0 +1,26 @@
+from benchmarks.bench_clusters import quality, synthetic_log
+from question_clusters import cluster_questions, cluster_report
+
+
+def test_clusters_group_paraphrases_and_separate_intents():
+    """同一主题同一需求的不同问法聚在一起，不同需求、只差限定词的主题分开"""
+    questions, truth, _ = synthetic_log(20_000, 50)
+    purity, completeness = quality(cluster_questions(questions), truth)
+    assert purity >= 0.9
+    assert completeness >= 0.8
+
+
+def test_qualifier_only_difference_is_not_merged():
+    questions = ["国家奖学金怎么申请", "国家奖学金如何办理？", "国家奖学金申请流程",
+                 "校级奖学金怎么申请", "校级奖学金如何办理？", "校级奖学金申请流程"]
+    labels = cluster_questions(questions * 3).tolist()
+    assert len(set(labels[:3])) == 1 and len(set(labels[3:6])) == 1
+    assert labels[0] != labels[3]
+
+
+def test_cluster_report_counts_rows_and_variants():
+    questions = ["奖学金怎么申请"] * 3 + ["奖学金怎么申请？", "奖学金如何申请"] + ["医保报销比例"]
+    labels = cluster_questions(questions)
+    top = cluster_report(questions, labels, top_n=5)[0]
+    assert (top["size"], top["variants"]) == (5, 3)
+    assert top["representative"] == "奖学金怎么申请"
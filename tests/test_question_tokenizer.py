@@ -0,0 +1,36 @@
+from collections import Counter
+
+from benchmarks.bench_tokenize import synthetic_questions
+from evolution_analyzer import STOP_WORDS
+from jieba_dict import get_jieba
+from question_tokenizer import TokenCache, count_keywords, tokenize_unique
+
+
+def row_by_row(questions):
+    """原实现：逐行 jieba.lcut（同一预构建词典）"""
+    lcut = get_jieba().lcut
+    return Counter(w for q in questions for w in lcut(str(q)) if len(w) > 1 and w not in STOP_WORDS)
+
+
+def test_count_keywords_matches_row_by_row_lcut(tmp_path):
+    questions = synthetic_questions(5000, 800)
+    expected = row_by_row(questions)
+    assert count_keywords(questions, STOP_WORDS, workers=1) == expected
+
+    cache = TokenCache(str(tmp_path / "tokens.db"))
+    assert count_keywords(questions, STOP_WORDS, cache=cache, workers=1) == expected  # 冷缓存
+    assert count_keywords(questions, STOP_WORDS, cache=cache, workers=1) == expected  # 热缓存
+    cache.close()
+
+
+def test_process_pool_tokenizes_like_single_process():
+    questions = list(dict.fromkeys(synthetic_questions(3000, 500)))
+    assert tokenize_unique(questions, workers=2, parallel_threshold=1) == tokenize_unique(questions, workers=1)
+
+
+def test_grouped_counts_match_repeated_rows():
+    """按问题分组计数后传入（对话记录库的 GROUP BY 结果），与逐行传入一致"""
+    questions = synthetic_questions(2000, 300)
+    grouped = Counter(questions)
+    assert count_keywords(list(grouped), STOP_WORDS, workers=1, counts=list(grouped.values())) == \
+        count_keywords(questions, STOP_WORDS, workers=1)
@@ -0,0 +1,54 @@
+import threading
+import time
+
+import pytest
+
+from scheduler import DeadlineExceeded, RequestScheduler, TokenBucket
+
+
+def test_idle_workers_are_not_woken():
+    """空闲时工作线程阻塞在条件变量上，没有轮询"""
+    scheduler = RequestScheduler(lambda payload: payload, TokenBucket(rate=1000, burst=1000), workers=4)
+    time.sleep(0.3)
+    assert scheduler.stats["wakeups"] == 0
+    scheduler.shutdown()
+
+
+def test_dispatch_latency_is_sub_millisecond_with_budget():
+    scheduler = RequestScheduler(lambda submitted_at: time.perf_counter() - submitted_at,
+                                 TokenBucket(rate=1e6, burst=1e6))
+    latencies = sorted(scheduler.submit(time.perf_counter()).result(5) for _ in range(500))
+    scheduler.shutdown()
+    assert latencies[len(latencies) // 2] < 0.001
+
+
+def test_workers_share_one_rate_budget():
+    """多个工作线程共享一个令牌桶，实际派发速率不超过配置值"""
+    rate = 50
+    scheduler = RequestScheduler(lambda payload: time.monotonic(), TokenBucket(rate=rate, burst=1), workers=4)
+    stamps = sorted(f.result(5) for f in [scheduler.submit(i) for i in range(rate)])
+    scheduler.shutdown()
+    # 首尾时间戳之间的间隔估计QPS，留5%测量误差
+    assert (len(stamps) - 1) / (stamps[-1] - stamps[0]) <= rate * 1.05
+
+
+def test_purged_requests_expire_outside_submitting_thread():
+    """队列满时 submit 清出的过期请求由工作线程结束，回调不在提交线程中执行"""
+    release = threading.Event()
+    scheduler = RequestScheduler(lambda payload: release.wait(5) and payload, None, workers=1, max_queue=1)
+    scheduler.submit("busy")
+    time.sleep(0.05)
+    expiring = scheduler.submit("expiring", deadline=time.monotonic() + 0.01)
+    callback_threads = []
+    expiring.add_done_callback(lambda f: callback_threads.append(threading.get_ident()))
+    time.sleep(0.05)
+
+    queued = scheduler.submit("after purge")
+    assert not callback_threads
+    release.set()
+    assert queued.result(5) == "after purge"
+    with pytest.raises(DeadlineExceeded):
+        expiring.result(5)
+    assert callback_threads and callback_threads[0] != threading.get_ident()
+    assert scheduler.stats["expired"] == 1
+    scheduler.shutdown()
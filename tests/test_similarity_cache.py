@@ -0,0 +1,41 @@
+from answer_cache import normalize_question
+from similarity_cache import SimilarityCache
+
+
+def stored_weights(cache, key):
+    slot = cache._slots[key]
+    return {f: w for f, w in zip(cache._features[slot].tolist(), cache._weights[slot].tolist()) if f >= 0}
+
+
+def test_number_guard_considers_every_candidate_above_threshold():
+    cache = SimilarityCache(threshold=0.8)
+    cache.add("2023年北京社保缴费基数是多少")
+    cache.add("2024年北京市社保缴费基数是多少")
+    # 最相似的是 2023 年那条，数字不同，应退而取数字相同的次优候选
+    assert cache.lookup("2024年北京社保缴费基数是多少") == normalize_question("2024年北京市社保缴费基数是多少")
+    assert cache.lookup("2025年北京社保缴费基数是多少") is None
+
+
+def test_stored_weights_follow_current_document_frequency():
+    cache = SimilarityCache(max_entries=5000)
+    key = normalize_question("北京社保缴费基数是多少")
+    cache.add(key)
+    inserted = stored_weights(cache, key)
+    for i in range(500):
+        cache.add(f"社保{'北京上海广州深圳'[i % 4:i % 4 + 2]}第{i}种缴费问题怎么办理")
+
+    features, weights, _ = cache._vectorize(key)
+    current = dict(zip(features.tolist(), weights.tolist()))
+    stored = stored_weights(cache, key)
+    assert max(abs(inserted[f] - w) for f, w in current.items()) > 0.1
+    assert max(abs(stored[f] - w) for f, w in current.items()) < 0.02
+
+
+def test_full_cache_evicts_least_recently_used():
+    cache = SimilarityCache(max_entries=100)
+    cache.add_many(f"第{i}个问题怎么办理" for i in range(100))
+    assert cache.lookup("第0个问题怎么办理") is not None
+    cache.add_many(f"新问题{i}怎么申请" for i in range(50))
+    assert len(cache) == 100 and cache.stats["evictions"] == 50
+    assert cache.lookup("第0个问题怎么办理") is not None
+    assert cache.lookup("第1个问题怎么办理") is None
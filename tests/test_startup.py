@@ -0,0 +1,15 @@
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.bench_startup import ENTRY_MODULES
+
+
+@pytest.mark.parametrize("module", sorted(ENTRY_MODULES))
+def test_entry_module_defers_heavy_imports(module):
+    """入口模块在全新进程中导入时不加载 streamlit / pandas / jieba 等重模块"""
+    code = f"import sys, {module}; print(' '.join(sorted(sys.modules)))"
+    loaded = set(subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                                check=True).stdout.split())
+    assert not loaded & set(ENTRY_MODULES[module])